@@ -0,0 +1,84 @@
+# stdlib
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import logging
+
+# 3rd Party
+from django.db import connection, transaction, IntegrityError
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Internal
+from .models import GeocodedLocation, Session
+from localfitserver import settings
+from localfitserver.response_cache import invalidate_responses
+from localfitserver.utils import convert_lat_long_to_location_name
+
+
+logger = logging.getLogger(__name__)
+
+# A single worker keeps us well inside Nominatim's one request per second policy
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='geocoder')
+
+
+def get_geolocator():
+    return import_string(settings.GEOCODER)(user_agent="localfit")
+
+
+def round_coordinate(degrees):
+    return round(Decimal(str(degrees)), settings.GEOCODE_CACHE_PRECISION)
+
+
+def get_location_name(lat_deg, long_deg):
+    """
+    Returns the cached location name for a coordinate, asking the
+    geocoder and caching the answer on a miss
+    """
+    lat_key, long_key = round_coordinate(lat_deg), round_coordinate(long_deg)
+    cached = GeocodedLocation.objects.filter(lat_deg=lat_key, long_deg=long_key).first()
+    if cached:
+        return cached.location_name
+
+    location_name = convert_lat_long_to_location_name(lat_deg, long_deg, geolocator=get_geolocator())
+    try:
+        GeocodedLocation.objects.create(lat_deg=lat_key, long_deg=long_key, location_name=location_name)
+    except IntegrityError:
+        # another upload cached this point first
+        pass
+    return location_name
+
+
+def update_session_location(session_id):
+    """
+    Fills in Session.start_location. Failures are logged and the
+    location is left empty rather than failing the upload.
+    """
+    try:
+        session = Session.objects.get(pk=session_id)
+        if session.start_position_lat_deg and session.start_position_long_deg:
+            location_name = get_location_name(session.start_position_lat_deg, session.start_position_long_deg)
+            Session.objects.filter(pk=session_id).update(start_location=location_name)
+            local_date = timezone.localtime(session.start_time_utc).date()
+            invalidate_responses('activity', local_date, local_date)
+    except Exception:
+        logger.exception("Failed to geocode the start location of session %s", session_id)
+    finally:
+        if settings.GEOCODE_ASYNC:
+            # worker threads get their own connection, don't leak it
+            connection.close()
+
+
+def schedule_session_location(session):
+    """
+    Queue a start location lookup for once the upload transaction commits
+    """
+    if not (session.start_position_lat_deg and session.start_position_long_deg):
+        return
+
+    def _submit():
+        if settings.GEOCODE_ASYNC:
+            _executor.submit(update_session_location, session.pk)
+        else:
+            update_session_location(session.pk)
+
+    transaction.on_commit(_submit)
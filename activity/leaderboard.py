@@ -0,0 +1,46 @@
+# 3rd Party
+from rest_framework.exceptions import ValidationError
+
+# Internal
+from .models import LeaderboardEntry
+
+
+# ?metric= to the LeaderboardEntry field activities are ranked by
+LEADERBOARD_METRICS = {
+    'distance': 'total_distance',
+    'duration': 'total_elapsed_time',
+    'calories': 'total_calories',
+    'ascent': 'total_ascent',
+}
+LEADERBOARD_SIZE = 10
+
+
+def build_leaderboard_entry(file, session):
+    """
+    An unsaved LeaderboardEntry of an activity's session totals
+    """
+    return LeaderboardEntry(file=file, session=session, activity_type=file.activity_type,
+                            **{field_name: getattr(session, field_name) for field_name in LEADERBOARD_METRICS.values()})
+
+
+def get_leaderboard_options(query_params):
+    """
+    The field a ?metric= leaderboard is ranked by, distance by default,
+    and the ?type= of activity it is limited to, if any
+    """
+    metric = query_params.get('metric', 'distance')
+    if metric not in LEADERBOARD_METRICS:
+        raise ValidationError({'error': f'Please provide metric as one of {", ".join(LEADERBOARD_METRICS)}'})
+    return LEADERBOARD_METRICS[metric], query_params.get('type')
+
+
+def get_leaderboard(field_name, activity_type=None):
+    """
+    The LEADERBOARD_SIZE activities with the highest field_name, as
+    LeaderboardEntry values with their session's start time and location
+    """
+    entries = LeaderboardEntry.objects.order_by(f'-{field_name}')
+    if activity_type:
+        entries = entries.filter(activity_type=activity_type)
+    return entries.values('total_distance', 'activity_type', 'session__start_location', 'session__start_time_utc',
+                          'total_elapsed_time', 'total_calories', 'total_ascent', 'file__filename')[:LEADERBOARD_SIZE]
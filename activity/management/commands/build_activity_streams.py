@@ -0,0 +1,34 @@
+# 3rd Party
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Internal
+from activity.models import ActivityData, ActivityFile
+from activity.streams import STREAM_FIELDS, build_activity_stream
+
+
+class Command(BaseCommand):
+    """
+    Activities uploaded before ActivityStream existed, or with
+    ACTIVITY_STREAMS turned off, only have ActivityData rows. This packs
+    their rows into streams so the charts and maps can read them.
+    """
+    help = "Build an ActivityStream for every activity that does not have one"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-rows', action='store_true',
+                            help="Delete each activity's ActivityData rows once its stream is saved")
+
+    def handle(self, *args, **options):
+        fields = ['timestamp_utc'] + [field_name for field_name, _ in STREAM_FIELDS.values()]
+        built = 0
+        for file in ActivityFile.objects.filter(stream__isnull=True).iterator():
+            rows = ActivityData.objects.filter(file=file).order_by('timestamp_utc').values(*fields)
+            with transaction.atomic():
+                build_activity_stream(file, rows).save()
+                if options['delete_rows']:
+                    ActivityData.objects.filter(file=file).delete()
+            built += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{file.filename}: {len(rows)} samples")
+        self.stdout.write(f"Built {built} activity streams")
@@ -0,0 +1,42 @@
+# 3rd Party
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Internal
+from activity.maps import build_activity_tracks
+from activity.models import ActivityData, ActivityFile, ActivityTrack
+from activity.streams import STREAM_FIELDS, build_activity_stream, get_stream
+from localfitserver import settings
+
+
+class Command(BaseCommand):
+    """
+    Activities uploaded before ActivityTrack existed have no simplified
+    tracks. This builds them for ACTIVITY_TRACK_ZOOMS, from each
+    activity's stream or else its ActivityData rows. Run it with
+    --rebuild after changing ACTIVITY_TRACK_ZOOMS.
+    """
+    help = "Build simplified map tracks for every activity that does not have them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Replace the tracks of activities that already have them")
+
+    def handle(self, *args, **options):
+        files = ActivityFile.objects.all() if options['rebuild'] else ActivityFile.objects.filter(tracks__isnull=True)
+        fields = ['timestamp_utc'] + [field_name for field_name, _ in STREAM_FIELDS.values()]
+        built = 0
+        for file in files.iterator():
+            stream = get_stream(file, 'position_lat', 'position_long')
+            if not stream:
+                rows = ActivityData.objects.filter(file=file).order_by('timestamp_utc').values(*fields)
+                stream = build_activity_stream(file, rows)
+
+            tracks = build_activity_tracks(file, stream)
+            with transaction.atomic():
+                ActivityTrack.objects.filter(file=file).delete()
+                ActivityTrack.objects.bulk_create(tracks)
+            built += bool(tracks)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{file.filename}: {', '.join(str(track.samples) for track in tracks) or 'no GPS data'}")
+        self.stdout.write(f"Built tracks for {built} activities at zoom levels {settings.ACTIVITY_TRACK_ZOOMS}")
@@ -0,0 +1,24 @@
+# 3rd Party
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Internal
+from activity.leaderboard import build_leaderboard_entry
+from activity.models import LeaderboardEntry, Session
+
+
+class Command(BaseCommand):
+    """
+    Activities uploaded before LeaderboardEntry existed are missing from
+    /activity/top/. This copies every activity's session totals into the
+    leaderboard again.
+    """
+    help = "Rebuild the leaderboard of top activities from every activity's session"
+
+    def handle(self, *args, **options):
+        sessions = Session.objects.select_related('file').order_by('pk')
+        with transaction.atomic():
+            LeaderboardEntry.objects.all().delete()
+            entries = LeaderboardEntry.objects.bulk_create(
+                build_leaderboard_entry(session.file, session) for session in sessions.iterator())
+        self.stdout.write(f"Built the leaderboard of {len(entries)} activities")
@@ -0,0 +1,26 @@
+# 3rd Party
+from django.core.management.base import BaseCommand
+
+# Internal
+from activity.maps import build_spatial_summary
+from activity.models import ActivityFile
+from activity.streams import get_coordinates
+
+
+class Command(BaseCommand):
+    """
+    Activities uploaded before ActivitySpatialSummary existed have their
+    GPS fixes read in full by every map request. This summarizes them
+    from each activity's stream or else its ActivityData rows.
+    """
+    help = "Build a spatial summary for every activity that does not have one"
+
+    def handle(self, *args, **options):
+        built = 0
+        for file in ActivityFile.objects.filter(spatial_summary__isnull=True).iterator():
+            summary = build_spatial_summary(file, *get_coordinates(file))
+            summary.save()
+            built += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{file.filename}: {summary.samples} GPS fixes")
+        self.stdout.write(f"Built spatial summaries for {built} activities")
@@ -0,0 +1,172 @@
+# stdlib
+from collections import namedtuple
+from decimal import Decimal
+
+# 3rd Party
+from rest_framework.exceptions import ValidationError
+
+# Internal
+from .models import ActivitySpatialSummary, ActivityTrack
+from .polylines import encode_polyline, get_zoom_tolerance, simplify_polyline
+from .streams import (STREAM_FIELDS, get_coordinates, get_stream_coordinates, is_prefetched, pack_array,
+                      unpack_array)
+from localfitserver import settings
+from localfitserver.renderers import Column
+
+
+# points: the activitydata of a map response, a list of {'lat', 'lng'}, an encoded polyline or
+# {'lat': Column, 'lng': Column} for ?layout=columnar
+# summary: the activity's ActivitySpatialSummary, saved or not, the midpoint is taken from
+MapTrack = namedtuple('MapTrack', ['points', 'summary'])
+
+COORDINATE_TYPE = STREAM_FIELDS['position_lat'][1]
+MAX_ZOOM = 21
+
+
+def get_map_options(context):
+    """
+    The ?zoom=N, ?tolerance=<degrees> and ?encoding=polyline a map was
+    requested with. Empty when the map should hold every GPS fix, as
+    {'lat', 'lng'} points.
+    """
+    request = context.get('request')
+    query_params = request.query_params if request else {}
+    options = {}
+
+    if query_params.get('zoom') is not None:
+        try:
+            options['zoom'] = int(query_params['zoom'])
+        except ValueError:
+            options['zoom'] = -1
+        if not 0 <= options['zoom'] <= MAX_ZOOM:
+            raise ValidationError({'error': f'Please provide zoom as a whole number from 0 to {MAX_ZOOM}'})
+
+    if query_params.get('tolerance') is not None:
+        try:
+            options['tolerance'] = float(query_params['tolerance'])
+        except ValueError:
+            options['tolerance'] = 0
+        if not options['tolerance'] > 0:
+            raise ValidationError({'error': 'Please provide tolerance as a positive number of degrees'})
+
+    if query_params.get('encoding') is not None:
+        if query_params['encoding'] != 'polyline':
+            raise ValidationError({'error': 'The only supported encoding is polyline'})
+        options['encoding'] = 'polyline'
+    return options
+
+
+def _build_track(file, zoom, lat, long):
+    indexes = simplify_polyline(lat, long, get_zoom_tolerance(zoom) * 10 ** 6)
+    return ActivityTrack(file=file, zoom=zoom, samples=len(indexes),
+                         position_lat=pack_array(lat[indexes], COORDINATE_TYPE),
+                         position_long=pack_array(long[indexes], COORDINATE_TYPE),
+                         polyline=encode_polyline(lat[indexes], long[indexes]))
+
+
+def build_activity_tracks(file, stream):
+    """
+    Unsaved ActivityTracks of a stream's GPS fixes for each of
+    ACTIVITY_TRACK_ZOOMS, none for activities without GPS data
+    """
+    lat, long = get_stream_coordinates(stream)
+    if not len(lat):
+        return []
+    return [_build_track(file, zoom, lat, long) for zoom in settings.ACTIVITY_TRACK_ZOOMS]
+
+
+def get_map_track(file, zoom=None, tolerance=None, encoding=None, columnar=False):
+    """
+    An activity's GPS fixes simplified to tolerance degrees, or to a
+    zoom level, from the track saved at upload when there is one. All of
+    them without either, e.g. for a columnar map.
+    """
+    track = None
+    if zoom is not None and tolerance is None:
+        tracks = file.tracks.all() if is_prefetched(file, 'tracks') else file.tracks.filter(zoom=zoom)
+        track = next((track for track in tracks if track.zoom == zoom), None)
+
+    polyline = None
+    coordinates = None
+    if track:
+        track_lat = unpack_array(track.position_lat, COORDINATE_TYPE)
+        track_long = unpack_array(track.position_long, COORDINATE_TYPE)
+        polyline = track.polyline
+    else:
+        coordinates = get_coordinates(file)
+        track_lat, track_long = coordinates
+        if zoom is not None or tolerance is not None:
+            tolerance = tolerance if tolerance is not None else get_zoom_tolerance(zoom)
+            indexes = simplify_polyline(track_lat, track_long, tolerance * 10 ** 6)
+            track_lat, track_long = track_lat[indexes], track_long[indexes]
+
+    summary = get_spatial_summary(file)
+    if summary is None:
+        # activities uploaded before summaries existed are summarized on the fly, from the coordinates
+        # already read when there is no saved track
+        summary = build_spatial_summary(file, *(coordinates if coordinates is not None else get_coordinates(file)))
+
+    if encoding == 'polyline':
+        points = polyline if polyline is not None else encode_polyline(track_lat, track_long)
+    elif columnar:
+        # the same floats as the Decimals below are rendered as
+        points = {'lat': Column((track_lat / 10 ** 6).tolist()), 'lng': Column((track_long / 10 ** 6).tolist())}
+    else:
+        points = [{'lat': Decimal(point_lat).scaleb(-6), 'lng': Decimal(point_long).scaleb(-6)}
+                  for point_lat, point_long in zip(track_lat.tolist(), track_long.tolist())]
+    return MapTrack(points, summary)
+
+
+def _get_midpoint(lat_total, long_total, samples):
+    # calculate_geographic_midpoint() of the coordinates, from their microdegree totals
+    midpoint_lat_deg = Decimal(lat_total).scaleb(-6) / samples
+    midpoint_long_deg = Decimal(long_total).scaleb(-6) / samples
+    return round(midpoint_lat_deg, 6), round(midpoint_long_deg, 6)
+
+
+def get_combined_midpoint(summaries):
+    """
+    The midpoint of every GPS fix of several activities, from their
+    ActivitySpatialSummaries' totals
+    """
+    return _get_midpoint(sum(summary.lat_total for summary in summaries),
+                         sum(summary.long_total for summary in summaries),
+                         sum(summary.samples for summary in summaries))
+
+
+def build_spatial_summary(file, lat, long):
+    """
+    An unsaved ActivitySpatialSummary of an activity's GPS fixes, given
+    in microdegrees
+    """
+    summary = ActivitySpatialSummary(file=file, has_gps_data=bool(len(lat)), samples=len(lat),
+                                     lat_total=int(lat.sum()), long_total=int(long.sum()))
+    if summary.has_gps_data:
+        summary.min_lat_deg, summary.max_lat_deg = (Decimal(int(lat.min())).scaleb(-6),
+                                                    Decimal(int(lat.max())).scaleb(-6))
+        summary.min_long_deg, summary.max_long_deg = (Decimal(int(long.min())).scaleb(-6),
+                                                      Decimal(int(long.max())).scaleb(-6))
+        summary.midpoint_lat_deg, summary.midpoint_long_deg = _get_midpoint(summary.lat_total, summary.long_total,
+                                                                            summary.samples)
+    return summary
+
+
+def get_spatial_summary(file):
+    """
+    An activity's ActivitySpatialSummary, or None for activities uploaded
+    before summaries existed
+    """
+    try:
+        return file.spatial_summary
+    except ActivitySpatialSummary.DoesNotExist:
+        return None
+
+
+def get_spatial_summaries(files):
+    """
+    The ActivitySpatialSummaries of several activities, or None unless
+    every one of them has one. Fetch the activities with
+    select_related('spatial_summary') to read them without a query each.
+    """
+    summaries = [get_spatial_summary(file) for file in files]
+    return summaries if all(summaries) else None
@@ -0,0 +1,84 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=15, unique=True)),
+                ('activity_type', models.CharField(max_length=20)),
+                ('activity_category', models.CharField(max_length=20)),
+                ('activity_collection', models.CharField(max_length=30, null=True)),
+                ('start_time_utc', models.DateTimeField()),
+                ('primary_file', models.BooleanField(default=True)),
+                ('secondary_activity', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='activity.ActivityFile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActivityType',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(max_length=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Session',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time_utc', models.DateTimeField()),
+                ('start_position_lat_sem', models.IntegerField(null=True)),
+                ('start_position_long_sem', models.IntegerField(null=True)),
+                ('start_position_lat_deg', models.DecimalField(decimal_places=6, max_digits=8, null=True)),
+                ('start_position_long_deg', models.DecimalField(decimal_places=6, max_digits=9, null=True)),
+                ('start_location', models.CharField(max_length=200, null=True)),
+                ('total_elapsed_time', models.DecimalField(decimal_places=3, max_digits=10, null=True)),
+                ('total_timer_time', models.DecimalField(decimal_places=3, max_digits=10, null=True)),
+                ('total_distance', models.DecimalField(decimal_places=2, max_digits=8, null=True)),
+                ('total_strides', models.IntegerField(null=True)),
+                ('total_cycles', models.IntegerField(null=True)),
+                ('total_calories', models.IntegerField(null=True)),
+                ('enhanced_avg_speed', models.DecimalField(decimal_places=3, max_digits=5, null=True)),
+                ('avg_speed', models.IntegerField(null=True)),
+                ('enhanced_max_speed', models.DecimalField(decimal_places=3, max_digits=5, null=True)),
+                ('max_speed', models.IntegerField(null=True)),
+                ('avg_power', models.IntegerField(null=True)),
+                ('max_power', models.IntegerField(null=True)),
+                ('total_ascent', models.IntegerField(null=True)),
+                ('total_descent', models.IntegerField(null=True)),
+                ('avg_heart_rate', models.IntegerField(null=True)),
+                ('max_heart_rate', models.IntegerField(null=True)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session', to='activity.ActivityFile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActivityData',
+            fields=[
+                ('activity_walk_data_id', models.AutoField(primary_key=True, serialize=False)),
+                ('timestamp_utc', models.DateTimeField()),
+                ('heart_rate', models.IntegerField(null=True)),
+                ('position_lat_sem', models.IntegerField(null=True)),
+                ('position_long_sem', models.IntegerField(null=True)),
+                ('position_lat_deg', models.DecimalField(decimal_places=6, max_digits=8, null=True)),
+                ('position_long_deg', models.DecimalField(decimal_places=6, max_digits=9, null=True)),
+                ('distance', models.DecimalField(decimal_places=2, max_digits=8, null=True)),
+                ('altitude', models.DecimalField(decimal_places=1, max_digits=5, null=True)),
+                ('speed', models.IntegerField(null=True)),
+                ('cadence', models.IntegerField(null=True)),
+                ('fractional_cadence', models.DecimalField(decimal_places=1, max_digits=5, null=True)),
+                ('enhanced_altitude', models.DecimalField(decimal_places=1, max_digits=5, null=True)),
+                ('enhanced_speed', models.DecimalField(decimal_places=3, max_digits=5, null=True)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activitydata', to='activity.ActivityFile')),
+            ],
+        ),
+    ]
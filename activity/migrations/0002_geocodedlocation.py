@@ -0,0 +1,25 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodedLocation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat_deg', models.DecimalField(decimal_places=6, max_digits=8)),
+                ('long_deg', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('location_name', models.CharField(max_length=200)),
+            ],
+            options={
+                'unique_together': {('lat_deg', 'long_deg')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0003_activityfile_sha256'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitydata',
+            index=models.Index(fields=['file', 'timestamp_utc'], name='activity_ac_file_id_842a90_idx'),
+        ),
+    ]
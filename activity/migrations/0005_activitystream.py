@@ -0,0 +1,30 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0004_time_series_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityStream',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('samples', models.IntegerField()),
+                ('timestamp', models.BinaryField()),
+                ('heart_rate', models.BinaryField()),
+                ('position_lat', models.BinaryField()),
+                ('position_long', models.BinaryField()),
+                ('altitude', models.BinaryField()),
+                ('speed', models.BinaryField()),
+                ('cadence', models.BinaryField()),
+                ('distance', models.BinaryField()),
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stream', to='activity.ActivityFile')),
+            ],
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 2.2.8 on 2026-10-18 11:07
+
+from django.db import migrations
+import localfitserver.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0005_activitystream'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitydata',
+            name='altitude',
+            field=localfitserver.fields.FixedPointDecimalField(decimal_places=1, max_digits=5, null=True),
+        ),
+        migrations.AlterField(
+            model_name='activitydata',
+            name='distance',
+            field=localfitserver.fields.FixedPointDecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AlterField(
+            model_name='activitydata',
+            name='enhanced_altitude',
+            field=localfitserver.fields.FixedPointDecimalField(decimal_places=1, max_digits=5, null=True),
+        ),
+        migrations.AlterField(
+            model_name='activitydata',
+            name='enhanced_speed',
+            field=localfitserver.fields.FixedPointDecimalField(decimal_places=3, max_digits=5, null=True),
+        ),
+        migrations.AlterField(
+            model_name='activitydata',
+            name='fractional_cadence',
+            field=localfitserver.fields.FixedPointDecimalField(decimal_places=1, max_digits=5, null=True),
+        ),
+        migrations.AlterField(
+            model_name='activitydata',
+            name='position_lat_deg',
+            field=localfitserver.fields.FixedPointDecimalField(decimal_places=6, max_digits=8, null=True),
+        ),
+        migrations.AlterField(
+            model_name='activitydata',
+            name='position_long_deg',
+            field=localfitserver.fields.FixedPointDecimalField(decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AlterField(
+            model_name='activitydata',
+            name='timestamp_utc',
+            field=localfitserver.fields.EpochDateTimeField(),
+        ),
+        # the table copies above keep each value as it was, convert them in place
+        migrations.RunSQL(
+            sql="""
+            UPDATE activity_activitydata SET
+                timestamp_utc = CAST(strftime('%s', timestamp_utc) AS INTEGER),
+                altitude = CAST(ROUND(altitude * 10) AS INTEGER),
+                distance = CAST(ROUND(distance * 100) AS INTEGER),
+                enhanced_altitude = CAST(ROUND(enhanced_altitude * 10) AS INTEGER),
+                enhanced_speed = CAST(ROUND(enhanced_speed * 1000) AS INTEGER),
+                fractional_cadence = CAST(ROUND(fractional_cadence * 10) AS INTEGER),
+                position_lat_deg = CAST(ROUND(position_lat_deg * 1000000) AS INTEGER),
+                position_long_deg = CAST(ROUND(position_long_deg * 1000000) AS INTEGER)
+            """,
+            reverse_sql="""
+            UPDATE activity_activitydata SET
+                timestamp_utc = datetime(timestamp_utc, 'unixepoch'),
+                altitude = altitude / 10.0,
+                distance = distance / 100.0,
+                enhanced_altitude = enhanced_altitude / 10.0,
+                enhanced_speed = enhanced_speed / 1000.0,
+                fractional_cadence = fractional_cadence / 10.0,
+                position_lat_deg = position_lat_deg / 1000000.0,
+                position_long_deg = position_long_deg / 1000000.0
+            """,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.8 on 2026-10-18 11:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0006_compact_sample_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityTrack',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.IntegerField()),
+                ('samples', models.IntegerField()),
+                ('position_lat', models.BinaryField()),
+                ('position_long', models.BinaryField()),
+                ('polyline', models.TextField()),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='activity.ActivityFile')),
+            ],
+            options={
+                'unique_together': {('file', 'zoom')},
+            },
+        ),
+    ]
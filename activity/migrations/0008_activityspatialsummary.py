@@ -0,0 +1,32 @@
+# Generated by Django 2.2.8 on 2026-10-18 11:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import localfitserver.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0007_activitytrack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivitySpatialSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('has_gps_data', models.BooleanField()),
+                ('samples', models.IntegerField()),
+                ('lat_total', models.BigIntegerField()),
+                ('long_total', models.BigIntegerField()),
+                ('min_lat_deg', localfitserver.fields.FixedPointDecimalField(decimal_places=6, max_digits=8, null=True)),
+                ('max_lat_deg', localfitserver.fields.FixedPointDecimalField(decimal_places=6, max_digits=8, null=True)),
+                ('min_long_deg', localfitserver.fields.FixedPointDecimalField(decimal_places=6, max_digits=9, null=True)),
+                ('max_long_deg', localfitserver.fields.FixedPointDecimalField(decimal_places=6, max_digits=9, null=True)),
+                ('midpoint_lat_deg', localfitserver.fields.FixedPointDecimalField(decimal_places=6, max_digits=8, null=True)),
+                ('midpoint_long_deg', localfitserver.fields.FixedPointDecimalField(decimal_places=6, max_digits=9, null=True)),
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='spatial_summary', to='activity.ActivityFile')),
+            ],
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 2.2.8 on 2026-10-18 12:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_leaderboard(apps, schema_editor):
+    # the entries uploads add, for the activities uploaded before them, as manage.py build_leaderboard builds them
+    Session = apps.get_model('activity', 'Session')
+    LeaderboardEntry = apps.get_model('activity', 'LeaderboardEntry')
+    entries = {}
+    for session in Session.objects.select_related('file').order_by('pk').iterator():
+        entries.setdefault(session.file_id, LeaderboardEntry(
+            file_id=session.file_id, session_id=session.pk, activity_type=session.file.activity_type,
+            total_distance=session.total_distance, total_elapsed_time=session.total_elapsed_time,
+            total_calories=session.total_calories, total_ascent=session.total_ascent))
+    LeaderboardEntry.objects.bulk_create(entries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0008_activityspatialsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(max_length=20)),
+                ('total_distance', models.DecimalField(decimal_places=2, max_digits=8, null=True)),
+                ('total_elapsed_time', models.DecimalField(decimal_places=3, max_digits=10, null=True)),
+                ('total_calories', models.IntegerField(null=True)),
+                ('total_ascent', models.IntegerField(null=True)),
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entry', to='activity.ActivityFile')),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entry', to='activity.Session')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['total_distance'], name='activity_le_total_d_405d60_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['activity_type', 'total_distance'], name='activity_le_activit_50e390_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['total_elapsed_time'], name='activity_le_total_e_3399b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['activity_type', 'total_elapsed_time'], name='activity_le_activit_1d69cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['total_calories'], name='activity_le_total_c_d43f7b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['activity_type', 'total_calories'], name='activity_le_activit_44e5b7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['total_ascent'], name='activity_le_total_a_e71970_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['activity_type', 'total_ascent'], name='activity_le_activit_87dfb5_idx'),
+        ),
+        migrations.RunPython(build_leaderboard, migrations.RunPython.noop),
+    ]
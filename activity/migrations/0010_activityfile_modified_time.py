@@ -0,0 +1,18 @@
+# Generated by Django 2.2.8 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0009_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activityfile',
+            name='modified_time_utc',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
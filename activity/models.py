@@ -1,5 +1,7 @@
 from django.db import models
 
+from localfitserver.fields import EpochDateTimeField, FixedPointDecimalField
+
 
 class ActivityType(models.Model):
     activity_type = models.CharField(max_length=20)
@@ -13,6 +15,8 @@ class ActivityFile(models.Model):
     start_time_utc = models.DateTimeField()
     primary_file = models.BooleanField(default=True)
     secondary_activity = models.ForeignKey('self', null=True, on_delete=models.CASCADE)
+    sha256 = models.CharField(null=True, max_length=64, unique=True)  # content hash of the uploaded FIT file
+    modified_time_utc = models.DateTimeField(auto_now=True)  # the version of its payloads, see views.get_activity_etag
 
 
 class Session(models.Model):
@@ -44,16 +48,120 @@ class Session(models.Model):
 class ActivityData(models.Model):
     activity_walk_data_id = models.AutoField(primary_key=True)
     file = models.ForeignKey(ActivityFile, related_name='activitydata', on_delete=models.CASCADE)
-    timestamp_utc = models.DateTimeField()                                               # seconds
+    timestamp_utc = EpochDateTimeField()                                                # seconds
     heart_rate = models.IntegerField(null=True)                                                   # BPM
     position_lat_sem = models.IntegerField(null=True)                                    # semicircles
     position_long_sem = models.IntegerField(null=True)                                   # semicircles
-    position_lat_deg = models.DecimalField(null=True, max_digits=8, decimal_places=6)    #      XX.XXXXXX degrees
-    position_long_deg = models.DecimalField(null=True, max_digits=9, decimal_places=6)   #     XXX.XXXXXX degrees
-    distance = models.DecimalField(null=True, max_digits=8, decimal_places=2)            # XXX,XXX.XX  meters, 100mi is 160,934m
-    altitude = models.DecimalField(null=True, max_digits=5, decimal_places=1)            #   X,XXX.X   meters, Mt. Everest is 8,850m high
+    position_lat_deg = FixedPointDecimalField(null=True, max_digits=8, decimal_places=6)    #      XX.XXXXXX degrees
+    position_long_deg = FixedPointDecimalField(null=True, max_digits=9, decimal_places=6)   #     XXX.XXXXXX degrees
+    distance = FixedPointDecimalField(null=True, max_digits=8, decimal_places=2)            # XXX,XXX.XX  meters, 100mi is 160,934m
+    altitude = FixedPointDecimalField(null=True, max_digits=5, decimal_places=1)            #   X,XXX.X   meters, Mt. Everest is 8,850m high
     speed = models.IntegerField(null=True)                                               #      XX.XXX meters/second, Usain Bolt's top speed is 12.27m/s
     cadence = models.IntegerField(null=True)                                             # RPM
-    fractional_cadence = models.DecimalField(null=True, max_digits=5, decimal_places=1)  # RPM
-    enhanced_altitude = models.DecimalField(null=True, max_digits=5, decimal_places=1)   #   X,XXX.X   meters
-    enhanced_speed = models.DecimalField(null=True, max_digits=5, decimal_places=3)      #      XX.XXX meters/second
+    fractional_cadence = FixedPointDecimalField(null=True, max_digits=5, decimal_places=1)  # RPM
+    enhanced_altitude = FixedPointDecimalField(null=True, max_digits=5, decimal_places=1)   #   X,XXX.X   meters
+    enhanced_speed = FixedPointDecimalField(null=True, max_digits=5, decimal_places=3)      #      XX.XXX meters/second
+
+    class Meta:
+        # per-activity charts read one file's samples in time order
+        indexes = [models.Index(fields=['file', 'timestamp_utc'])]
+
+
+class ActivityStream(models.Model):
+    """
+    One activity's samples as a compressed, packed array per stream,
+    written once at upload. Charts read these instead of building a model
+    instance per ActivityData row. See activity.streams for the types and
+    scales.
+    """
+    file = models.OneToOneField(ActivityFile, related_name='stream', on_delete=models.CASCADE)
+    samples = models.IntegerField()
+    timestamp = models.BinaryField()
+    heart_rate = models.BinaryField()
+    position_lat = models.BinaryField()
+    position_long = models.BinaryField()
+    altitude = models.BinaryField()
+    speed = models.BinaryField()
+    cadence = models.BinaryField()
+    distance = models.BinaryField()
+
+
+class ActivityTrack(models.Model):
+    """
+    An activity's GPS track simplified for one map zoom level, written
+    once at upload for each of ACTIVITY_TRACK_ZOOMS. Coordinates are
+    packed microdegrees, like the ActivityStream they were taken from,
+    and also kept as an encoded polyline. See activity.maps.
+    """
+    file = models.ForeignKey(ActivityFile, related_name='tracks', on_delete=models.CASCADE)
+    zoom = models.IntegerField()
+    samples = models.IntegerField()
+    position_lat = models.BinaryField()
+    position_long = models.BinaryField()
+    polyline = models.TextField()
+
+    class Meta:
+        unique_together = ('file', 'zoom')
+
+
+class ActivitySpatialSummary(models.Model):
+    """
+    An activity's GPS fixes summarized once at upload, so maps can 404
+    and place their midpoint without reading every fix. The coordinate
+    totals, in microdegrees, let a collection's midpoint be combined
+    exactly from its activities'. See activity.maps.
+    """
+    file = models.OneToOneField(ActivityFile, related_name='spatial_summary', on_delete=models.CASCADE)
+    has_gps_data = models.BooleanField()
+    samples = models.IntegerField()                                                             # GPS fixes
+    lat_total = models.BigIntegerField()                                                        # microdegrees
+    long_total = models.BigIntegerField()                                                       # microdegrees
+    min_lat_deg = FixedPointDecimalField(null=True, max_digits=8, decimal_places=6)
+    max_lat_deg = FixedPointDecimalField(null=True, max_digits=8, decimal_places=6)
+    min_long_deg = FixedPointDecimalField(null=True, max_digits=9, decimal_places=6)
+    max_long_deg = FixedPointDecimalField(null=True, max_digits=9, decimal_places=6)
+    midpoint_lat_deg = FixedPointDecimalField(null=True, max_digits=8, decimal_places=6)
+    midpoint_long_deg = FixedPointDecimalField(null=True, max_digits=9, decimal_places=6)
+
+
+class LeaderboardEntry(models.Model):
+    """
+    An activity's session totals and type, copied at upload and kept in
+    step by update_activity, so the top activities by any metric are read
+    off an index instead of sorting every session. See
+    activity.leaderboard.
+    """
+    file = models.OneToOneField(ActivityFile, related_name='leaderboard_entry', on_delete=models.CASCADE)
+    session = models.OneToOneField(Session, related_name='leaderboard_entry', on_delete=models.CASCADE)
+    activity_type = models.CharField(max_length=20)
+    total_distance = models.DecimalField(null=True, max_digits=8, decimal_places=2)
+    total_elapsed_time = models.DecimalField(null=True, max_digits=10, decimal_places=3)
+    total_calories = models.IntegerField(null=True)
+    total_ascent = models.IntegerField(null=True)
+
+    class Meta:
+        # the top activities by each metric, overall and per activity type
+        indexes = [
+            models.Index(fields=['total_distance']),
+            models.Index(fields=['activity_type', 'total_distance']),
+            models.Index(fields=['total_elapsed_time']),
+            models.Index(fields=['activity_type', 'total_elapsed_time']),
+            models.Index(fields=['total_calories']),
+            models.Index(fields=['activity_type', 'total_calories']),
+            models.Index(fields=['total_ascent']),
+            models.Index(fields=['activity_type', 'total_ascent']),
+        ]
+
+
+class GeocodedLocation(models.Model):
+    """
+    Reverse geocoding results, keyed by coordinates rounded to
+    GEOCODE_CACHE_PRECISION, so a start point that has been looked up
+    once never hits the geocoder again
+    """
+    lat_deg = models.DecimalField(max_digits=8, decimal_places=6)
+    long_deg = models.DecimalField(max_digits=9, decimal_places=6)
+    location_name = models.CharField(max_length=200)
+
+    class Meta:
+        unique_together = ('lat_deg', 'long_deg')
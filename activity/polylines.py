@@ -0,0 +1,84 @@
+# 3rd Party
+import numpy as np
+
+# points simplified as one segment, see simplify_polyline()
+MAX_SEGMENT = 1000
+
+
+def get_zoom_tolerance(zoom):
+    """
+    Degrees of longitude covered by one pixel of a Google map, made of
+    256 pixel tiles, at a zoom level. Dropping points closer than that to
+    the line doesn't change what the map draws.
+    """
+    return 360 / (256 * 2 ** zoom)
+
+
+def _get_segment_distances(x, y, start_x, start_y, end_x, end_y):
+    dx, dy = end_x - start_x, end_y - start_y
+    length_squared = dx * dx + dy * dy
+    # a segment of zero length, e.g. a loop that ends where it started, measures to its start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length_squared > 0, ((x - start_x) * dx + (y - start_y) * dy) / length_squared, 0)
+    t = np.clip(t, 0, 1)
+    return np.hypot(x - (start_x + t * dx), y - (start_y + t * dy))
+
+
+def simplify_polyline(x, y, tolerance, max_segment=MAX_SEGMENT):
+    """
+    Douglas-Peucker simplification. Returns the indexes of the points to
+    keep, so that none of the dropped points is further than tolerance,
+    in the units of x and y, from the simplified line.
+
+    Every max_segment-th point is kept too. Tracks that keep doubling
+    back, like laps of a running track, would otherwise split one point
+    at a time and take time quadratic in their length. The segments of
+    one level of the recursion are all split in a single pass.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.zeros(len(x), dtype=bool)
+    keep[::max_segment] = True
+    if len(x):
+        keep[-1] = True
+
+    # the points of segments that may still be split
+    candidates = np.flatnonzero(~keep)
+    while len(candidates):
+        kept = np.flatnonzero(keep)
+        ends = np.searchsorted(kept, candidates)
+        starts, ends = kept[ends - 1], kept[ends]
+        distances = _get_segment_distances(x[candidates], y[candidates], x[starts], y[starts], x[ends], y[ends])
+
+        # the first point furthest from each segment, for those further than tolerance
+        new_segment = np.diff(starts, prepend=-1) != 0
+        segments = np.cumsum(new_segment) - 1
+        furthest = np.maximum.reduceat(distances, np.flatnonzero(new_segment))[segments]
+        splitting = furthest > tolerance
+        at_furthest = np.flatnonzero(splitting & (distances == furthest))
+        _, firsts = np.unique(segments[at_furthest], return_index=True)
+        split = at_furthest[firsts]
+
+        keep[candidates[split]] = True
+        splitting[split] = False
+        candidates = candidates[splitting]
+    return np.flatnonzero(keep)
+
+
+def encode_polyline(lats, longs):
+    """
+    Google's encoded polyline format for coordinates in microdegrees
+    https://developers.google.com/maps/documentation/utilities/polylinealgorithm
+    """
+    # rounded to the format's five decimal places the way JavaScript's Math.round() rounds
+    coordinates = (np.column_stack((lats, longs)).astype(np.int64) + 5) // 10
+    deltas = np.diff(coordinates, axis=0, prepend=[[0, 0]])
+
+    chunks = []
+    for value in deltas.ravel().tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
@@ -2,12 +2,16 @@
 from datetime import datetime, timedelta
 
 # 3rd Party
+from django.db.models import Prefetch
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
 
 # Internal
-from .models import ActivityFile, Session, ActivityData
+from .maps import (MapTrack, get_combined_midpoint, get_map_options, get_map_track, get_spatial_summaries,
+                   get_spatial_summary)
+from .models import ActivityData, ActivityFile, ActivityStream, ActivityTrack, Session
+from .streams import get_stream, get_timestamps, get_unix_timestamps, get_values
 from localfitserver.utils import (
     format_timespan_for_display,
     format_distance_for_display,
@@ -15,6 +19,66 @@ from localfitserver.utils import (
     format_date_for_calendar_heat_map,
     calculate_geographic_midpoint)
 from localfitserver.base_serializers import BaseChartJSListSerializer
+from localfitserver.downsampling import get_chart_lttb_indexes, get_requested_points
+from localfitserver.layouts import is_columnar
+from localfitserver.renderers import Column
+
+
+def get_session(activity):
+    # from the sessions the view prefetched with the activity, when it did
+    return activity.session.all()[0]
+
+
+class ActivityStreamChartSerializer(serializers.BaseSerializer):
+    """
+    Serializes an ActivityStream into the same response the
+    BaseChartJSListSerializer subclasses build from ActivityData rows
+    """
+    chart_field = None
+
+    def to_representation(self, instance):
+        values = get_values(instance, self.chart_field)
+        indexes = None
+        points = get_requested_points(self.context)
+        if points is not None and len(values) > points:
+            indexes = get_chart_lttb_indexes(get_unix_timestamps(instance), values, points)
+            values = [values[index] for index in indexes]
+
+        if is_columnar(self.context):
+            unix_timestamps = get_unix_timestamps(instance)
+            data = {
+                't': Column((unix_timestamps if indexes is None else unix_timestamps[indexes]).tolist()),
+                'y': Column([value if value != -1 else 0 for value in values]),
+            }
+            return {
+                'start_time': data['t'][0] if data['t'] else "",
+                'end_time': data['t'][-1] if data['t'] else "",
+                self.chart_field: data
+            }
+
+        data = [
+            {
+                "t": timestamp,
+                "y": value if value != -1 else 0
+            } for timestamp, value in zip(get_timestamps(instance, indexes), values)
+        ]
+        return {
+            'start_time': data[0]['t'] if data else "",
+            'end_time': data[-1]['t'] if data else "",
+            self.chart_field: data
+        }
+
+    @property
+    def data(self):
+        return ReturnDict(super().data, serializer=self)
+
+
+class ActivityHeartRateStreamSerializer(ActivityStreamChartSerializer):
+    chart_field = 'heart_rate'
+
+
+class ActivityAltitudeStreamSerializer(ActivityStreamChartSerializer):
+    chart_field = 'altitude'
 
 
 class ActivityHeartRateListSerializer(BaseChartJSListSerializer):
@@ -62,6 +126,36 @@ class ActivityWalkDataSerializer(serializers.ModelSerializer):
         fields = ['position_lat_deg', 'position_long_deg']
 
 
+class ActivityCoordinatesField(serializers.Field):
+    """
+    An activity's coordinates, from its ActivityStream when it has one,
+    otherwise from its ActivityData rows
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, file):
+        options = get_map_options(self.context)
+        columnar = is_columnar(self.context)
+        if options or columnar:
+            # simplified, encoded or columnar, see activity.maps
+            return get_map_track(file, columnar=columnar, **options)
+
+        stream = get_stream(file, 'position_lat', 'position_long')
+        if not stream:
+            return ActivityWalkDataSerializer(file.activitydata.all(), many=True).data
+
+        # Decimals, like the DecimalField columns return, so the midpoint is calculated the same way
+        return [
+            {'lat': lat, 'lng': lng} if lat and lng else None
+            for lat, lng in zip(get_values(stream, 'position_lat', as_decimal=True),
+                                get_values(stream, 'position_long', as_decimal=True))
+        ]
+
+
 class ActivityWalkSessionSerializer(serializers.ModelSerializer):
     total_distance = serializers.DecimalField(max_digits=8, decimal_places=2)
 
@@ -99,11 +193,16 @@ class ActivityMapSessionSerializer(serializers.ModelSerializer):
 
 class ActivityMapDataSerializer(serializers.ModelSerializer):
     # session = ActivityMapSessionSerializer(many=True, read_only=True)
-    activitydata = ActivityWalkDataSerializer(many=True, read_only=True)
+    activitydata = ActivityCoordinatesField()
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('spatial_summary', 'secondary_activity').prefetch_related(
+            'session', 'secondary_activity__session')
 
     def format_session_data(self, activity, secondary_activity):
         data = {}
-        session = Session.objects.get(file=activity)
+        session = get_session(activity)
         # data['start_time_utc_dt'] = session.start_time_utc
         # data['start_time_utc'] = session.start_time_utc.strftime("%I:%M%p, %A, %B %d, %Y")
         # data['total_elapsed_time'] = format_timespan_for_display(session.total_elapsed_time)
@@ -111,7 +210,7 @@ class ActivityMapDataSerializer(serializers.ModelSerializer):
         # data['total_calories'] = session.total_calories
 
         if secondary_activity:
-            secondary_session = Session.objects.get(file=secondary_activity)
+            secondary_session = get_session(secondary_activity)
             data['total_elapsed_time'] = format_timespan_for_display(session.total_elapsed_time + secondary_session.total_elapsed_time)
             data['total_distance'] = format_distance_for_display(session.total_distance + secondary_session.total_distance)
             data['total_calories'] = session.total_calories + secondary_session.total_calories
@@ -123,8 +222,18 @@ class ActivityMapDataSerializer(serializers.ModelSerializer):
         ret = super().data
         session_data = self.format_session_data(self.instance, self.instance.secondary_activity)
         ret.update(**session_data)
+        if isinstance(ret['activitydata'], MapTrack):
+            track = ret['activitydata']
+            ret['activitydata'] = track.points
+            ret['midpoint_lat_deg'], ret['midpoint_long_deg'] = get_combined_midpoint([track.summary])
+            return ReturnDict(ret, serializer=self)
+
         ret['activitydata'] = list(filter((None).__ne__, ret['activitydata']))
-        ret['midpoint_lat_deg'], ret['midpoint_long_deg'] = calculate_geographic_midpoint(ret['activitydata'])
+        summary = get_spatial_summary(self.instance)
+        if summary:
+            ret['midpoint_lat_deg'], ret['midpoint_long_deg'] = summary.midpoint_lat_deg, summary.midpoint_long_deg
+        else:
+            ret['midpoint_lat_deg'], ret['midpoint_long_deg'] = calculate_geographic_midpoint(ret['activitydata'])
         return ReturnDict(ret, serializer=self)
 
     class Meta:
@@ -141,15 +250,25 @@ class ActivityMapCollectionListSerializer(serializers.ListSerializer):
     @property
     def data(self):
         files = super(ActivityMapCollectionListSerializer, self).data
-        total_coordinates = []
-        activities = []
-        for file in files:
-            activity = list(filter((None).__ne__, file['activitydata']))
-            total_coordinates = total_coordinates + activity
-            activities.append(activity)
-
-        # find geographic midpoint across all activities to display
-        midpoint_lat_deg, midpoint_long_deg = calculate_geographic_midpoint(total_coordinates)
+        if files and isinstance(files[0]['activitydata'], MapTrack):
+            tracks = [file['activitydata'] for file in files]
+            midpoint_lat_deg, midpoint_long_deg = get_combined_midpoint([track.summary for track in tracks])
+            response = {
+                "midpoint_lat_deg": midpoint_lat_deg,
+                "midpoint_long_deg": midpoint_long_deg,
+                "activities": [track.points for track in tracks]
+            }
+            return ReturnDict(response, serializer=self)
+
+        activities = [list(filter((None).__ne__, file['activitydata'])) for file in files]
+
+        # find geographic midpoint across all activities to display, from their stored summaries if they all have one
+        summaries = get_spatial_summaries(self.instance)
+        if summaries:
+            midpoint_lat_deg, midpoint_long_deg = get_combined_midpoint(summaries)
+        else:
+            midpoint_lat_deg, midpoint_long_deg = calculate_geographic_midpoint(
+                [coordinates for activity in activities for coordinates in activity])
         response = {
             "midpoint_lat_deg": midpoint_lat_deg,
             "midpoint_long_deg": midpoint_long_deg,
@@ -159,7 +278,22 @@ class ActivityMapCollectionListSerializer(serializers.ListSerializer):
 
 
 class ActivityMapCollectionSerializer(serializers.ModelSerializer):
-    activitydata = ActivityWalkDataSerializer(many=True, read_only=True)
+    activitydata = ActivityCoordinatesField()
+
+    @staticmethod
+    def setup_eager_loading(queryset, zoom=None):
+        """
+        Fetches what every activity's map reads in a few queries for the
+        whole collection: its summary, its coordinate streams, its rows
+        if it has no stream and its track for a zoom level
+        """
+        queryset = queryset.select_related('spatial_summary').prefetch_related(
+            Prefetch('stream', queryset=ActivityStream.objects.only('file', 'samples', 'position_lat', 'position_long')),
+            Prefetch('activitydata', queryset=ActivityData.objects.filter(file__stream__isnull=True).only(
+                'file', 'position_lat_deg', 'position_long_deg')))
+        if zoom is not None:
+            queryset = queryset.prefetch_related(Prefetch('tracks', queryset=ActivityTrack.objects.filter(zoom=zoom)))
+        return queryset
 
     class Meta:
         model = ActivityFile
@@ -169,9 +303,13 @@ class ActivityMapCollectionSerializer(serializers.ModelSerializer):
 
 class ActivityMetaDataSerializer(serializers.ModelSerializer):
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('secondary_activity').prefetch_related('session', 'secondary_activity__session')
+
     def format_session_data(self, activity, secondary_activity):
         data = {}
-        session = Session.objects.get(file=activity)
+        session = get_session(activity)
         data['start_time_utc_dt'] = session.start_time_utc
         data['start_time_utc'] = timezone.localtime(session.start_time_utc).strftime("%I:%M%p, %A, %B %d, %Y")
         data['total_elapsed_time'] = format_timespan_for_display(session.total_elapsed_time)
@@ -180,7 +318,7 @@ class ActivityMetaDataSerializer(serializers.ModelSerializer):
         data['start_location'] = session.start_location
 
         if secondary_activity:
-            secondary_session = Session.objects.get(file=secondary_activity)
+            secondary_session = get_session(secondary_activity)
             data['total_elapsed_time'] = format_timespan_for_display(session.total_elapsed_time + secondary_session.total_elapsed_time)
             data['total_distance'] = format_distance_for_display(session.total_distance + secondary_session.total_distance)
             data['total_calories'] = session.total_calories + secondary_session.total_calories
@@ -213,6 +351,10 @@ class ActivitiesListSerializer(serializers.ListSerializer):
 class ActivitiesSerializer(serializers.ModelSerializer):
     session = ActivityWalkSessionSerializer(many=True, read_only=True)
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related('session')
+
     class Meta:
         model = ActivityFile
         list_serializer_class = ActivitiesListSerializer
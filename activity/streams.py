@@ -0,0 +1,170 @@
+# stdlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+import zlib
+
+# 3rd Party
+from django.db import connection
+from django.db.models import BigIntegerField, ExpressionWrapper, F
+from django.utils import timezone
+import numpy as np
+
+# Internal
+from .models import ActivityData, ActivityFile, ActivityStream
+
+
+# stream: (ActivityData field the samples come from, little-endian array type)
+# Decimal fields are stored as integers scaled by 10^decimal_places, e.g.
+# altitude in decimeters and coordinates in microdegrees.
+STREAM_FIELDS = {
+    'heart_rate': ('heart_rate', '<i2'),
+    'position_lat': ('position_lat_deg', '<i4'),
+    'position_long': ('position_long_deg', '<i4'),
+    'altitude': ('altitude', '<i4'),
+    'speed': ('enhanced_speed', '<i4'),
+    'cadence': ('cadence', '<i2'),
+    'distance': ('distance', '<i4'),
+}
+TIMESTAMP_TYPE = '<i8'  # seconds since the UNIX epoch
+
+
+def _get_scale(field):
+    return getattr(field, 'decimal_places', 0)
+
+
+def pack_array(values, dtype):
+    return zlib.compress(np.asarray(values, dtype=dtype).tobytes())
+
+
+def unpack_array(blob, dtype):
+    return np.frombuffer(zlib.decompress(blob), dtype=dtype)
+
+
+def _to_scaled_integer(field, value):
+    # the value exactly as the ActivityData column stores it, already scaled for fixed-point columns
+    return field.get_db_prep_save(value, connection)
+
+
+def build_activity_stream(file, rows):
+    """
+    Packs ActivityData-shaped dicts, either rows about to be inserted or
+    rows read back with values(), into an unsaved ActivityStream.
+    """
+    rows = sorted(rows, key=lambda row: row['timestamp_utc'])
+    stream = ActivityStream(file=file, samples=len(rows))
+    stream.timestamp = pack_array([int(row['timestamp_utc'].timestamp()) for row in rows], TIMESTAMP_TYPE)
+    for name, (field_name, dtype) in STREAM_FIELDS.items():
+        field = ActivityData._meta.get_field(field_name)
+        missing = np.iinfo(dtype).min
+        values = [missing if row.get(field_name) is None else _to_scaled_integer(field, row[field_name])
+                  for row in rows]
+        setattr(stream, name, pack_array(values, dtype))
+    return stream
+
+
+def get_unix_timestamps(stream):
+    return unpack_array(stream.timestamp, TIMESTAMP_TYPE)
+
+
+def get_timestamps(stream, indexes=None):
+    """
+    Sample times as aware datetimes in the current time zone, like
+    timezone.localtime() returns them. Only the samples at indexes, in
+    order, if given.
+    """
+    tz = timezone.get_current_timezone()
+    timestamps = get_unix_timestamps(stream)
+    timestamps = (timestamps if indexes is None else timestamps[indexes]).tolist()
+    if not timestamps:
+        return []
+
+    first, last = datetime.fromtimestamp(timestamps[0], tz), datetime.fromtimestamp(timestamps[-1], tz)
+    if first.utcoffset() != last.utcoffset() or first.tzname() != last.tzname():
+        # the activity crossed a daylight saving change
+        return [datetime.fromtimestamp(timestamp, tz) for timestamp in timestamps]
+    return [first + timedelta(seconds=timestamp - timestamps[0]) for timestamp in timestamps]
+
+
+def get_values(stream, name, as_decimal=False):
+    """
+    A stream's samples, with None for missing ones. Scaled streams come
+    back as floats, or as the Decimals the ActivityData column would
+    return if as_decimal is set.
+    """
+    field_name, dtype = STREAM_FIELDS[name]
+    scale = _get_scale(ActivityData._meta.get_field(field_name))
+    missing = np.iinfo(dtype).min
+    values = unpack_array(getattr(stream, name), dtype)
+
+    if as_decimal:
+        return [None if value == missing else Decimal(value).scaleb(-scale) for value in values.tolist()]
+    if scale:
+        scaled = (values / 10 ** scale).tolist()
+        return [None if value == missing else scaled_value for value, scaled_value in zip(values.tolist(), scaled)]
+    return [None if value == missing else value for value in values.tolist()]
+
+
+def is_prefetched(file, related_name):
+    """
+    Whether a view already fetched an activity's related rows with
+    prefetch_related(), e.g. for every activity of a collection map
+    """
+    return related_name in getattr(file, '_prefetched_objects_cache', {})
+
+
+def get_stream(file_or_filename, *names):
+    """
+    Loads only the named streams of an activity, or returns None for
+    activities stored as ActivityData rows alone. Uses the stream the
+    activity was fetched with, if it was prefetched.
+    """
+    if not isinstance(file_or_filename, str) and ActivityFile.stream.is_cached(file_or_filename):
+        try:
+            return file_or_filename.stream
+        except ActivityStream.DoesNotExist:
+            return None
+
+    lookup = {'file__filename': file_or_filename} if isinstance(file_or_filename, str) else {'file': file_or_filename}
+    return ActivityStream.objects.filter(**lookup).only('samples', *names).first()
+
+
+def get_stream_coordinates(stream):
+    """
+    A stream's GPS fixes as two arrays of microdegrees. Like the map
+    serializers, a coordinate of exactly 0 counts as missing.
+    """
+    lat = unpack_array(stream.position_lat, STREAM_FIELDS['position_lat'][1]).astype(np.int64)
+    long = unpack_array(stream.position_long, STREAM_FIELDS['position_long'][1]).astype(np.int64)
+    missing = np.iinfo(STREAM_FIELDS['position_lat'][1]).min
+    fixed = (lat != missing) & (long != missing) & (lat != 0) & (long != 0)
+    return lat[fixed], long[fixed]
+
+
+def get_coordinates(file):
+    """
+    An activity's GPS fixes as two arrays of microdegrees, from its
+    stream or else from its ActivityData rows, in the order the map
+    serializers return them
+    """
+    stream = get_stream(file, 'position_lat', 'position_long')
+    if stream:
+        return get_stream_coordinates(stream)
+
+    if is_prefetched(file, 'activitydata'):
+        rows = [(int(row.position_lat_deg.scaleb(6)) if row.position_lat_deg else None,
+                 int(row.position_long_deg.scaleb(6)) if row.position_long_deg else None)
+                for row in file.activitydata.all()]
+    else:
+        # the fixed-point columns as stored, without building Decimals
+        microdegrees = {name: ExpressionWrapper(F(name), output_field=BigIntegerField())
+                        for name in ('position_lat_deg', 'position_long_deg')}
+        rows = ActivityData.objects.filter(file=file).values_list(*microdegrees.values())
+    coordinates = np.array([(lat, long) for lat, long in rows if lat and long], dtype=np.int64).reshape(-1, 2)
+    return coordinates[:, 0], coordinates[:, 1]
+
+
+def has_gps_data(file):
+    stream = get_stream(file, 'position_lat')
+    if stream:
+        return any(value is not None for value in get_values(stream, 'position_lat'))
+    return set(ActivityData.objects.filter(file=file).values_list('position_lat_sem', flat=True)) != {None}
@@ -1,3 +1,608 @@
-from django.test import TestCase
+# stdlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import io
+import json
+import math
+import random
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+# 3rd Party
+from django.core.cache import CacheHandler
+from django.db import connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import make_aware
+from fitparse import FitFile
+from geopy.exc import GeocoderServiceError
+import numpy as np
+import pytz
+
+# Internal
+from activity.geocoding import update_session_location
+from activity.leaderboard import LEADERBOARD_METRICS, build_leaderboard_entry
+from activity.models import (ActivityData, ActivityFile, ActivitySpatialSummary, ActivityStream, ActivityTrack,
+                             GeocodedLocation, LeaderboardEntry, Session)
+from activity.polylines import encode_polyline, get_zoom_tolerance, simplify_polyline
+from activity.streams import get_stream_coordinates
+from localfitserver import settings
+from localfitserver.ingest import import_fit_file
+from localfitserver.response_cache import get_response_cache_stats, invalidate_responses
+from localfitserver.testing import build_activity_file, get_upload
+from localfitserver.utils import (convert_ant_timestamps_to_unix_timestamps, convert_semicircles_array_to_degrees,
+                                  convert_semicircles_to_degrees)
+
+
+class SemicirclesArrayTests(SimpleTestCase):
+    """
+    convert_semicircles_array_to_degrees() must round every value exactly
+    as convert_semicircles_to_degrees() does.
+    """
+
+    def assertMatchesScalar(self, semicircles):
+        self.assertEqual(convert_semicircles_array_to_degrees(semicircles),
+                         [convert_semicircles_to_degrees(value) for value in semicircles])
+
+    def test_edges(self):
+        self.assertMatchesScalar([-2**31, -2**31 + 1, -1, 0, 1, 2**30, 2**31 - 1])
+
+    def test_near_ties(self):
+        # degrees * 10^6 is semicircles * 703125 / 2^23, so its fraction is within d / 2^23 of
+        # one half when semicircles * 703125 = 2^22 + d (mod 2^23), exactly halfway for d = 0
+        inverse = pow(703125, 2**22 - 1, 2**23)
+        semicircles = [(2**22 + d) * inverse % 2**23 + k * 2**23 for d in range(-8, 9) for k in range(-256, 256)]
+        self.assertMatchesScalar(semicircles)
+
+    def test_random(self):
+        rng = random.Random(0)
+        self.assertMatchesScalar([rng.randint(-2**31, 2**31 - 1) for _ in range(100000)])
+
+    def test_empty(self):
+        self.assertEqual(convert_semicircles_array_to_degrees([]), [])
+
+
+class AntTimestampsArrayTests(SimpleTestCase):
+    """
+    convert_ant_timestamps_to_unix_timestamps() must give the aware
+    datetimes of make_aware() on fitparse's date_time values.
+    """
+
+    def test_matches_fitparse(self):
+        # fitparse only turns values from 0x10000000 on into datetimes
+        ant_timestamps = [0x10000000, 0x10000001, 946684800, 1000000000, 2**31 - 1, 2**32 - 2]
+        expected = [make_aware(datetime.utcfromtimestamp(631065600 + value), timezone=pytz.UTC)
+                    for value in ant_timestamps]
+
+        timestamps = convert_ant_timestamps_to_unix_timestamps(ant_timestamps)
+        self.assertEqual(timestamps, expected)
+        self.assertTrue(all(timestamp.tzinfo is pytz.UTC for timestamp in timestamps))
+
+
+class FakeLocation(object):
+
+    def __init__(self, address):
+        self.raw = {'address': address}
+
+
+class FakeGeocoder(object):
+    """
+    Stands in for geopy's Nominatim. Records each reverse() call and
+    whether it was made inside a transaction.
+    """
+    calls = []
+    error = None
+
+    def __init__(self, user_agent):
+        pass
+
+    def reverse(self, query):
+        FakeGeocoder.calls.append((query, connection.in_atomic_block))
+        if FakeGeocoder.error:
+            raise FakeGeocoder.error
+        return FakeLocation({'road': 'Main Street', 'city': 'Springfield', 'county': 'Greene', 'state': 'Missouri'})
+
+
+@mock.patch.multiple(settings, GEOCODER=f'{__name__}.FakeGeocoder', GEOCODE_ASYNC=False, INGEST_ASYNC=False)
+class GeocodingTests(TransactionTestCase):
+    """
+    Start locations are reverse geocoded once the upload has committed,
+    and cached per rounded coordinate
+    """
+    location_name = 'Main Street, Springfield, Greene, Missouri'
+
+    def setUp(self):
+        FakeGeocoder.calls = []
+        FakeGeocoder.error = None
+        self.client = Client(SERVER_NAME='localhost')
+
+    def _upload(self, name, start_time_utc, **kwargs):
+        content = build_activity_file(start_time_utc, **kwargs)
+        response = self.client.post('/activity/upload/', {'file': get_upload(name, content)})
+        self.assertEqual(response.status_code, 201, response.content)
+        return Session.objects.get(file__filename=name.split('.')[0])
+
+    def test_geocoded_after_commit(self):
+        session = self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+
+        self.assertEqual(FakeGeocoder.calls, [('41.364686, -124.025296', False)])
+        self.assertEqual(session.start_location, self.location_name)
+
+    def test_not_geocoded_inside_transaction(self):
+        with transaction.atomic():
+            self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+            self.assertEqual(FakeGeocoder.calls, [])
+
+        self.assertEqual(len(FakeGeocoder.calls), 1)
+        self.assertEqual(Session.objects.get().start_location, self.location_name)
+
+    def test_cached_coordinate(self):
+        self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+        # starts about 10m away, the same point at GEOCODE_CACHE_PRECISION
+        session = self._upload('WALK2.FIT', datetime(2020, 6, 2, 8), start_position=(493500921, -1479679416))
+
+        self.assertEqual(len(FakeGeocoder.calls), 1)
+        self.assertEqual(GeocodedLocation.objects.count(), 1)
+        self.assertEqual(session.start_location, self.location_name)
+
+    def test_geocoder_error(self):
+        FakeGeocoder.error = GeocoderServiceError("Service unavailable")
+        with self.assertLogs('activity.geocoding', 'ERROR'):
+            session = self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+
+        self.assertEqual(len(FakeGeocoder.calls), 1)
+        self.assertIsNone(session.start_location)
+        self.assertFalse(GeocodedLocation.objects.exists())
+
+    def test_no_gps(self):
+        session = self._upload('WALK1.FIT', datetime(2020, 6, 1, 8), start_position=None)
+
+        self.assertEqual(FakeGeocoder.calls, [])
+        self.assertIsNone(session.start_location)
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class QueryCountTests(TestCase):
+    """
+    Every activity endpoint makes the same few queries however many
+    activities it covers, e.g. no serializer reads a related row per
+    activity
+    """
+    query_counts = {
+        '/activity/meta/?year=2020': 2,
+        '/activity/calendar/?year=2020': 1,
+        '/activity/top/': 1,
+        '/activity/top/?metric=ascent&type=walk': 1,
+        '/activity/meta/WALK0/': 2,
+        '/activity/map/WALK0/': 4,
+        '/activity/map/WALK0/?zoom=13&encoding=polyline': 4,
+        '/activity/map/WALK0/?layout=columnar': 4,
+        '/activity/map/collection/commute/': 3,
+        '/activity/map/collection/commute/?zoom=13': 4,
+        '/activity/map/collection/commute/?layout=columnar': 3,
+        '/activity/heart_rate/WALK0/': 2,
+        '/activity/heart_rate/WALK0/?layout=columnar': 2,
+        '/activity/altitude/WALK0/': 2,
+    }
+
+    def _upload_activities(self, count):
+        client = Client(SERVER_NAME='localhost')
+        for i in range(count):
+            sport = (11, 0) if i % 2 == 0 else (1, 0)
+            name = f"{'WALK' if sport == (11, 0) else 'RUN'}{i}.FIT"
+            content = build_activity_file(datetime(2020, 6, 1 + i, 8), sport=sport)
+            response = client.post('/activity/upload/', {'file': get_upload(name, content)})
+            self.assertEqual(response.status_code, 201, response.content)
+        ActivityFile.objects.update(activity_collection='commute')
+
+    def _assert_query_counts(self):
+        client = Client(SERVER_NAME='localhost')
+        for url, count in self.query_counts.items():
+            with self.subTest(url=url), self.assertNumQueries(count):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+
+    def test_one_activity(self):
+        self._upload_activities(1)
+        self._assert_query_counts()
+
+    def test_many_activities(self):
+        self._upload_activities(6)
+        self._assert_query_counts()
+
+
+@mock.patch.multiple(settings, GEOCODER=f'{__name__}.FakeGeocoder', GEOCODE_ASYNC=False, INGEST_ASYNC=False,
+                     RESPONSE_CACHE='responses')
+class ResponseCacheTests(TransactionTestCase):
+    """
+    The dashboard responses are cached until an upload, a PATCH or a
+    geocode changes a date they cover, in every process sharing the cache
+    """
+
+    def setUp(self):
+        FakeGeocoder.calls = []
+        FakeGeocoder.error = None
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        overridden = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'responses': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir,
+                          'TIMEOUT': None},
+        })
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.client = Client(SERVER_NAME='localhost')
+
+    def _upload(self, name, start_time_utc):
+        response = self.client.post('/activity/upload/', {'file': get_upload(name, build_activity_file(start_time_utc))})
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def _get(self, url):
+        """
+        The response's JSON, and whether it was served from the cache
+        """
+        hits = get_response_cache_stats()['hits']
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content), get_response_cache_stats()['hits'] > hits
+
+    def test_hit_and_miss(self):
+        self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+
+        data, hit = self._get('/activity/meta/?year=2020')
+        self.assertFalse(hit)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get('/activity/meta/?year=2020'), (data, True))
+        self.assertFalse(self._get('/activity/meta/?year=2019')[1])
+        self.assertFalse(self._get('/activity/calendar/?year=2020')[1])
+
+    def test_upload_invalidates_its_year(self):
+        self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+        self._get('/activity/meta/?year=2020')
+        self._get('/activity/meta/?year=2018')
+
+        self._upload('WALK2.FIT', datetime(2020, 7, 1, 8))
+        data, hit = self._get('/activity/meta/?year=2020')
+        self.assertFalse(hit)
+        self.assertEqual(sorted(activity['filename'] for activity in data), ['WALK1', 'WALK2'])
+        self.assertTrue(self._get('/activity/meta/?year=2018')[1])
+
+    def test_patch_invalidates(self):
+        self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+        self._get('/activity/calendar/?year=2020')
+        self._get('/activity/calendar/?year=2018')
+
+        response = self.client.patch('/activity/update/WALK1/', json.dumps({'activity_type': 'hike'}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        data, hit = self._get('/activity/calendar/?year=2020')
+        self.assertFalse(hit)
+        self.assertEqual([activity['activity_type'] for activity in data['activities']], ['hike'])
+        self.assertTrue(self._get('/activity/calendar/?year=2018')[1])
+
+    def test_geocode_invalidates(self):
+        FakeGeocoder.error = GeocoderServiceError("unavailable")
+        with self.assertLogs('activity.geocoding', 'ERROR'):
+            self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+        data, _ = self._get('/activity/meta/?year=2020')
+        self.assertIsNone(data[0]['start_location'])
+
+        FakeGeocoder.error = None
+        update_session_location(Session.objects.get().pk)
+        data, hit = self._get('/activity/meta/?year=2020')
+        self.assertFalse(hit)
+        self.assertEqual(data[0]['start_location'], 'Main Street, Springfield, Greene, Missouri')
+
+    def test_invalidated_by_another_process(self):
+        self._upload('WALK1.FIT', datetime(2020, 6, 1, 8))
+        self._get('/activity/meta/?year=2020')
+
+        # e.g. `manage.py ingest`, with its own cache connections
+        with mock.patch('localfitserver.response_cache.caches', CacheHandler()):
+            invalidate_responses('activity', date(2020, 6, 1), date(2020, 6, 1))
+        self.assertFalse(self._get('/activity/meta/?year=2020')[1])
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class ActivityStreamTests(TestCase):
+    """
+    An activity's samples are kept as a stream, rows or both, and read
+    back the same from either
+    """
+
+    def _import(self, name='WALK1.FIT'):
+        content = build_activity_file(datetime(2020, 6, 1, 8), samples=600)
+        return import_fit_file('activity', name, FitFile(io.BytesIO(content)), name)
+
+    def test_samples_counted(self):
+        for streams, rows, stored in [(True, False, (1, 0)), (True, True, (1, 600)), (False, False, (0, 600))]:
+            with self.subTest(streams=streams, rows=rows), \
+                    mock.patch.multiple(settings, ACTIVITY_STREAMS=streams, ACTIVITY_DATA_ROWS=rows):
+                ActivityFile.objects.all().delete()
+                self.assertEqual(self._import(), 600)
+                self.assertEqual((ActivityStream.objects.count(), ActivityData.objects.count()), stored)
+
+    @mock.patch.object(settings, 'ACTIVITY_DATA_ROWS', True)
+    def test_rows_read_like_stream(self):
+        self._import()
+        ActivityFile.objects.update(activity_collection='commute')
+        client = Client(SERVER_NAME='localhost')
+        urls = ['/activity/heart_rate/WALK1/', '/activity/heart_rate/WALK1/?layout=columnar',
+                '/activity/heart_rate/WALK1/?points=50', '/activity/altitude/WALK1/',
+                '/activity/altitude/WALK1/?layout=columnar&points=50', '/activity/meta/WALK1/',
+                '/activity/map/WALK1/', '/activity/map/WALK1/?layout=columnar', '/activity/map/WALK1/?zoom=12',
+                '/activity/map/WALK1/?zoom=13&encoding=polyline', '/activity/map/collection/commute/',
+                '/activity/map/collection/commute/?zoom=11']
+        from_stream = {url: client.get(url, HTTP_ACCEPT='application/json').content for url in urls}
+
+        ActivityStream.objects.all().delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_ACCEPT='application/json')
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(response.content, from_stream[url])
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class LeaderboardTests(TestCase):
+    """
+    /activity/top/ lists the activities a sort of every Session would,
+    and follows an activity's type when it is changed
+    """
+
+    def setUp(self):
+        rng = random.Random(0)
+        totals = {field_name: rng.sample(range(1, 10 ** 5), 36) for field_name in LEADERBOARD_METRICS.values()}
+        start = make_aware(datetime(2020, 6, 1, 8), pytz.utc)
+        for i in range(36):
+            activity_type = ['walk', 'run', 'bike'][i % 3]
+            file = ActivityFile.objects.create(filename=f'{activity_type.upper()}{i}', activity_type=activity_type,
+                                               activity_category='recorded', start_time_utc=start + timedelta(days=i))
+            session = Session.objects.create(
+                file=file, start_time_utc=file.start_time_utc,
+                total_distance=Decimal(totals['total_distance'][i]).scaleb(-2),
+                total_elapsed_time=Decimal(totals['total_elapsed_time'][i]).scaleb(-3),
+                total_calories=totals['total_calories'][i],
+                # one activity of each type without an ascent
+                total_ascent=totals['total_ascent'][i] if i >= 3 else None)
+            build_leaderboard_entry(file, session).save()
+        self.client = Client(SERVER_NAME='localhost')
+
+    def _get_top(self, query=''):
+        response = self.client.get(f'/activity/top/{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [activity['filename'] for activity in response.json()['activities']]
+
+    def _get_expected(self, field_name, activity_type=None):
+        sessions = Session.objects.exclude(**{f'{field_name}__isnull': True})
+        if activity_type:
+            sessions = sessions.filter(file__activity_type=activity_type)
+        ranked = sorted(sessions.values_list(field_name, 'file__filename'), reverse=True)
+        return [filename for _, filename in ranked][:10]
+
+    def test_metrics_and_types(self):
+        self.assertEqual(self._get_top(), self._get_expected('total_distance'))
+        for metric, field_name in LEADERBOARD_METRICS.items():
+            for activity_type in (None, 'walk', 'run', 'bike'):
+                query = f'?metric={metric}' + (f'&type={activity_type}' if activity_type else '')
+                with self.subTest(query=query):
+                    self.assertEqual(self._get_top(query), self._get_expected(field_name, activity_type))
+        self.assertEqual(self._get_top('?type=swim'), [])
+
+    def test_invalid_metric(self):
+        response = self.client.get('/activity/top/?metric=speed')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Please provide metric as one of distance, duration, calories, ascent'})
+
+    def test_update_activity_type(self):
+        filename = self._get_top('?type=walk')[0]
+        response = self.client.patch(f'/activity/update/{filename}/', json.dumps({'activity_type': 'hike'}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(LeaderboardEntry.objects.get(file__filename=filename).activity_type, 'hike')
+        self.assertEqual(self._get_top('?type=hike'), [filename])
+        self.assertNotIn(filename, self._get_top('?type=walk'))
+        self.assertEqual(self._get_top('?type=walk'), self._get_expected('total_distance', 'walk'))
+
+
+class ConditionalRequestTests(TestCase):
+    """
+    The sample endpoints answer a client holding the current version
+    with a 304, without reading any samples
+    """
+    urls = ['/activity/heart_rate/WALK1/', '/activity/altitude/WALK1/?points=50', '/activity/map/WALK1/',
+            '/activity/map/WALK1/?zoom=13&encoding=polyline']
+
+    def setUp(self):
+        patcher = mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client(SERVER_NAME='localhost')
+        for name, day in [('WALK1.FIT', 1), ('WALK2.FIT', 2)]:
+            response = self.client.post('/activity/upload/',
+                                        {'file': get_upload(name, build_activity_file(datetime(2020, 6, day, 8)))})
+            self.assertEqual(response.status_code, 201, response.content)
+
+    def _get_etags(self):
+        etags = {}
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            etags[url] = response['ETag']
+        return etags
+
+    def test_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertTrue(response['Last-Modified'])
+
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(len(queries), 1)
+                self.assertNotIn('activitystream', queries[0]['sql'])
+                self.assertNotIn('activitydata', queries[0]['sql'])
+
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_etag_varies(self):
+        etags = self._get_etags()
+        self.assertEqual(len(set(etags.values())), len(self.urls))
+        self.assertNotEqual(self.client.get(self.urls[0], HTTP_ACCEPT='application/json')['ETag'], etags[self.urls[0]])
+
+    def test_patch_changes_etag(self):
+        etags = self._get_etags()
+        response = self.client.patch('/activity/update/WALK1/', json.dumps({'activity_type': 'hike'}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        new_etags = self._get_etags()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(new_etags[url], etags[url])
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200)
+
+    def test_secondary_activity_changes_etag(self):
+        etags = self._get_etags()
+        map_url = '/activity/map/WALK1/'
+        # linked without saving WALK1, so only the link tells the versions apart
+        ActivityFile.objects.filter(filename='WALK1').update(secondary_activity=ActivityFile.objects.get(filename='WALK2'))
+        linked = self.client.get(map_url)
+        self.assertNotEqual(linked['ETag'], etags[map_url])
+        self.assertEqual(linked.json()['total_elapsed_time'], '0:04:00')
+
+        secondary = ActivityFile.objects.get(filename='WALK2')
+        secondary.activity_type = 'hike'
+        secondary.save()
+        self.assertNotEqual(self.client.get(map_url)['ETag'], linked['ETag'])
+        self.assertEqual(self.client.get(map_url, HTTP_IF_NONE_MATCH=linked['ETag']).status_code, 200)
+
+
+def douglas_peucker(x, y, tolerance, start, end):
+    """
+    The indexes of the points from start to end that Douglas-Peucker
+    keeps, splitting one segment at a time
+    """
+    furthest, furthest_distance = None, tolerance
+    for i in range(start + 1, end):
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        length_squared = dx * dx + dy * dy
+        t = min(max(((x[i] - x[start]) * dx + (y[i] - y[start]) * dy) / length_squared, 0), 1) if length_squared else 0
+        distance = math.hypot(x[i] - (x[start] + t * dx), y[i] - (y[start] + t * dy))
+        if distance > furthest_distance:
+            furthest, furthest_distance = i, distance
+    if furthest is None:
+        return [start, end]
+    return douglas_peucker(x, y, tolerance, start, furthest)[:-1] + douglas_peucker(x, y, tolerance, furthest, end)
+
+
+class PolylineTests(SimpleTestCase):
+    """
+    simplify_polyline() keeps the points recursive Douglas-Peucker keeps,
+    and encode_polyline() writes Google's format
+    """
+
+    def test_simplify(self):
+        rng = random.Random(0)
+        for samples, max_segment in [(2, 1000), (50, 1000), (3000, 1000), (500, 7)]:
+            # random walks, which double back on themselves
+            x = np.cumsum([rng.uniform(-10, 10) for _ in range(samples)])
+            y = np.cumsum([rng.uniform(-10, 10) for _ in range(samples)])
+            for tolerance in (0.5, 5, 50):
+                with self.subTest(samples=samples, max_segment=max_segment, tolerance=tolerance):
+                    expected = []
+                    ends = list(range(0, samples - 1, max_segment)) + [samples - 1]
+                    for start, end in zip(ends, ends[1:]):
+                        expected += douglas_peucker(x.tolist(), y.tolist(), tolerance, start, end)[:-1]
+                    self.assertEqual(simplify_polyline(x, y, tolerance, max_segment).tolist(), expected + [samples - 1])
+
+    def test_simplify_edges(self):
+        self.assertEqual(simplify_polyline([], [], 1).tolist(), [])
+        self.assertEqual(simplify_polyline([5], [5], 1).tolist(), [0])
+        self.assertEqual(simplify_polyline(range(100), range(100), 0.001).tolist(), [0, 99])
+        # a loop back to its start, measured from the start
+        self.assertEqual(simplify_polyline([0, 10, 0], [0, 0, 0], 1).tolist(), [0, 1, 2])
+
+    def test_encode(self):
+        # https://developers.google.com/maps/documentation/utilities/polylinealgorithm
+        self.assertEqual(encode_polyline([38500000, 40700000, 43252000], [-120200000, -120950000, -126453000]),
+                         '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(encode_polyline([], []), '')
+        # rounded half up like Math.round(), -0.000005 to 0 and 0.000005 to 0.00001
+        self.assertEqual(encode_polyline([-5, 5], [0, 0]), '??A?')
+
+    def test_zoom_tolerance(self):
+        self.assertEqual(get_zoom_tolerance(0), 360 / 256)
+        self.assertEqual(get_zoom_tolerance(13), get_zoom_tolerance(12) / 2)
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class MapTrackTests(TestCase):
+    """
+    ?zoom, ?tolerance and ?encoding simplify and encode an activity's
+    GPS fixes, from the tracks saved at upload or on the fly
+    """
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME='localhost')
+
+    def _upload(self):
+        content = build_activity_file(datetime(2020, 6, 1, 8), samples=2000)
+        response = self.client.post('/activity/upload/', {'file': get_upload('WALK1.FIT', content)})
+        self.assertEqual(response.status_code, 201, response.content)
+        return get_stream_coordinates(ActivityStream.objects.get())
+
+    def _get_points(self, query):
+        response = self.client.get(f'/activity/map/WALK1/{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['activitydata']
+
+    def _get_microdegrees(self, points):
+        return ([int(round(point['lat'] * 10 ** 6)) for point in points],
+                [int(round(point['lng'] * 10 ** 6)) for point in points])
+
+    def test_zoom_and_tolerance(self):
+        lat, long = self._upload()
+        self.assertEqual(self._get_microdegrees(self._get_points('')), (lat.tolist(), long.tolist()))
+        self.assertEqual(sorted(ActivityTrack.objects.values_list('zoom', flat=True)), settings.ACTIVITY_TRACK_ZOOMS)
+
+        for query, tolerance in [('?zoom=13', get_zoom_tolerance(13)), ('?zoom=12', get_zoom_tolerance(12)),
+                                 ('?tolerance=0.0005', 0.0005), ('?zoom=13&tolerance=0.0005', 0.0005)]:
+            with self.subTest(query=query):
+                indexes = simplify_polyline(lat, long, tolerance * 10 ** 6)
+                self.assertLess(len(indexes), len(lat))
+                self.assertEqual(self._get_microdegrees(self._get_points(query)),
+                                 (lat[indexes].tolist(), long[indexes].tolist()))
+                self.assertEqual(self._get_points(f'{query}&encoding=polyline'),
+                                 encode_polyline(lat[indexes], long[indexes]))
+        self.assertEqual(self._get_points('?encoding=polyline'), encode_polyline(lat, long))
+
+    def test_invalid_options(self):
+        self._upload()
+        for query in ['?zoom=22', '?zoom=-1', '?zoom=a', '?tolerance=0', '?tolerance=-1', '?tolerance=a',
+                      '?encoding=geojson']:
+            with self.subTest(query=query):
+                response = self.client.get(f'/activity/map/WALK1/{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_coordinates_read_once(self):
+        lat, long = self._upload()
+        summary = self.client.get('/activity/map/WALK1/?zoom=12').json()
+        ActivitySpatialSummary.objects.all().delete()
+
+        for query in ['?zoom=12', '?tolerance=0.0005', '?layout=columnar']:
+            with self.subTest(query=query), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/activity/map/WALK1/{query}')
+                self.assertEqual(response.status_code, 200, response.content)
+                # the view checks position_lat alone for GPS fixes, the track and the summary share one read of both
+                self.assertEqual(len([query for query in queries if 'activitystream"."position_long' in query['sql']]),
+                                 1)
+                self.assertEqual((response.json()['midpoint_lat_deg'], response.json()['midpoint_long_deg']),
+                                 (summary['midpoint_lat_deg'], summary['midpoint_long_deg']))
@@ -1,6 +1,6 @@
 # 3rd Party
 from django.db import transaction, IntegrityError
-from django.utils.timezone import make_aware
+from django.utils.timezone import localtime, make_aware
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError, APIException
 from rest_framework.parsers import FileUploadParser
@@ -8,10 +8,17 @@ from rest_framework.status import HTTP_400_BAD_REQUEST
 import pytz
 
 # Internal
-from .models import ActivityFile, Session, ActivityData
-from localfitserver.utils import (
-    convert_semicircles_to_degrees,
-    convert_lat_long_to_location_name)
+from .geocoding import schedule_session_location
+from .leaderboard import build_leaderboard_entry
+from .maps import build_activity_tracks, build_spatial_summary
+from .models import ActivityFile, ActivityTrack, Session, ActivityData
+from .streams import build_activity_stream, get_stream_coordinates
+from localfitserver import settings
+from localfitserver.bulk import BulkInserter
+from localfitserver.file_hash import get_unique_filename
+from localfitserver.response_cache import invalidate_responses
+from localfitserver.utils import (convert_ant_timestamps_to_unix_timestamps, convert_semicircles_array_to_degrees,
+                                  convert_semicircles_to_degrees)
 
 
 class BaseActivityFileUploadSerializer(serializers.Serializer):
@@ -20,12 +27,17 @@ class BaseActivityFileUploadSerializer(serializers.Serializer):
     generic_fields = []
     time_fields = []
     gps_fields = []
+    batch_size = settings.UPLOAD_BATCH_SIZE
+    rows_written = 0
 
-    def _save_activity_file(self, filename, start_time_utc):
+    # Decoded in a single pass by the view before the serializer is chosen
+    fit_message_names = ['sport', 'session', 'record']
+
+    def _save_activity_file(self, filename, start_time_utc, sha256):
         raise ValidationError("Child class must implement this method!")
 
-    def _get_activity_session_data(self, fit_file):
-        session_data = [row for row in fit_file.get_messages('session')][0]
+    def _get_activity_session_data(self, fit_messages):
+        session_data = fit_messages['session'][0]
         formatted_session_data = {
             'start_time_utc': make_aware(session_data.get('start_time').value, timezone=pytz.UTC),
             'total_elapsed_time': session_data.get('total_elapsed_time').value,
@@ -53,27 +65,70 @@ class BaseActivityFileUploadSerializer(serializers.Serializer):
                 'start_position_long_sem': session_data.get('start_position_long').value,
                 'start_position_lat_deg': start_position_lat_deg,
                 'start_position_long_deg': start_position_long_deg,
-                'start_location': convert_lat_long_to_location_name(start_position_lat_deg, start_position_long_deg),
             })
 
         return formatted_session_data
 
+    def _validate_file_hash(self, sha256):
+        # also called by the view before decoding, outside of is_valid(), so wrap the message
+        # in a list the way serializer validation errors are returned
+        if ActivityFile.objects.filter(sha256=sha256).exists():
+            raise ValidationError(detail={"file": ["This file has already been uploaded."]}, code=HTTP_400_BAD_REQUEST)
+
     def _validate_filename(self, filename):
-        if ActivityFile.objects.filter(filename=filename).exists():
+        # files uploaded before content hashing can only be matched by name
+        if ActivityFile.objects.filter(filename=filename, sha256__isnull=True).exists():
             raise ValidationError(detail={"file": "This file has already been uploaded."}, code=HTTP_400_BAD_REQUEST)
 
     def validate(self, attrs):
-        attrs['fit_file'] = self.initial_data['fit_file']
-        attrs['filename'] = self.initial_data['file'].name.split(".")[0]
-        self._validate_filename(attrs['filename'])
+        attrs['fit_messages'] = self.initial_data['fit_messages']
+        attrs['sha256'] = self.initial_data['sha256']
+        self._validate_file_hash(attrs['sha256'])
+
+        filename = self.initial_data['file'].name.split(".")[0]
+        self._validate_filename(filename)
+        attrs['filename'] = get_unique_filename(ActivityFile, filename, attrs['sha256'])
 
-        attrs['session_data'] = self._get_activity_session_data(self.initial_data['fit_file'])
+        attrs['session_data'] = self._get_activity_session_data(self.initial_data['fit_messages'])
         return attrs
 
+    def _get_activity_data_rows(self, file, records):
+        """
+        Timestamps and coordinates are gathered into columns and
+        converted one column at a time rather than one value at a time
+        """
+        rows = []
+        time_columns = {name: ([], []) for name in self.time_fields}
+        gps_columns = {name: ([], []) for name in self.gps_fields}
+        for index, record in enumerate(records):
+            rowdict = {'file': file}
+            for record_data in record:
+                if record_data.name in self.generic_fields:
+                    rowdict[record_data.name] = record_data.value
+                if record_data.name in self.time_fields:
+                    time_columns[record_data.name][0].append(index)
+                    time_columns[record_data.name][1].append(record_data.raw_value)
+                if record_data.name in self.gps_fields:
+                    rowdict[f'{record_data.name}_sem'] = record_data.value
+                    if record_data.value is not None:
+                        gps_columns[record_data.name][0].append(index)
+                        gps_columns[record_data.name][1].append(record_data.value)
+            rows.append(rowdict)
+
+        for name, (indexes, ant_timestamps) in time_columns.items():
+            for index, timestamp in zip(indexes, convert_ant_timestamps_to_unix_timestamps(ant_timestamps)):
+                rows[index][f'{name}_utc'] = timestamp
+        for name, (indexes, semicircles) in gps_columns.items():
+            for index, degrees in zip(indexes, convert_semicircles_array_to_degrees(semicircles)):
+                rows[index][f'{name}_deg'] = degrees
+        return rows
+
     def create(self, validated_data):
         newfiledata = None
         with transaction.atomic():
-            file = self._save_activity_file(validated_data['filename'], validated_data['session_data']['start_time_utc'])
+            file = self._save_activity_file(validated_data['filename'],
+                                            validated_data['session_data']['start_time_utc'],
+                                            validated_data['sha256'])
 
             try:
                 session = Session(file=file, **validated_data['session_data'])
@@ -81,19 +136,28 @@ class BaseActivityFileUploadSerializer(serializers.Serializer):
             except Exception as e:
                 raise ValidationError(detail={"file": "Failed to save file session data"}, code=HTTP_400_BAD_REQUEST)
 
-            for record in validated_data['fit_file'].get_messages('record'):
-                rowdict = {'file': file}
-                for record_data in record:
-                    if record_data.name in self.generic_fields:
-                        rowdict[record_data.name] = record_data.value
-                    if record_data.name in self.time_fields:
-                        rowdict[f'{record_data.name}_utc'] = make_aware(record_data.value, timezone=pytz.UTC)
-                    if record_data.name in self.gps_fields:
-                        rowdict[f'{record_data.name}_sem'] = record_data.value
-                        rowdict[f'{record_data.name}_deg'] = convert_semicircles_to_degrees(record_data.value)
-
-                newfiledata = self.Meta.model(**rowdict)
+            build_leaderboard_entry(file, session).save()
+            local_date = localtime(file.start_time_utc).date()
+            invalidate_responses('activity', local_date, local_date)
+
+            # start_location is reverse geocoded off the upload path
+            schedule_session_location(session)
+
+            rows = self._get_activity_data_rows(file, validated_data['fit_messages']['record'])
+            stream = build_activity_stream(file, rows)
+            build_spatial_summary(file, *get_stream_coordinates(stream)).save()
+            ActivityTrack.objects.bulk_create(build_activity_tracks(file, stream))
+            if settings.ACTIVITY_STREAMS:
+                newfiledata = stream
                 newfiledata.save()
+                self.rows_written = len(rows)
+
+            # with both turned off the samples are still kept, as rows
+            if settings.ACTIVITY_DATA_ROWS or not settings.ACTIVITY_STREAMS:
+                activity_data = BulkInserter(self.Meta.model, batch_size=self.batch_size)
+                for rowdict in rows:
+                    newfiledata = activity_data.add(self.Meta.model(**rowdict))
+                self.rows_written = activity_data.flush()
 
         return newfiledata
 
@@ -120,8 +184,9 @@ class ActivityWalkFileUploadSerializer(BaseActivityFileUploadSerializer):
         'position_long'
     ]
 
-    def _save_activity_file(self, filename, start_time_utc):
+    def _save_activity_file(self, filename, start_time_utc, sha256):
         file = ActivityFile(filename=filename,
+                            sha256=sha256,
                             start_time_utc=start_time_utc,
                             activity_type='walk',
                             activity_category='recorded')
@@ -134,8 +199,9 @@ class ActivityWalkFileUploadSerializer(BaseActivityFileUploadSerializer):
 
 class ActivityRunFileUploadSerializer(ActivityWalkFileUploadSerializer):
 
-    def _save_activity_file(self, filename, start_time_utc):
+    def _save_activity_file(self, filename, start_time_utc, sha256):
         file = ActivityFile(filename=filename,
+                            sha256=sha256,
                             start_time_utc=start_time_utc,
                             activity_type='run',
                             activity_category='recorded')
@@ -145,8 +211,9 @@ class ActivityRunFileUploadSerializer(ActivityWalkFileUploadSerializer):
 
 class ActivityTreadmillFileUploadSerializer(ActivityWalkFileUploadSerializer):
 
-    def _save_activity_file(self, filename, start_time_utc):
+    def _save_activity_file(self, filename, start_time_utc, sha256):
         file = ActivityFile(filename=filename,
+                            sha256=sha256,
                             start_time_utc=start_time_utc,
                             activity_type='treadmill',
                             activity_category='recorded')
@@ -159,8 +226,9 @@ class ActivityTreadmillFileUploadSerializer(ActivityWalkFileUploadSerializer):
 
 class ActivityEllipticalFileUploadSerializer(ActivityWalkFileUploadSerializer):
 
-    def _save_activity_file(self, filename, start_time_utc):
+    def _save_activity_file(self, filename, start_time_utc, sha256):
         file = ActivityFile(filename=filename,
+                            sha256=sha256,
                             start_time_utc=start_time_utc,
                             activity_type='elliptical',
                             activity_category='recorded')
@@ -179,8 +247,9 @@ class ActivityYogaFileUploadSerializer(BaseActivityFileUploadSerializer):
         'timestamp'
     ]
 
-    def _save_activity_file(self, filename, start_time_utc):
+    def _save_activity_file(self, filename, start_time_utc, sha256):
         file = ActivityFile(filename=filename,
+                            sha256=sha256,
                             start_time_utc=start_time_utc,
                             activity_type='yoga',
                             activity_category='recorded')
@@ -192,8 +261,9 @@ class ActivityYogaFileUploadSerializer(BaseActivityFileUploadSerializer):
 
 
 class ActivityStairClimbingFileUploadSerializer(ActivityYogaFileUploadSerializer):
-    def _save_activity_file(self, filename, start_time_utc):
+    def _save_activity_file(self, filename, start_time_utc, sha256):
         file = ActivityFile(filename=filename,
+                            sha256=sha256,
                             start_time_utc=start_time_utc,
                             activity_type='stairmaster',
                             activity_category='recorded')
@@ -202,10 +272,37 @@ class ActivityStairClimbingFileUploadSerializer(ActivityYogaFileUploadSerializer
 
 
 class ActivityCardioFileUploadSerializer(ActivityYogaFileUploadSerializer):
-    def _save_activity_file(self, filename, start_time_utc):
+    def _save_activity_file(self, filename, start_time_utc, sha256):
         file = ActivityFile(filename=filename,
+                            sha256=sha256,
                             start_time_utc=start_time_utc,
                             activity_type='beat_saber',
                             activity_category='recorded')
         file.save()
         return file
+
+
+SPORT_TO_SERIALIZER = {
+    (1, 0): ActivityRunFileUploadSerializer,              # Run: generic
+    (1, 1): ActivityTreadmillFileUploadSerializer,        # Run: Treadmill
+    (4, 15): ActivityEllipticalFileUploadSerializer,      # Fitness Equipment: Elliptical
+    (11, 0): ActivityWalkFileUploadSerializer,            # walk
+    (10, 43): ActivityYogaFileUploadSerializer,           # yoga
+    (4, 16): ActivityStairClimbingFileUploadSerializer,   # Fitness Equipment: Stair Climbing
+    (10, 26): ActivityCardioFileUploadSerializer,  # Training: Cardio (Beat Saber)
+}
+
+
+def get_serializer_by_sport(fit_messages):
+    """
+    When the user uploads an ANT FIT ACTIVITY file, it will not be clear
+    to them what type of activity they are uploading. Distinguish the
+    activity ("sport") type from the decoded file and select the
+    appropriate serializer for that activity.
+    """
+    sport_data = fit_messages['sport'][0]
+    try:
+        serializer = SPORT_TO_SERIALIZER[(sport_data.get("sport").raw_value, sport_data.get("sub_sport").raw_value)]
+    except KeyError:
+        raise ValidationError({"file": "Unsupported sport"})
+    return serializer
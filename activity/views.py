@@ -1,80 +1,149 @@
 # stdlib
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import hashlib
 
 # 3rd Party
 from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from fitparse import FitFile
 from rest_framework import viewsets, mixins
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_404_NOT_FOUND
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_202_ACCEPTED, HTTP_404_NOT_FOUND
 import pytz
 
 # Internal
+from .leaderboard import get_leaderboard, get_leaderboard_options
+from .maps import get_map_options, get_spatial_summary
 from .serializers import (ActivityMapDataSerializer, ActivityMetaDataSerializer, ActivityAltitudeSerializer,
                           ActivityHeartRateSerializer, ActivitiesSerializer, ActivitiesCalendarSerializer,
-                          ActivityMapCollectionSerializer)
-from .upload_serializers import (ActivityWalkFileUploadSerializer, ActivityYogaFileUploadSerializer,
-                                 ActivityStairClimbingFileUploadSerializer, ActivityCardioFileUploadSerializer,
-                                 ActivityRunFileUploadSerializer, ActivityTreadmillFileUploadSerializer,
-                                 ActivityEllipticalFileUploadSerializer)
-from .models import ActivityData, ActivityFile
+                          ActivityMapCollectionSerializer, ActivityHeartRateStreamSerializer,
+                          ActivityAltitudeStreamSerializer)
+from .streams import get_stream, has_gps_data
+from .upload_serializers import BaseActivityFileUploadSerializer, get_serializer_by_sport
+from .models import ActivityData, ActivityFile, LeaderboardEntry
+from jobs.queue import enqueue_upload
 from localfitserver import settings
+from localfitserver.file_hash import get_file_hash
+from localfitserver.fit_dispatcher import collect_messages
+from localfitserver.layouts import CHART_RENDERER_CLASSES
+from localfitserver.response_cache import cache_response, invalidate_responses
 from localfitserver.utils import format_distance_for_display, format_timespan_for_display, format_date_for_display
 
 
+def _get_activity_version(request, filename):
+    # the activity's modified time and secondary activity, and the secondary's modified time, read once per request
+    if not hasattr(request, '_activity_version'):
+        request._activity_version = ActivityFile.objects.filter(filename=filename).values_list(
+            'modified_time_utc', 'secondary_activity', 'secondary_activity__modified_time_utc').first()
+    return request._activity_version
+
+
+def get_activity_modified_time(request, filename):
+    """
+    When an activity, or the secondary activity whose session totals its
+    map adds up with its own, was uploaded or last changed. None if it
+    does not exist.
+    """
+    version = _get_activity_version(request, filename)
+    if version is None:
+        return None
+    modified_time, _, secondary_modified_time = version
+    return max(modified_time, secondary_modified_time) if secondary_modified_time else modified_time
+
+
+def get_activity_etag(request, filename):
+    """
+    A strong ETag of one representation of an activity's samples. The
+    samples never change after upload, so it is a hash of the versions of
+    the activity and its secondary activity, and what else the payload
+    depends on: the endpoint, its query string (e.g. ?points, ?zoom), the
+    negotiated format and the time zone.
+    """
+    version = _get_activity_version(request, filename)
+    if version is None:
+        return None
+    modified_time, secondary_activity, secondary_modified_time = version
+    version = [request.path, modified_time.isoformat(), str(secondary_activity),
+               secondary_modified_time.isoformat() if secondary_modified_time else '',
+               request.META.get('QUERY_STRING', ''), request.META.get('HTTP_ACCEPT', ''), settings.TIME_ZONE]
+    return hashlib.sha256('\n'.join(version).encode()).hexdigest()
+
+
+# answers 304 to a matching If-None-Match or If-Modified-Since before the view reads any samples
+activity_condition = condition(etag_func=get_activity_etag, last_modified_func=get_activity_modified_time)
+
+
+@activity_condition
 @api_view(['GET'])
+@renderer_classes(CHART_RENDERER_CLASSES)
 def activity_heart_rate(request, filename):
     try:
+        stream = get_stream(filename, 'timestamp', 'heart_rate')
+        if stream:
+            return Response(ActivityHeartRateStreamSerializer(stream, context={'request': request}).data)
+
         data = ActivityData.objects.filter(file__filename=filename).order_by('timestamp_utc')
-        serializer = ActivityHeartRateSerializer(data, many=True)
+        serializer = ActivityHeartRateSerializer(data, many=True, context={'request': request})
         return Response(serializer.data)
     except ActivityFile.DoesNotExist:
         return HttpResponse(status=404)
 
 
+@activity_condition
 @api_view(['GET'])
+@renderer_classes(CHART_RENDERER_CLASSES)
 def activity_altitude(request, filename):
     try:
+        stream = get_stream(filename, 'timestamp', 'altitude')
+        if stream:
+            return Response(ActivityAltitudeStreamSerializer(stream, context={'request': request}).data)
+
         data = ActivityData.objects.filter(file__filename=filename).order_by('timestamp_utc')
-        serializer = ActivityAltitudeSerializer(data, many=True)
+        serializer = ActivityAltitudeSerializer(data, many=True, context={'request': request})
         return Response(serializer.data)
     except ActivityFile.DoesNotExist:
         return HttpResponse(status=404)
 
 
+@activity_condition
 @api_view(['GET'])
+@renderer_classes(CHART_RENDERER_CLASSES)
 def activity_map(request, filename):
     try:
-        file = ActivityFile.objects.get(filename=filename)
+        file = ActivityMapDataSerializer.setup_eager_loading(ActivityFile.objects.all()).get(filename=filename)
     except ActivityFile.DoesNotExist:
         return HttpResponse(status=HTTP_404_NOT_FOUND)
 
     # not all files have GPS data
-    if set(ActivityData.objects.filter(file=file).values_list('position_lat_sem', flat=True)) == {None}:
+    summary = get_spatial_summary(file)
+    if not (summary.has_gps_data if summary else has_gps_data(file)):
         return HttpResponse(status=HTTP_404_NOT_FOUND)
 
-    serializer = ActivityMapDataSerializer(file)
+    serializer = ActivityMapDataSerializer(file, context={'request': request})
     return Response(serializer.data)
 
 
 @api_view(['GET'])
+@renderer_classes(CHART_RENDERER_CLASSES)
 def activity_collection_map(request, collection):
     try:
         files = ActivityFile.objects.filter(activity_collection=collection)
     except ActivityFile.DoesNotExist:
         return HttpResponse(status=HTTP_404_NOT_FOUND)
 
-    serializer = ActivityMapCollectionSerializer(files, many=True)
+    files = ActivityMapCollectionSerializer.setup_eager_loading(files, get_map_options({'request': request}).get('zoom'))
+    serializer = ActivityMapCollectionSerializer(files, many=True, context={'request': request})
     return Response(serializer.data)
 
 
 @api_view(['GET'])
 def activity(request, filename):
     try:
-        activity_file = ActivityFile.objects.get(filename=filename)
+        activity_file = ActivityMetaDataSerializer.setup_eager_loading(ActivityFile.objects.all()).get(filename=filename)
         serializer = ActivityMetaDataSerializer(activity_file)
         return Response(serializer.data)
     except ActivityFile.DoesNotExist:
@@ -92,6 +161,7 @@ def update_activity(request, filename):
     activity_type = request.data.get('activity_type')
     if activity_type:
         activity_file.activity_type = activity_type
+        LeaderboardEntry.objects.filter(file=activity_file).update(activity_type=activity_type)
 
     activity_collection = request.data.get('activity_collection')
     if activity_collection:
@@ -102,10 +172,24 @@ def update_activity(request, filename):
         activity_file.start_location = start_location
 
     activity_file.save()
+    local_date = timezone.localtime(activity_file.start_time_utc).date()
+    invalidate_responses('activity', local_date, local_date)
 
     return JsonResponse({"activity_type": activity_file.activity_type})
 
 
+def get_year_span(request):
+    """
+    The dates a ?year= response covers, None without a valid year
+    """
+    try:
+        start_date = date(int(request.GET.get('year')), 1, 1)
+    except (TypeError, ValueError):
+        return None
+    return start_date, start_date + timedelta(days=366)
+
+
+@cache_response('activity', get_year_span)
 @api_view(['GET'])
 def activities(request):
     try:
@@ -118,6 +202,7 @@ def activities(request):
         end_date_dt = start_date_dt + timedelta(days=366)
         data = ActivityFile.objects.filter(start_time_utc__gte=start_date_dt,
                                            start_time_utc__lt=end_date_dt).order_by('-start_time_utc')
+        data = ActivitiesSerializer.setup_eager_loading(data)
         serializer = ActivitiesSerializer(data, many=True)
         return Response(serializer.data)
     except ActivityFile.DoesNotExist:
@@ -126,29 +211,24 @@ def activities(request):
 
 @api_view(['GET'])
 def top_activities(request):
-    data = ActivityFile.objects.all().order_by('-session__total_distance'
-                                               ).values('session__total_distance',
-                                                        'activity_type',
-                                                        'session__start_location',
-                                                        'session__start_time_utc',
-                                                        'session__total_elapsed_time',
-                                                        'session__total_calories',
-                                                        'filename')
+    data = get_leaderboard(*get_leaderboard_options(request.query_params))
 
     activities = [
         {
-            'total_distance': format_distance_for_display(activity['session__total_distance']),
+            'total_distance': format_distance_for_display(activity['total_distance']) if activity['total_distance'] is not None else None,
             'start_location': activity['session__start_location'],
             'start_time_utc': activity['session__start_time_utc'].strftime("%A, %B %d, %Y"),
-            'total_elapsed_time': format_timespan_for_display(activity['session__total_elapsed_time']) if activity['session__total_elapsed_time'] else '--:--:--',
+            'total_elapsed_time': format_timespan_for_display(activity['total_elapsed_time']) if activity['total_elapsed_time'] else '--:--:--',
             'activity_type': activity['activity_type'],
-            'total_calories': activity['session__total_calories'],
-            'filename': activity['filename'],
-        } for activity in data[:10]
+            'total_calories': activity['total_calories'],
+            'total_ascent': activity['total_ascent'],
+            'filename': activity['file__filename'],
+        } for activity in data
     ]
     return JsonResponse({"activities": activities})
 
 
+@method_decorator(cache_response('activity', get_year_span), name='dispatch')
 class ActivitiesCalendarList(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = ActivityFile.objects.all()
     serializer_class = ActivitiesCalendarSerializer
@@ -177,23 +257,8 @@ class ActivityFileUpload(viewsets.ModelViewSet, mixins.CreateModelMixin):
 
     queryset = ActivityData.objects.all()
 
-    SPORT_TO_SERIALIZER = {
-        (1, 0): ActivityRunFileUploadSerializer,              # Run: generic
-        (1, 1): ActivityTreadmillFileUploadSerializer,        # Run: Treadmill
-        (4, 15): ActivityEllipticalFileUploadSerializer,      # Fitness Equipment: Elliptical
-        (11, 0): ActivityWalkFileUploadSerializer,            # walk
-        (10, 43): ActivityYogaFileUploadSerializer,           # yoga
-        (4, 16): ActivityStairClimbingFileUploadSerializer,   # Fitness Equipment: Stair Climbing
-        (10, 26): ActivityCardioFileUploadSerializer,  # Training: Cardio (Beat Saber)
-    }
-
     def _get_serializer_by_sport(self, kwargs):
-        sport_data = [r for r in kwargs['fit_file'].get_messages('sport') if r.type == 'data'][0]
-        try:
-            serializer = self.SPORT_TO_SERIALIZER[(sport_data.get("sport").raw_value, sport_data.get("sub_sport").raw_value)]
-        except KeyError:
-            raise ValidationError({"file": "Unsupported sport"})
-        return serializer
+        return get_serializer_by_sport(kwargs['fit_messages'])
 
     def get_serializer(self, *args, **kwargs):
         serializer_class = self._get_serializer_by_sport(kwargs['data'])
@@ -204,12 +269,21 @@ class ActivityFileUpload(viewsets.ModelViewSet, mixins.CreateModelMixin):
         if not request.FILES.get('file'):
             raise ValidationError({"file": "Please provide a file"})
 
+        # identical bytes were already uploaded, don't bother decoding them
+        request.data['sha256'] = get_file_hash(request.FILES['file'])
+        BaseActivityFileUploadSerializer()._validate_file_hash(request.data['sha256'])
+
+        if settings.INGEST_ASYNC:
+            job = enqueue_upload('activity', request.FILES['file'], request.data['sha256'])
+            return Response({'job_id': job.pk, 'state': job.state, 'status_url': f'/jobs/{job.pk}/'},
+                            status=HTTP_202_ACCEPTED)
+
         try:
             fit_file = FitFile(request.FILES['file'])
         except FileNotFoundError:
             raise ValidationError({"file": "File does not exist"})
 
-        request.data['fit_file'] = fit_file
+        request.data['fit_messages'] = collect_messages(fit_file, BaseActivityFileUploadSerializer.fit_message_names)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
@@ -0,0 +1,66 @@
+"""
+Times the chart endpoints on a 50k-point range, localizing the sample
+times a column at a time (convert_unix_timestamps_to_local_times) and
+one row at a time with timezone.localtime(), as they were before.
+
+    python -m benchmarks.chart_reads [--samples 50000] [--repeat 5]
+"""
+# stdlib
+import argparse
+import io
+from unittest import mock
+
+# Internal
+from benchmarks.common import format_seconds, setup_django, time_runs
+
+
+def localize_per_row(unix_timestamps):
+    from datetime import datetime
+    from django.utils import timezone
+    import pytz
+
+    return [timezone.localtime(datetime.fromtimestamp(int(unix_timestamp), tz=pytz.UTC))
+            for unix_timestamp in unix_timestamps]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=50000, help="records in the activity, minutes of monitoring")
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    # the activity as ActivityData rows, the path that localizes its times
+    setup_django(RESPONSE_CACHE=None, ACTIVITY_STREAMS=False)
+    from datetime import datetime, timedelta
+    from django.test import Client
+    from fitparse import FitFile
+
+    from localfitserver import base_serializers
+    from localfitserver.ingest import import_fit_file
+    from localfitserver.testing import build_activity_file, build_monitor_file
+
+    start = datetime(2020, 6, 1, 12)
+    import_fit_file('activity', 'ACTIVITY.FIT',
+                    FitFile(io.BytesIO(build_activity_file(start, samples=options.samples))), 'activity')
+    import_fit_file('monitor', 'MONITOR.FIT',
+                    FitFile(io.BytesIO(build_monitor_file(start, minutes=options.samples))), 'monitor')
+
+    end = start + timedelta(minutes=options.samples, days=2)
+    time_range = f"start_date=2020-06-01 00:00:00&end_date={end:%Y-%m-%d} 00:00:00"
+    client = Client(SERVER_NAME='localhost')
+    for url in ['/activity/heart_rate/ACTIVITY/', '/activity/altitude/ACTIVITY/',
+                f'/monitor/heart_rate/?{time_range}', f'/monitor/stress_data/?{time_range}']:
+        def get():
+            return client.get(url, HTTP_ACCEPT='application/json').content
+
+        content = get()
+        with mock.patch.object(base_serializers, 'convert_unix_timestamps_to_local_times', localize_per_row):
+            identical = get() == content
+            per_row = time_runs(get, options.repeat)
+        print(f"{url.split('?')[0]}  {len(content) // 1024} KiB, identical: {identical}")
+        print(f"  {'column':>8}  {format_seconds(time_runs(get, options.repeat))}")
+        print(f"  {'per row':>8}  {format_seconds(per_row)}")
+
+
+if __name__ == '__main__':
+    main()
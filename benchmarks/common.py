@@ -0,0 +1,70 @@
+# stdlib
+import atexit
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+# Internal
+from localfitserver import settings
+
+
+class OfflineGeocoder(object):
+    """
+    Answers every reverse geocode with the same address, so uploads
+    never wait on Nominatim
+    """
+
+    class Location(object):
+        raw = {'address': {'road': 'Main Street', 'city': 'Springfield', 'county': 'Greene', 'state': 'Missouri'}}
+
+    def __init__(self, user_agent):
+        pass
+
+    def reverse(self, query):
+        return self.Location()
+
+
+def setup_django(**overrides):
+    """
+    Points the server at a new SQLite database and response cache in a
+    temporary directory, sets up Django and migrates it. overrides replace settings, e.g.
+    SQLITE_PRAGMAS={}. Returns the database's path.
+    """
+    directory = tempfile.mkdtemp(prefix='localfit-benchmark-')
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    path = os.path.join(directory, 'db.sqlite3')
+    settings.DATABASES['default']['NAME'] = path
+    settings.CACHES['responses']['LOCATION'] = os.path.join(directory, 'response_cache')
+    settings.GEOCODER = 'benchmarks.common.OfflineGeocoder'
+    settings.GEOCODE_ASYNC = False
+    settings.INGEST_ASYNC = False
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'localfitserver.settings')
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return path
+
+
+def time_runs(run, repeat, setup=None):
+    """
+    Seconds each of repeat calls of run() takes, calling setup() untimed before each
+    """
+    seconds = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def format_seconds(seconds):
+    return f"best {min(seconds):.3f}s, median {statistics.median(seconds):.3f}s of {len(seconds)}"
@@ -0,0 +1,121 @@
+"""
+Times chart reads on their own and while activities are being imported,
+to compare SQLite with and without SQLITE_PRAGMAS (WAL mode).
+
+    python -m benchmarks.concurrent_reads [--no-pragmas] [--readers 2] [--uploads 6]
+"""
+# stdlib
+import argparse
+import io
+import threading
+import time
+
+# Internal
+from benchmarks.common import setup_django
+
+
+READ_URLS = [
+    '/monitor/heart_rate/?start_date=2020-06-01 00:00:00&end_date=2020-06-02 00:00:00',
+    '/activity/heart_rate/READ/',
+]
+
+
+def read_until(done, latencies, errors):
+    """
+    Requests READ_URLS over and over until done is set
+    """
+    from django.db import connection
+    from django.test import Client
+
+    client = Client(SERVER_NAME='localhost')
+    while not done.is_set():
+        for url in READ_URLS:
+            start = time.perf_counter()
+            try:
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise AssertionError(f"{url}: {response.status_code}")
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                # e.g. "database is locked"
+                errors.append(repr(e))
+    connection.close()
+
+
+def time_reads(readers, duration=None, writer=None):
+    """
+    Latencies of readers threads reading for duration seconds, or for
+    as long as writer() runs
+    """
+    done = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=read_until, args=(done, latencies, errors)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    if writer:
+        writer()
+    else:
+        time.sleep(duration)
+    done.set()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors
+
+
+def format_latencies(latencies, errors):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+    return (f"{len(latencies)} reads, p50 {percentile(.5):.0f}ms, p95 {percentile(.95):.0f}ms, "
+            f"max {percentile(1):.0f}ms, {len(errors)} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--no-pragmas', action='store_true', help="open SQLite with its defaults (rollback journal)")
+    parser.add_argument('--readers', type=int, default=2, help="reading threads")
+    parser.add_argument('--uploads', type=int, default=6, help="activities imported while reading")
+    parser.add_argument('--samples', type=int, default=20000, help="records per imported activity")
+    options = parser.parse_args()
+
+    setup_django(**({'SQLITE_PRAGMAS': {}} if options.no_pragmas else {}))
+    from datetime import datetime, timedelta
+    from django.db import connection
+    from fitparse import FitFile
+
+    from localfitserver.fit_dispatcher import DecodedFitFile
+    from localfitserver.ingest import FIT_MESSAGE_NAMES, import_fit_file
+    from localfitserver.testing import build_activity_file, build_monitor_file
+
+    def fit_file(content):
+        return FitFile(io.BytesIO(content))
+
+    import_fit_file('monitor', 'MONITOR.FIT', fit_file(build_monitor_file(datetime(2020, 6, 1), minutes=3 * 24 * 60)),
+                    'monitor')
+    import_fit_file('activity', 'READ.FIT', fit_file(build_activity_file(datetime(2020, 6, 1, 8), samples=5000)),
+                    'read')
+    # decoded up front, so the writer spends its time in the database
+    uploads = [DecodedFitFile.from_fit_file(fit_file(build_activity_file(datetime(2020, 6, 2, 8) + timedelta(days=i),
+                                                                         samples=options.samples)),
+                                            FIT_MESSAGE_NAMES['activity'])
+               for i in range(options.uploads)]
+    with connection.cursor() as cursor:
+        journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+    connection.close()
+
+    write_seconds = []
+
+    def write():
+        start = time.perf_counter()
+        for i, decoded in enumerate(uploads):
+            import_fit_file('activity', f'WRITE{i}.FIT', decoded, f'write{i}')
+        write_seconds.append(time.perf_counter() - start)
+        connection.close()
+
+    print(f"journal_mode {journal_mode}, {options.readers} readers")
+    print(f"reads alone:         {format_latencies(*time_reads(options.readers, duration=5))}")
+    print(f"reads during ingest: {format_latencies(*time_reads(options.readers, writer=write))}")
+    print(f"ingest of {options.uploads} activities of {options.samples} samples: {write_seconds[0]:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Times FastJSONRenderer against REST framework's JSONRenderer on the
+chart and map payloads of a long activity and a few days of monitor data.
+
+    python -m benchmarks.json_rendering [--samples 20000] [--repeat 20]
+"""
+# stdlib
+import argparse
+import io
+
+# Internal
+from benchmarks.common import format_seconds, setup_django, time_runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=20000, help="records in the activity")
+    parser.add_argument('--repeat', type=int, default=20)
+    options = parser.parse_args()
+
+    setup_django(RESPONSE_CACHE=None)
+    from datetime import datetime
+    from django.test import Client
+    from fitparse import FitFile
+    from rest_framework.renderers import JSONRenderer
+
+    from localfitserver.ingest import import_fit_file
+    from localfitserver.renderers import FastJSONRenderer
+    from localfitserver.testing import build_activity_file, build_monitor_file
+
+    import_fit_file('activity', 'ACTIVITY.FIT',
+                    FitFile(io.BytesIO(build_activity_file(datetime(2020, 6, 1, 8), samples=options.samples))),
+                    'activity')
+    import_fit_file('monitor', 'MONITOR.FIT',
+                    FitFile(io.BytesIO(build_monitor_file(datetime(2020, 6, 1, 12), minutes=3 * 24 * 60))),
+                    'monitor')
+
+    client = Client(SERVER_NAME='localhost')
+    renderers = {'JSONRenderer': JSONRenderer(), 'FastJSONRenderer': FastJSONRenderer()}
+    for url in ['/activity/heart_rate/ACTIVITY/', '/activity/altitude/ACTIVITY/', '/activity/map/ACTIVITY/',
+                '/monitor/heart_rate/?start_date=2020-06-01 00:00:00&end_date=2020-06-04 00:00:00',
+                '/monitor/stress_data/?start_date=2020-06-01 00:00:00&end_date=2020-06-04 00:00:00']:
+        data = client.get(url, HTTP_ACCEPT='application/json').data
+        rendered = {name: renderer.render(data, 'application/json') for name, renderer in renderers.items()}
+        identical = len(set(rendered.values())) == 1
+        print(f"{url}  {len(rendered['JSONRenderer']) // 1024} KiB, identical: {identical}")
+        for name, renderer in renderers.items():
+            seconds = time_runs(lambda: renderer.render(data, 'application/json'), options.repeat)
+            print(f"  {name:>16}  {format_seconds(seconds)}")
+
+
+if __name__ == '__main__':
+    main()
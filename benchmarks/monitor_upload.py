@@ -0,0 +1,117 @@
+"""
+Times a monitor upload through the current serializer against the
+per-row path it replaced, on a generated file of several days.
+
+    python -m benchmarks.monitor_upload [--days 3] [--repeat 5]
+"""
+# stdlib
+import argparse
+import io
+
+# Internal
+from benchmarks.common import format_seconds, setup_django, time_runs
+
+
+def legacy_monitor_upload(fit_file, filename):
+    """
+    The monitor upload before batching: a pass over the file per message
+    type, a datetime conversion and an INSERT per sample. It doesn't keep
+    DailySummary up to date.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    import pytz
+
+    from localfitserver import settings
+    from localfitserver.utils import bitswap_ant_timestamp_to_unix_timestamp
+    from monitor.models import HeartRateData, MonitorFile, RestingMetRateData, StepData, StressData
+
+    with transaction.atomic():
+        monitor_file = MonitorFile.objects.create(filename=filename)
+
+        step_data = {'file': monitor_file}
+        for row in fit_file.get_messages('monitoring'):
+            for col in row:
+                if col.name == 'timestamp' and not step_data.get('date'):
+                    step_data['date'] = timezone.make_aware(col.value, timezone=pytz.UTC)
+                if col.name == 'steps' and col.value > step_data.get('steps', 0):
+                    step_data['steps'] = col.value
+        local_date = step_data['date'].astimezone(pytz.timezone(settings.TIME_ZONE)).date()
+        step_data_obj, _ = StepData.objects.get_or_create(date=local_date)
+        step_data_obj.steps = max(step_data_obj.steps or 0, step_data['steps'])
+        step_data_obj.save()
+
+        for row in fit_file.get_messages('stress_level'):
+            stress_data = {'file': monitor_file}
+            for col in row:
+                if col.name == 'stress_level_value':
+                    stress_data[col.name] = col.value
+                if col.name == 'stress_level_time':
+                    stress_data['stress_level_time_utc'] = timezone.make_aware(col.value, timezone=pytz.UTC)
+            StressData(**stress_data).save()
+
+        most_recent_timestamp_ant_epoch = None
+        for row in fit_file.get_messages('monitoring'):
+            heart_rate_data = {'file': monitor_file}
+            for col in row:
+                if col.name == 'heart_rate':
+                    heart_rate_data[col.name] = col.value
+                if col.name == 'timestamp':
+                    heart_rate_data['timestamp_utc'] = timezone.make_aware(col.value, timezone=pytz.UTC)
+                    most_recent_timestamp_ant_epoch = col.raw_value
+                if col.name == 'timestamp_16':
+                    heart_rate_data['timestamp_utc'] = bitswap_ant_timestamp_to_unix_timestamp(
+                        most_recent_timestamp_ant_epoch, col.raw_value)
+            if heart_rate_data.get('heart_rate'):
+                HeartRateData(**heart_rate_data).save()
+
+        for row in fit_file.get_messages('monitoring_info'):
+            resting_metabolic_rate_data = {'file': monitor_file}
+            for col in row:
+                if col.name == 'resting_metabolic_rate':
+                    resting_metabolic_rate_data[col.name] = col.value
+                if col.name == 'timestamp':
+                    resting_metabolic_rate_data['timestamp_utc'] = timezone.make_aware(col.value, timezone=pytz.UTC)
+            RestingMetRateData(**resting_metabolic_rate_data).save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=3, help="days of monitor data in the file")
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    setup_django()
+    from datetime import datetime
+    from fitparse import FitFile
+
+    from localfitserver.ingest import import_fit_file
+    from localfitserver.testing import build_monitor_file
+    from monitor.models import DailySummary, MonitorFile, StepData
+
+    content = build_monitor_file(datetime(2020, 6, 1), minutes=options.days * 24 * 60)
+
+    def parsed():
+        fit_file = FitFile(io.BytesIO(content))
+        fit_file.parse()
+        return fit_file
+
+    def clear():
+        MonitorFile.objects.all().delete()
+        StepData.objects.all().delete()
+        DailySummary.objects.all().delete()
+
+    paths = {
+        'current': lambda fit_file: import_fit_file('monitor', 'MONITOR.FIT', fit_file, 'benchmark'),
+        'per-row (old)': lambda fit_file: legacy_monitor_upload(fit_file, 'MONITOR'),
+    }
+    print(f"{len(content) // 1024} KiB monitor file, {options.days} days")
+    for name, upload in paths.items():
+        decoded = parsed()
+        save_only = time_runs(lambda: upload(decoded), options.repeat, setup=clear)
+        with_decoding = time_runs(lambda: upload(parsed()), options.repeat, setup=clear)
+        print(f"{name:>14}  save: {format_seconds(save_only)}  decode and save: {format_seconds(with_decoding)}")
+
+
+if __name__ == '__main__':
+    main()
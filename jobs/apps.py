@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.core.signals import request_started
+
+
+class JobsConfig(AppConfig):
+    name = 'jobs'
+
+    def ready(self):
+        # not here: ready() also runs for migrate and every other management command
+        from jobs.queue import drain_queue_on_startup
+        request_started.connect(drain_queue_on_startup, dispatch_uid='jobs.drain_queue_on_startup')
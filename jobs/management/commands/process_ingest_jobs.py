@@ -0,0 +1,33 @@
+# 3rd Party
+from django.core.management.base import BaseCommand
+
+# Internal
+from jobs.queue import recover_stale_jobs, run_next_job
+from localfitserver import settings
+
+
+class Command(BaseCommand):
+    """
+    The server drains the queue left by its last run on its first
+    request. This command drains it without starting the server, e.g.
+    from cron. Jobs left running are requeued first, once they have been
+    running for --stale-after seconds.
+    """
+    help = "Run every queued ingest job"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-after', type=int, default=settings.INGEST_JOB_TIMEOUT,
+                            help="Requeue jobs running for longer than this many seconds, 0 while the server is "
+                                 "stopped (default: INGEST_JOB_TIMEOUT)")
+
+    def handle(self, *args, **options):
+        for job in recover_stale_jobs(timeout=options['stale_after']):
+            self.stdout.write(f"Job {job.pk} {job.filename} was left running: {job.state}")
+
+        processed = 0
+        job = run_next_job()
+        while job:
+            processed += 1
+            self.stdout.write(f"Job {job.pk} {job.filename}: {job.state}, {job.rows_written} rows")
+            job = run_next_job()
+        self.stdout.write(f"Processed {processed} jobs")
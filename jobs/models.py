@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class IngestJob(models.Model):
+    """
+    An uploaded FIT file waiting for, or going through, ingestion by the
+    local worker pool. The table doubles as the queue; see jobs.queue.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    file_type = models.CharField(max_length=20)                     # activity, monitor
+    filename = models.CharField(max_length=255)                     # name of the uploaded file, e.g. 9CUB1048.FIT
+    path = models.CharField(max_length=500)                         # spooled copy of the upload
+    sha256 = models.CharField(max_length=64)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=QUEUED, db_index=True)
+    rows_written = models.IntegerField(default=0)
+    stage_timings = models.TextField(default='{}')                  # JSON, seconds per stage
+    errors = models.TextField(null=True)                            # JSON
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
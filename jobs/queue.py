@@ -0,0 +1,174 @@
+# stdlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+# 3rd Party
+from django.db import connection, transaction
+from django.utils import timezone
+from fitparse import FitFile
+from rest_framework.exceptions import ValidationError
+
+# Internal
+from .models import IngestJob
+from localfitserver import settings
+from localfitserver.ingest import import_fit_file
+
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS, thread_name_prefix='ingest')
+
+# set once this process has started draining the jobs a previous one left behind
+_startup_drain = threading.Event()
+
+
+def recover_stale_jobs(requeue=True, timeout=None, **filters):
+    """
+    Jobs matching filters that have been running for more than timeout
+    seconds (INGEST_JOB_TIMEOUT by default), e.g. because the server
+    stopped halfway through them. Requeues those whose spooled file is
+    still there if requeue is set, and fails the others. Returns them.
+    """
+    timeout = settings.INGEST_JOB_TIMEOUT if timeout is None else timeout
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = IngestJob.objects.filter(state=IngestJob.RUNNING, started_at__lte=cutoff, **filters)
+    recovered = []
+    for job in stale.order_by('id'):
+        if requeue and os.path.exists(job.path):
+            changes = {'state': IngestJob.QUEUED, 'started_at': None}
+        else:
+            changes = {'state': IngestJob.FAILED, 'finished_at': timezone.now(),
+                       'errors': json.dumps(["The import was interrupted before it finished."])}
+        # unless its worker finished it in the meantime
+        if IngestJob.objects.filter(pk=job.pk, state=IngestJob.RUNNING).update(**changes):
+            for field, value in changes.items():
+                setattr(job, field, value)
+            recovered.append(job)
+    return recovered
+
+
+def enqueue_upload(file_type, upload, sha256):
+    """
+    Spools an uploaded file to disk and queues it for ingestion once the
+    current transaction commits. Returns the IngestJob.
+    """
+    # a job of the same bytes that has been running too long won't finish, this upload replaces it
+    recover_stale_jobs(requeue=False, sha256=sha256)
+    if IngestJob.objects.filter(sha256=sha256, state__in=[IngestJob.QUEUED, IngestJob.RUNNING]).exists():
+        raise ValidationError(detail={"file": ["This file is already being imported."]})
+
+    os.makedirs(settings.INGEST_SPOOL_DIR, exist_ok=True)
+    # a file per job, a job that is given up on must not remove the spool of the upload replacing it
+    path = os.path.join(settings.INGEST_SPOOL_DIR, f'{uuid.uuid4().hex}.FIT')
+    with open(path, 'wb') as spool:
+        for chunk in upload.chunks():
+            spool.write(chunk)
+
+    job = IngestJob.objects.create(file_type=file_type, filename=upload.name, path=path, sha256=sha256)
+    transaction.on_commit(lambda: _executor.submit(run_queued_jobs))
+    return job
+
+
+def claim_next_job():
+    """
+    Marks the oldest queued job as running and returns it, or None when
+    the queue is empty. The conditional UPDATE makes the claim safe when
+    several workers race for the same job.
+    """
+    for job in IngestJob.objects.filter(state=IngestJob.QUEUED).order_by('id')[:5]:
+        started_at = timezone.now()
+        claimed = IngestJob.objects.filter(pk=job.pk, state=IngestJob.QUEUED).update(
+            state=IngestJob.RUNNING, started_at=started_at)
+        if claimed:
+            job.state, job.started_at = IngestJob.RUNNING, started_at
+            return job
+    return None
+
+
+def run_job(job):
+    timings = {'queued': (job.started_at - job.created_at).total_seconds()}
+    try:
+        started = time.perf_counter()
+        fit_file = FitFile(job.path)
+        fit_file.parse()
+        timings['decode'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        # not wrapped in a transaction here: the serializer's own starts with a write, so SQLite
+        # waits for the write lock instead of failing when another writer commits first
+        job.rows_written = import_fit_file(job.file_type, job.filename, fit_file, job.sha256)
+        timings['persist'] = time.perf_counter() - started
+        job.state = IngestJob.SUCCEEDED
+    except ValidationError as e:
+        job.state, job.errors = IngestJob.FAILED, json.dumps(e.detail)
+    except Exception as e:
+        logger.exception("Ingest job %s failed", job.pk)
+        job.state, job.errors = IngestJob.FAILED, json.dumps([str(e) or e.__class__.__name__])
+
+    job.finished_at = timezone.now()
+    job.stage_timings = json.dumps(timings)
+    finished = IngestJob.objects.filter(pk=job.pk, state=IngestJob.RUNNING).update(
+        state=job.state, rows_written=job.rows_written, errors=job.errors, finished_at=job.finished_at,
+        stage_timings=job.stage_timings)
+    if not finished:
+        # recover_stale_jobs() gave up on it in the meantime, whatever it decided stands
+        logger.warning("Ingest job %s finished after it was recovered as stale", job.pk)
+        job.refresh_from_db()
+
+    # a requeued job still needs its file
+    if job.state != IngestJob.QUEUED and os.path.exists(job.path):
+        os.remove(job.path)
+    return job
+
+
+def run_next_job():
+    """
+    Claims and runs the oldest queued job, returns it or None when the
+    queue is empty
+    """
+    job = claim_next_job()
+    return run_job(job) if job else None
+
+
+def run_queued_jobs():
+    """
+    Worker entry point, runs queued jobs until there are none left, so
+    jobs queued behind a busy worker or by an earlier process are not
+    stranded. Returns the jobs it ran.
+    """
+    jobs = []
+    try:
+        job = run_next_job()
+        while job:
+            jobs.append(job)
+            job = run_next_job()
+    finally:
+        # worker threads get their own connection, don't leak it
+        connection.close()
+    return jobs
+
+
+def drain_queue_on_startup(**kwargs):
+    """
+    request_started receiver: on the first request this process serves,
+    requeues the jobs a stopped server left running and starts a worker
+    on whatever is queued. See JobsConfig.ready().
+    """
+    if not settings.INGEST_ASYNC or _startup_drain.is_set():
+        return
+    _startup_drain.set()
+
+    def _drain():
+        try:
+            recover_stale_jobs()
+        except Exception:
+            logger.exception("Failed to recover stale ingest jobs")
+        run_queued_jobs()
+
+    _executor.submit(_drain)
@@ -0,0 +1,32 @@
+# stdlib
+import json
+
+# 3rd Party
+from rest_framework import serializers
+
+# Internal
+from .models import IngestJob
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+
+    def to_representation(self, instance):
+        data = super(IngestJobSerializer, self).to_representation(instance)
+        data['stage_timings'] = json.loads(data['stage_timings'])
+        data['errors'] = json.loads(data['errors']) if data.get('errors') else None
+        return data
+
+    class Meta:
+        model = IngestJob
+        fields = [
+            'id',
+            'state',
+            'file_type',
+            'filename',
+            'rows_written',
+            'stage_timings',
+            'errors',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
@@ -0,0 +1,154 @@
+# stdlib
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+# 3rd Party
+from django.test import Client, TransactionTestCase
+from django.utils import timezone
+
+# Internal
+from jobs import queue
+from jobs.models import IngestJob
+from localfitserver import settings
+from localfitserver.testing import build_monitor_file, get_upload
+from monitor.models import MonitorFile
+
+
+class InlineExecutor(object):
+    """
+    Runs submitted work right away, or never when paused
+    """
+
+    def __init__(self):
+        self.paused = False
+
+    def submit(self, fn, *args, **kwargs):
+        if not self.paused:
+            fn(*args, **kwargs)
+
+
+class IngestJobTests(TransactionTestCase):
+    """
+    Uploads are spooled, answered with a job to poll, and run by a worker
+    until the queue is empty, including jobs a stopped server left behind
+    """
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+        self.executor = InlineExecutor()
+        for patcher in [mock.patch.multiple(settings, INGEST_ASYNC=True, INGEST_SPOOL_DIR=self.spool_dir),
+                        mock.patch.object(queue, '_executor', self.executor),
+                        mock.patch.object(queue, '_startup_drain', queue.threading.Event())]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # only test_startup_drain wants the first request to drain the queue
+        queue._startup_drain.set()
+        self.client = Client(SERVER_NAME='localhost')
+
+    def _upload(self, day, status_code=202):
+        content = build_monitor_file(datetime(2020, 6, day, 12))
+        response = self.client.post('/monitor/upload/', {'file': get_upload(f'MONITOR{day}.FIT', content)})
+        self.assertEqual(response.status_code, status_code, response.content)
+        return response.json()
+
+    def _make_stale(self, job, spooled=True):
+        IngestJob.objects.filter(pk=job.pk).update(
+            state=IngestJob.RUNNING, started_at=timezone.now() - timedelta(seconds=settings.INGEST_JOB_TIMEOUT + 1))
+        if not spooled:
+            os.remove(job.path)
+
+    def test_upload_answers_202(self):
+        data = self._upload(1)
+        job = IngestJob.objects.get()
+
+        self.assertEqual(data, {'job_id': job.pk, 'state': 'queued', 'status_url': f'/jobs/{job.pk}/'})
+        status = self.client.get(data['status_url']).json()
+        self.assertEqual(status['state'], 'succeeded')
+        self.assertEqual(status['file_type'], 'monitor')
+        self.assertEqual(status['filename'], 'MONITOR1.FIT')
+        self.assertGreater(status['rows_written'], 0)
+        self.assertEqual(set(status['stage_timings']), {'queued', 'decode', 'persist'})
+        self.assertIsNone(status['errors'])
+        self.assertTrue(MonitorFile.objects.filter(filename='MONITOR1').exists())
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_failed_job(self):
+        self.executor.paused = True
+        self._upload(1)
+        MonitorFile.objects.create(filename='MONITOR1')
+        job, = queue.run_queued_jobs()
+
+        status = self.client.get(f'/jobs/{job.pk}/').json()
+        self.assertEqual(status['state'], 'failed')
+        self.assertEqual(status['errors'], {'file': ['This file has already been uploaded.']})
+
+    def test_missing_job(self):
+        self.assertEqual(self.client.get('/jobs/1/').status_code, 404)
+
+    def test_duplicate_while_queued(self):
+        self.executor.paused = True
+        self._upload(1)
+        self.assertEqual(self._upload(1, status_code=400), {'file': ['This file is already being imported.']})
+
+    def test_worker_drains_queue(self):
+        self.executor.paused = True
+        for day in (1, 2, 3):
+            self._upload(day)
+        self.executor.paused = False
+        self._upload(4)
+
+        self.assertEqual(list(IngestJob.objects.order_by('id').values_list('state', flat=True)), ['succeeded'] * 4)
+        self.assertEqual(MonitorFile.objects.count(), 4)
+
+    def test_startup_drain(self):
+        self.executor.paused = True
+        self._upload(1)
+        self._upload(2)
+        self._make_stale(IngestJob.objects.get(filename='MONITOR2.FIT'))
+        self.executor.paused = False
+
+        queue._startup_drain.clear()
+        self.client.get('/jobs/1/')
+        self.assertEqual(list(IngestJob.objects.order_by('id').values_list('state', flat=True)), ['succeeded'] * 2)
+
+    def test_recover_stale_jobs(self):
+        self.executor.paused = True
+        for day in (1, 2, 3):
+            self._upload(day)
+        spooled, unspooled, recent = IngestJob.objects.order_by('id')
+        self._make_stale(spooled)
+        self._make_stale(unspooled, spooled=False)
+        IngestJob.objects.filter(pk=recent.pk).update(state=IngestJob.RUNNING, started_at=timezone.now())
+
+        recovered = queue.recover_stale_jobs()
+        self.assertEqual([job.pk for job in recovered], [spooled.pk, unspooled.pk])
+        spooled.refresh_from_db()
+        unspooled.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((spooled.state, spooled.started_at), (IngestJob.QUEUED, None))
+        self.assertEqual(unspooled.state, IngestJob.FAILED)
+        self.assertEqual(json.loads(unspooled.errors), ["The import was interrupted before it finished."])
+        self.assertEqual(recent.state, IngestJob.RUNNING)
+
+    def test_upload_replaces_stale_job(self):
+        self.executor.paused = True
+        self._upload(1)
+        stale = queue.claim_next_job()
+        IngestJob.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(days=1))
+
+        self._upload(1)
+        replacement = IngestJob.objects.get(state=IngestJob.QUEUED)
+        self.assertNotEqual(replacement.path, stale.path)
+        self.assertEqual(IngestJob.objects.get(pk=stale.pk).state, IngestJob.FAILED)
+
+        # the stale job's worker finishes after all: it must not undo the recovery or touch the new upload
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            queue.run_job(stale)
+        self.assertEqual(IngestJob.objects.get(pk=stale.pk).state, IngestJob.FAILED)
+        self.assertFalse(os.path.exists(stale.path))
+        self.assertTrue(os.path.exists(replacement.path))
@@ -0,0 +1,10 @@
+# 3rd Party
+from django.urls import path
+
+# Internal
+from . import views
+
+
+urlpatterns = [
+    path('<int:job_id>/', views.job),
+]
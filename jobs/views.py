@@ -0,0 +1,18 @@
+# 3rd Party
+from django.http import HttpResponse
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+# Internal
+from .models import IngestJob
+from .serializers import IngestJobSerializer
+
+
+@api_view(['GET'])
+def job(request, job_id):
+    try:
+        ingest_job = IngestJob.objects.get(pk=job_id)
+    except IngestJob.DoesNotExist:
+        return HttpResponse(status=404)
+    serializer = IngestJobSerializer(ingest_job)
+    return Response(serializer.data)
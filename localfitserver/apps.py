@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class LocalfitserverConfig(AppConfig):
+    name = 'localfitserver'
+
+    def ready(self):
+        # registers the connection_created receiver
+        from localfitserver import db  # noqa
@@ -1,23 +1,95 @@
+# stdlib
+from datetime import datetime
+
 # 3rd Party
+from django.db.models import BigIntegerField, ExpressionWrapper, F, QuerySet
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.utils.serializer_helpers import ReturnDict
 
+# Internal
+from localfitserver.downsampling import get_chart_lttb_indexes, get_requested_points
+from localfitserver.fields import EpochDateTimeField
+from localfitserver.layouts import is_columnar
+from localfitserver.renderers import Column
+from localfitserver.utils import convert_unix_timestamps_to_local_times
+
 
 class BaseChartJSListSerializer(serializers.ListSerializer):
     chart_field = None
     time_field = 'timestamp_utc'
 
+    def _downsample(self, rows, get_x=float):
+        """
+        Keeps the (time, value) rows a ?points=N chart draws, picked by
+        LTTB. get_x turns a row's time into a number.
+        """
+        points = get_requested_points(self.context)
+        if points is None or len(rows) <= points:
+            return rows
+
+        x = [get_x(time) for time, _ in rows]
+        return [rows[index] for index in get_chart_lttb_indexes(x, [value for _, value in rows], points)]
+
+    def _get_rows(self, data):
+        """
+        The (time, value) rows a chart draws, read as two column tuples
+        rather than model instances. Times of epoch columns come back as
+        plain integers, others as aware datetimes.
+        """
+        if not isinstance(data, QuerySet):
+            # e.g. a page of model instances
+            rows = [(getattr(value, self.time_field), getattr(value, self.chart_field)) for value in data]
+            return self._downsample(rows, datetime.timestamp)
+
+        if not isinstance(data.model._meta.get_field(self.time_field), EpochDateTimeField):
+            return self._downsample(list(data.values_list(self.time_field, self.chart_field)), datetime.timestamp)
+
+        unix_timestamp = ExpressionWrapper(F(self.time_field), output_field=BigIntegerField())
+        return self._downsample(list(data.values_list(unix_timestamp, self.chart_field)))
+
+    def _get_chart_points(self, data):
+        """
+        (local time, value) pairs. Epoch columns' integers are converted to
+        the current time zone all at once, after downsampling.
+        """
+        rows = self._get_rows(data)
+        if rows and isinstance(rows[0][0], datetime):
+            return [(timezone.localtime(time), value) for time, value in rows]
+
+        unix_timestamps = [row[0] for row in rows]
+        return zip(convert_unix_timestamps_to_local_times(unix_timestamps), (row[1] for row in rows))
+
     def _format_for_chart_js(self, data):
         return [
             {
-                "t": timezone.localtime(getattr(value, self.time_field)),
-                "y": getattr(value, self.chart_field) if getattr(value, self.chart_field) != -1 else 0
-            } for value in data
+                "t": time,
+                "y": value if value != -1 else 0
+            } for time, value in self._get_chart_points(data)
         ]
 
+    def _format_columns(self, data):
+        """
+        The ?layout=columnar version of _format_for_chart_js(): a Column of
+        seconds since the UNIX epoch and a Column of values
+        """
+        rows = self._get_rows(data)
+        return {
+            't': Column([time if isinstance(time, int) else int(time.timestamp()) for time, _ in rows]),
+            'y': Column([value if value != -1 else 0 for _, value in rows]),
+        }
+
     @property
     def data(self):
+        if is_columnar(self.context):
+            data = self._format_columns(self.instance)
+            response = {
+                'start_time': data['t'][0] if data['t'] else "",
+                'end_time': data['t'][-1] if data['t'] else "",
+                self.chart_field: data
+            }
+            return ReturnDict(response, serializer=self)
+
         data = self._format_for_chart_js(self.instance)
         response = {
             'start_time': data[0]['t'] if data else "",
@@ -0,0 +1,45 @@
+# 3rd Party
+from django.db import connections, router
+from django.db.models import AutoField
+
+# Internal
+from localfitserver import settings
+
+
+class BulkInserter(object):
+    """
+    Buffers unsaved model instances and writes them with bulk_create
+    in chunks of batch_size, so an upload issues one INSERT per chunk
+    instead of one per FIT message. A chunk is split into smaller
+    INSERTs when it has more query parameters than the database allows
+    (999 on SQLite).
+
+    Must be used inside the caller's transaction. Call flush() once
+    the last row has been added to write whatever is left over.
+    """
+
+    def __init__(self, model, batch_size=None):
+        self.model = model
+        self.batch_size = batch_size or settings.UPLOAD_BATCH_SIZE
+        self.rows_written = 0
+        self._buffer = []
+
+    def add(self, instance):
+        self._buffer.append(instance)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        return instance
+
+    def flush(self):
+        if self._buffer:
+            self.model.objects.bulk_create(self._buffer, batch_size=self._get_insert_size())
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+        return self.rows_written
+
+    def _get_insert_size(self):
+        # Django 2.2 doesn't cap an explicit bulk_create batch_size at the backend's limit, so cap it here
+        # like later versions do
+        connection = connections[router.db_for_write(self.model)]
+        fields = [field for field in self.model._meta.concrete_fields if not isinstance(field, AutoField)]
+        return min(self.batch_size, max(connection.ops.bulk_batch_size(fields, self._buffer), 1))
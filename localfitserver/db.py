@@ -0,0 +1,20 @@
+# 3rd Party
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Internal
+from localfitserver import settings
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Runs SQLITE_PRAGMAS on every new SQLite connection. Most pragmas only
+    last as long as the connection, so they can't be set once on the file.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,72 @@
+# 3rd Party
+import numpy as np
+from rest_framework.exceptions import ValidationError
+
+
+def get_requested_points(context):
+    """
+    The ?points=N a chart was requested with, or None for every sample.
+    Reads the request from a serializer's context.
+    """
+    request = context.get('request')
+    points = request.query_params.get('points') if request else None
+    if points is None:
+        return None
+
+    try:
+        points = int(points)
+    except ValueError:
+        points = 0
+    if points < 3:
+        raise ValidationError({'error': 'Please provide points as a whole number of at least 3'})
+    return points
+
+
+def get_lttb_indexes(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a line chart:
+    https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf
+
+    Keeps the first and last samples and, from each of points - 2 equal
+    buckets in between, the sample forming the largest triangle with the
+    sample kept from the previous bucket and the average of the next one.
+    That keeps the peaks and troughs a chart would show. Samples are
+    bucketed in the order given. Missing values (nan) are only kept from
+    buckets without any other samples. Returns the indexes to keep.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if points >= len(x):
+        return np.arange(len(x))
+
+    every = (len(x) - 2) / (points - 2)
+    edges = np.floor(np.arange(points - 1) * every).astype(np.int64) + 1
+    edges[-1] = len(x) - 1
+
+    indexes = np.empty(points, dtype=np.int64)
+    indexes[0], indexes[-1] = 0, len(x) - 1
+    selected = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else len(x)
+
+        next_y = y[next_start:next_end]
+        average_x = x[next_start:next_end].mean()
+        average_y = np.nanmean(next_y) if not np.isnan(next_y).all() else y[selected]
+
+        # twice the triangle's area, which ranks the candidates the same way
+        areas = np.abs((x[selected] - average_x) * (y[start:end] - y[selected]) -
+                       (x[selected] - x[start:end]) * (average_y - y[selected]))
+        areas[np.isnan(areas)] = -1
+        selected = start + int(np.argmax(areas))
+        indexes[bucket + 1] = selected
+    return indexes
+
+
+def get_chart_lttb_indexes(x, values, points):
+    """
+    get_lttb_indexes() for chart values, where None is a missing sample
+    and -1 is drawn as 0
+    """
+    y = [np.nan if value is None else 0 if value == -1 else value for value in values]
+    return get_lttb_indexes(x, y, points)
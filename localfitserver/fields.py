@@ -0,0 +1,109 @@
+# stdlib
+import calendar
+from datetime import datetime, timedelta
+from decimal import Decimal
+import math
+
+# 3rd Party
+from django.db import models
+from django.db.models import BigIntegerField, Case, ExpressionWrapper, F, Max, Min, Q, Value, When
+from django.utils import timezone
+import numpy as np
+
+# Internal
+from localfitserver.utils import get_utc_offset_table
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class EpochDateTimeField(models.DateTimeField):
+    """
+    A DateTimeField stored as an integer of seconds since the UNIX epoch
+    instead of as text. Integer keys keep the time-series indexes small
+    and compare without parsing, and reading a row back skips Django's
+    datetime string parsing. Values are aware UTC datetimes, like a
+    DateTimeField returns them, so querysets and serializers don't change.
+
+    Values are saved truncated to the second, so the column only holds
+    integers. Comparisons (exact, gt, lt, range, ...) keep their fractions
+    and ordering works as usual. Lookups that run SQL date functions on
+    the column, like __date or TruncDate, do not work. See
+    get_local_day_numbers() instead.
+    """
+
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.utc)
+        seconds = calendar.timegm(value.utctimetuple())
+        # a lookup's value, e.g. __gte 10.5 must not match a row saved at 10 seconds
+        return seconds + value.microsecond / 10 ** 6 if value.microsecond else seconds
+
+    def get_db_prep_save(self, value, connection):
+        value = self.get_db_prep_value(value, connection)
+        # FIT timestamps are whole seconds, drop any fraction rather than store a REAL in the column
+        return None if value is None else math.floor(value)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return EPOCH + timedelta(seconds=value)
+
+
+class FixedPointDecimalField(models.DecimalField):
+    """
+    A DecimalField stored as an integer scaled by 10^decimal_places, e.g.
+    microdegrees for a coordinate with six decimal places. Values are
+    rounded exactly like a DecimalField rounds them before saving, and
+    come back as the same Decimals.
+    """
+
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        # utils.format_number(), which DecimalField saves with, without the round trip through a string
+        value = value.quantize(Decimal(1).scaleb(-self.decimal_places), context=self.context)
+        return int(value.scaleb(self.decimal_places))
+
+    def get_db_prep_save(self, value, connection):
+        # DecimalField saves through its own adapter rather than get_db_prep_value()
+        return self.get_db_prep_value(value, connection)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return Decimal(value).scaleb(-self.decimal_places)
+
+
+def get_local_day_numbers(queryset, field_name):
+    """
+    An expression for the date an EpochDateTimeField's values fall on in
+    the current time zone, as days since 1970-01-01, to group a queryset
+    by like TruncDate. The UTC offset is spelled out as a CASE over the
+    daylight saving changes between the queryset's first and last
+    values, which takes one more query to find.
+    """
+    unix_timestamp = ExpressionWrapper(F(field_name), output_field=BigIntegerField())
+    bounds = queryset.aggregate(first=Min(unix_timestamp), last=Max(unix_timestamp))
+    transitions, offsets, _ = get_utc_offset_table(timezone.get_current_timezone(), bounds['first'] or 0,
+                                                   bounds['last'] or 0)
+    first, last = (max(int(np.searchsorted(transitions, bounds[bound] or 0, side='right')) - 1, 0)
+                   for bound in ('first', 'last'))
+
+    offset = Case(
+        *[When(Q(**{f'{field_name}__gte': EPOCH + timedelta(seconds=int(transitions[index]))}),
+               then=Value(int(offsets[index]))) for index in range(last, first, -1)],
+        default=Value(int(offsets[first])), output_field=BigIntegerField())
+    return ExpressionWrapper((unix_timestamp + offset) / Value(24 * 60 * 60), output_field=BigIntegerField())
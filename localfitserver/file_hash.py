@@ -0,0 +1,69 @@
+# stdlib
+import hashlib
+
+# 3rd Party
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+def get_file_hash(fileobj, chunk_size=64 * 1024):
+    """
+    SHA-256 hex digest of an uploaded file. Uploads received through the
+    handlers below were already hashed as they streamed in; anything else
+    (paths, zip members) is read once here and rewound when possible.
+    """
+    if getattr(fileobj, 'sha256', None):
+        return fileobj.sha256
+
+    content_hash = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        content_hash.update(chunk)
+    if hasattr(fileobj, 'seek') and fileobj.seekable():
+        fileobj.seek(0)
+    return content_hash.hexdigest()
+
+
+def get_path_hash(path):
+    with open(path, 'rb') as fileobj:
+        return get_file_hash(fileobj)
+
+
+def get_unique_filename(model, filename, sha256):
+    """
+    Garmin only has 8 characters to name a file, so two different files
+    can end up with the same name. The first keeps it; later ones get a
+    short digest suffix so they don't collide: 9CUB1048 -> 9CUB1048-3fa9c2
+    """
+    if not model.objects.filter(filename=filename).exists():
+        return filename
+    max_length = model._meta.get_field('filename').max_length
+    return f"{filename[:max_length - 7]}-{sha256[:6]}"
+
+
+class ContentHashMixin(object):
+    """
+    Hashes each uploaded file chunk by chunk as it is received and sets
+    the digest on the resulting UploadedFile as .sha256
+    """
+
+    def new_file(self, *args, **kwargs):
+        # before super(), MemoryFileUploadHandler raises StopFutureHandlers
+        self.content_hash = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.content_hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self.content_hash.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,161 @@
+# stdlib
+import time
+
+# 3rd Party
+from fitparse import FitFile
+
+
+class FitMessageDispatcher(object):
+    """
+    Decodes a FitFile once and routes each message to the handlers
+    registered for its message type, in file order.
+
+    fitparse walks every message in the file on each call to
+    get_messages(), so asking it for 'session', then 'record', then
+    'sport' costs three passes. Register everything up front instead
+    and call dispatch() once.
+
+    Example:
+    dispatcher = FitMessageDispatcher()
+    dispatcher.register('record', handle_record)
+    dispatcher.register('session', handle_session)
+    dispatcher.dispatch(fit_file)
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def register(self, message_name, handler):
+        self._handlers.setdefault(message_name, []).append(handler)
+        return handler
+
+    def dispatch(self, fit_file):
+        if not self._handlers:
+            return
+        for message in fit_file.get_messages(name=list(self._handlers)):
+            for handler in self._handlers[message.name]:
+                handler(message)
+
+
+def collect_messages(fit_file, message_names):
+    """
+    Single pass over fit_file, grouping the requested message types.
+
+    Returns {message_name: [DataMessage, ...]} with an entry, possibly
+    empty, for every name requested.
+    """
+    messages = {name: [] for name in message_names}
+    dispatcher = FitMessageDispatcher()
+    for name in message_names:
+        dispatcher.register(name, messages[name].append)
+    dispatcher.dispatch(fit_file)
+    return messages
+
+
+class FitField(object):
+    """
+    Plain copy of a fitparse FieldData, keeping only what the upload
+    serializers read
+    """
+    __slots__ = ('name', 'value', 'raw_value', 'known', 'aliases')
+
+    def __init__(self, name, value, raw_value, known=True, aliases=()):
+        self.name = name
+        self.value = value
+        self.raw_value = raw_value
+        self.known = known
+        self.aliases = aliases
+
+    @classmethod
+    def from_field_data(cls, field_data):
+        aliases = set()
+        if field_data.field:
+            aliases.update((field_data.field.name, field_data.field.def_num))
+        if field_data.parent_field:
+            aliases.update((field_data.parent_field.name, field_data.parent_field.def_num))
+        if field_data.field_def:
+            aliases.add(field_data.field_def.def_num)
+        return cls(field_data.name, field_data.value, field_data.raw_value,
+                   known=field_data.field is not None, aliases=tuple(aliases))
+
+    def is_named(self, name):
+        return name in self.aliases
+
+
+class FitMessage(object):
+    """
+    Plain copy of a fitparse DataMessage. Unlike the original it can be
+    pickled, so files can be decoded in worker processes.
+    """
+    __slots__ = ('name', 'fields')
+    type = 'data'
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    @classmethod
+    def from_data_message(cls, message):
+        return cls(message.name, [FitField.from_field_data(f) for f in message.fields])
+
+    def get(self, field_name):
+        for field in self.fields:
+            if field.is_named(field_name):
+                return field
+
+    def __iter__(self):
+        # same ordering as fitparse: known fields first, then by name
+        return iter(sorted(self.fields, key=lambda f: (int(not f.known), f.name)))
+
+
+class DecodedFitFile(object):
+    """
+    A FIT file decoded up front into FitMessages. Provides the subset of
+    the fitparse.FitFile interface used by the dispatcher and serializers.
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    @classmethod
+    def from_fit_file(cls, fit_file, message_names=None):
+        return cls([FitMessage.from_data_message(m) for m in fit_file.get_messages(name=message_names)])
+
+    def get_messages(self, name=None):
+        if name is None:
+            return iter(self.messages)
+        names = set(name) if isinstance(name, (list, tuple, set)) else {name}
+        return (m for m in self.messages if m.name in names)
+
+
+# FIT file_id.type -> the uploader that handles it
+FIT_FILE_TYPES = {
+    'activity': 'activity',
+    'monitoring_a': 'monitor',
+    'monitoring_b': 'monitor',
+    'totals': 'totals',
+}
+
+
+def detect_file_type(fit_file):
+    """
+    Reads only as far as the file_id message, which Garmin writes first,
+    and returns 'activity', 'monitor', 'totals' or None
+    """
+    file_id = next(fit_file.get_messages('file_id'), None)
+    if file_id is None or file_id.get('type') is None:
+        return None
+    return FIT_FILE_TYPES.get(file_id.get('type').value)
+
+
+def decode_fit_path(path, message_names=None):
+    """
+    Fully decodes the FIT file at path. Free of Django imports so it can
+    run in a worker process.
+
+    Returns (DecodedFitFile, seconds spent decoding)
+    """
+    started = time.perf_counter()
+    with FitFile(path) as fit_file:
+        decoded = DecodedFitFile.from_fit_file(fit_file, message_names)
+    return decoded, time.perf_counter() - started
@@ -0,0 +1,149 @@
+# stdlib
+import logging
+import os
+import zipfile
+
+# 3rd Party
+from django.core.files.base import File
+from fitparse import FitFile
+from fitparse.utils import FitParseError
+from rest_framework.exceptions import ValidationError
+
+# Internal
+from activity.models import ActivityFile
+from activity.upload_serializers import BaseActivityFileUploadSerializer, get_serializer_by_sport
+from monitor.models import MonitorFile
+from monitor.upload_serializers import MonitorFileUploadSerializer
+from totals.upload_serializers import ActivityTotalsFileUploadSerializer
+from localfitserver.file_hash import get_file_hash
+from localfitserver.fit_dispatcher import collect_messages, detect_file_type
+
+
+logger = logging.getLogger(__name__)
+
+
+FIT_MESSAGE_NAMES = {
+    'activity': BaseActivityFileUploadSerializer.fit_message_names,
+    'monitor': MonitorFileUploadSerializer.fit_message_names,
+    'totals': ActivityTotalsFileUploadSerializer.fit_message_names,
+}
+
+
+def get_filename(name):
+    """
+    Same rule the upload serializers use: 82AK4813.FIT -> 82AK4813
+    """
+    return name.split(".")[0]
+
+
+def is_duplicate_content(sha256):
+    """
+    True when a file with identical bytes has already been imported, as
+    either an activity or a monitor file
+    """
+    return ActivityFile.objects.filter(sha256=sha256).exists() or \
+        MonitorFile.objects.filter(sha256=sha256).exists()
+
+
+def is_already_imported(file_type, filename, sha256):
+    """
+    Applies the upload serializers' _validate_file_hash and
+    _validate_filename rules without decoding the file. Totals files are
+    upserts and never skipped.
+    """
+    if file_type == 'activity':
+        serializer = BaseActivityFileUploadSerializer()
+    elif file_type == 'monitor':
+        serializer = MonitorFileUploadSerializer()
+    else:
+        return False
+
+    try:
+        serializer._validate_file_hash(sha256)
+        serializer._validate_filename(filename)
+    except ValidationError:
+        return True
+    return False
+
+
+def import_fit_file(file_type, name, fit_file, sha256):
+    """
+    Persists an already decoded FIT file through the same serializer the
+    upload endpoint for its file type would use.
+
+    fit_file can be a fitparse.FitFile or a DecodedFitFile. Returns the
+    number of rows written, or samples for an activity's stream.
+    """
+    upload = File(None, name=name)
+
+    if file_type == 'activity':
+        fit_messages = collect_messages(fit_file, FIT_MESSAGE_NAMES['activity'])
+        serializer = get_serializer_by_sport(fit_messages)(
+            data={'file': upload, 'fit_messages': fit_messages, 'sha256': sha256})
+    elif file_type == 'monitor':
+        serializer = MonitorFileUploadSerializer(data={'file': upload, 'fit_file': fit_file, 'sha256': sha256})
+    elif file_type == 'totals':
+        # totals uploads decode their own file in validate(), skip straight to persisting
+        serializer = ActivityTotalsFileUploadSerializer()
+        serializer.create({'file': fit_file})
+        return serializer.rows_written
+    else:
+        raise ValidationError({"file": "Unsupported file type"})
+
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return serializer.rows_written
+
+
+def import_uploaded_file(name, fileobj):
+    """
+    Detects, de-duplicates and imports a single uploaded FIT file. Never
+    raises; the outcome is reported as a result dict so that one bad file
+    can't abort a batch.
+
+    {'file': '82AK4813.FIT', 'type': 'monitor', 'status': 'created'|'duplicate'|'failed', 'error': ...}
+    """
+    result = {'file': name, 'type': None}
+    try:
+        # identical bytes were already uploaded, don't bother decoding them
+        sha256 = get_file_hash(fileobj)
+        if is_duplicate_content(sha256):
+            result['status'] = 'duplicate'
+            return result
+
+        fit_file = FitFile(fileobj)
+        result['type'] = file_type = detect_file_type(fit_file)
+        if file_type is None:
+            raise ValidationError({"file": "Unsupported file type"})
+
+        if is_already_imported(file_type, get_filename(name), sha256):
+            result['status'] = 'duplicate'
+            return result
+
+        # the serializer saves each file in its own transaction, so a failure only rolls back that file
+        import_fit_file(file_type, name, fit_file, sha256)
+    except ValidationError as e:
+        result.update(status='failed', error=e.detail)
+    except FitParseError as e:
+        result.update(status='failed', error=str(e))
+    except Exception as e:
+        logger.exception("Failed to import %s", name)
+        result.update(status='failed', error=str(e) or e.__class__.__name__)
+    else:
+        result['status'] = 'created'
+    return result
+
+
+def import_zip_archive(archive):
+    """
+    Imports every FIT file inside a zip of a Garmin folder. Members are
+    decompressed one at a time, so the archive is never fully in memory.
+
+    Yields one import_uploaded_file result per FIT member.
+    """
+    with zipfile.ZipFile(archive) as zip_file:
+        for member in zip_file.infolist():
+            if member.is_dir() or not member.filename.lower().endswith('.fit'):
+                continue
+            with zip_file.open(member) as fileobj:
+                yield import_uploaded_file(os.path.basename(member.filename), fileobj)
@@ -0,0 +1,27 @@
+# 3rd Party
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+# Internal
+from localfitserver.renderers import TypedArrayRenderer
+
+
+# the renderers of the chart and map endpoints, which also answer in typed arrays
+CHART_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, TypedArrayRenderer]
+
+
+def is_columnar(context):
+    """
+    Whether a chart or map was requested with ?layout=columnar, or as
+    typed arrays, which only come in that layout. Reads the request from
+    a serializer's context.
+    """
+    request = context.get('request')
+    if request is None:
+        return False
+
+    layout = request.query_params.get('layout')
+    if layout is not None and layout != 'columnar':
+        raise ValidationError({'error': 'The only supported layout is columnar'})
+    return layout is not None or isinstance(getattr(request, 'accepted_renderer', None), TypedArrayRenderer)
+
@@ -0,0 +1,96 @@
+# stdlib
+from datetime import date, timedelta
+import re
+
+# 3rd Party
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+# Internal
+from activity.models import ActivityData, ActivityFile
+from monitor.models import HeartRateData, RestingMetRateData, StepData, StressData
+
+
+# the tables that grow by thousands of rows per upload
+SAMPLE_TABLES = {model._meta.db_table for model in (ActivityData, HeartRateData, StressData, RestingMetRateData, StepData)}
+
+# "SCAN TABLE x" before SQLite 3.36, "SCAN x" after
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def get_endpoints(filename):
+    """
+    The time-series endpoints, for an activity and the last week of monitor data
+    """
+    end_date = date.today()
+    start_date = end_date - timedelta(days=7)
+    day_range = f'start_date={start_date}&end_date={end_date}'
+    time_range = f'start_date={start_date} 00:00:00&end_date={end_date} 00:00:00'
+    return [
+        f'/activity/heart_rate/{filename}/',
+        f'/activity/altitude/{filename}/',
+        f'/activity/map/{filename}/',
+        f'/monitor/heart_rate/?{time_range}',
+        f'/monitor/stress_data/?{time_range}',
+        f'/monitor/stress_range/?{time_range}',
+        f'/monitor/resting_meta/?{time_range}',
+        f'/monitor/steps/?{day_range}',
+        '/monitor/step_goal/',
+    ]
+
+
+def get_full_scans(sql):
+    """
+    The query plan of sql, and the steps of it that scan a whole sample table
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = [row[-1] for row in cursor.fetchall()]
+
+    full_scans = []
+    for detail in plan:
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in SAMPLE_TABLES:
+            full_scans.append(detail)
+    return plan, full_scans
+
+
+class Command(BaseCommand):
+    """
+    Requests every time-series endpoint, runs EXPLAIN QUERY PLAN on each
+    query it makes, and fails if any of them scans a whole sample table
+    instead of searching an index. Run it against a real database after
+    changing a model or a view's queryset; localfitserver.tests runs the
+    same check against the test database.
+    """
+    help = "Check that the time-series endpoints' queries use an index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filename', help="Activity file to request (default: the first one in the database)")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Query plans can only be checked on SQLite")
+
+        filename = options['filename'] or ActivityFile.objects.values_list('filename', flat=True).first() or 'missing'
+        client = Client(SERVER_NAME='localhost')
+        failures = []
+        for url in get_endpoints(filename):
+            with CaptureQueriesContext(connection) as queries:
+                try:
+                    client.get(url)
+                except Exception as e:
+                    # the queries that ran before a view fails are still worth checking
+                    self.stderr.write(f"{url}: {e!r}")
+
+            for query in queries.captured_queries:
+                plan, full_scans = get_full_scans(query['sql'])
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{url}\n  {query['sql']}\n    " + "\n    ".join(plan))
+                failures.extend(f"{url}: {detail}" for detail in full_scans)
+
+        if failures:
+            raise CommandError("Queries scan a whole sample table:\n" + "\n".join(failures))
+        self.stdout.write("Every time-series query uses an index")
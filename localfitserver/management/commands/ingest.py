@@ -0,0 +1,131 @@
+# stdlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import logging
+import os
+import time
+
+# 3rd Party
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from fitparse import FitFile
+from fitparse.utils import FitParseError
+from rest_framework.exceptions import ValidationError
+
+# Internal
+from localfitserver.file_hash import get_path_hash
+from localfitserver.fit_dispatcher import decode_fit_path, detect_file_type
+from localfitserver.ingest import (FIT_MESSAGE_NAMES, get_filename, import_fit_file, is_already_imported,
+                                   is_duplicate_content)
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Bulk import of a Garmin directory tree, e.g. ~/Documents/garmindata
+
+    Files are decoded in parallel by a process pool and written one at a
+    time by this process, each in its own transaction, through the same
+    serializers as the upload endpoints.
+    """
+    help = "Import every activity, monitor and totals FIT file under a directory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Number of decoder processes (default: one per CPU)")
+
+    def _find_fit_files(self, directory):
+        for root, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if filename.lower().endswith('.fit'):
+                    yield os.path.join(root, filename)
+
+    def _plan(self, directory, stats):
+        """
+        Detects each file's type and drops files that are unsupported or
+        already imported, before any of them are fully decoded. Copies of
+        a file planned earlier in the run are skipped too, as they haven't
+        been written yet.
+        """
+        planned_hashes = set()
+        for path in self._find_fit_files(directory):
+            sha256 = get_path_hash(path)
+            if sha256 in planned_hashes or is_duplicate_content(sha256):
+                stats['skipped'] += 1
+                continue
+
+            try:
+                with FitFile(path) as fit_file:
+                    file_type = detect_file_type(fit_file)
+            except FitParseError as e:
+                stats['failed'] += 1
+                self.stderr.write(f"{path}: {e}")
+                continue
+
+            if file_type is None:
+                stats['unsupported'] += 1
+            elif is_already_imported(file_type, get_filename(os.path.basename(path)), sha256):
+                stats['skipped'] += 1
+            else:
+                planned_hashes.add(sha256)
+                yield path, file_type, sha256
+
+    def _import(self, path, file_type, sha256, future, stats):
+        try:
+            decoded, decode_seconds = future.result()
+            import_fit_file(file_type, os.path.basename(path), decoded, sha256)
+        except (ValidationError, FitParseError) as e:
+            stats['failed'] += 1
+            self.stderr.write(f"{path}: {getattr(e, 'detail', e)}")
+            return
+        except Exception as e:
+            # the serializer saves each file in its own transaction, so only this one was rolled back
+            logger.exception("Failed to import %s", path)
+            stats['failed'] += 1
+            self.stderr.write(f"{path}: {str(e) or e.__class__.__name__}")
+            return
+        stats['decode_seconds'] += decode_seconds
+        stats['bytes'] += os.path.getsize(path)
+        stats[file_type] += 1
+        if self.verbosity > 1:
+            self.stdout.write(f"{path}: imported {file_type} file")
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['directory']):
+            raise CommandError(f"{options['directory']} is not a directory")
+
+        self.verbosity = options['verbosity']
+        workers = max(options['workers'], 1)
+        stats = dict.fromkeys(['activity', 'monitor', 'totals', 'skipped', 'unsupported', 'failed', 'bytes'], 0)
+        stats['decode_seconds'] = 0.0
+        started = time.perf_counter()
+
+        # don't hand an open sqlite connection to forked workers
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = {}
+            for path, file_type, sha256 in self._plan(options['directory'], stats):
+                future = pool.submit(decode_fit_path, path, FIT_MESSAGE_NAMES[file_type])
+                in_flight[future] = (path, file_type, sha256)
+
+                # keep decoded files from piling up in memory while the writer catches up
+                if len(in_flight) >= workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._import(*in_flight.pop(future), future, stats)
+
+            for future in list(in_flight):
+                self._import(*in_flight.pop(future), future, stats)
+
+        elapsed = time.perf_counter() - started
+        imported = stats['activity'] + stats['monitor'] + stats['totals']
+        self.stdout.write(
+            f"Imported {imported} files ({stats['activity']} activity, {stats['monitor']} monitor, "
+            f"{stats['totals']} totals) in {elapsed:.1f}s\n"
+            f"Skipped {stats['skipped']} already imported, {stats['unsupported']} unsupported, "
+            f"{stats['failed']} failed\n"
+            f"Throughput: {imported / elapsed:.1f} files/s, {stats['bytes'] / elapsed / 1024:.0f} KiB/s, "
+            f"{stats['decode_seconds']:.1f}s decoding across {workers} workers"
+        )
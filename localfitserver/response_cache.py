@@ -0,0 +1,122 @@
+# stdlib
+from functools import wraps
+import hashlib
+import threading
+import time
+
+# 3rd Party
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+# Internal
+from localfitserver import settings
+
+
+# hits and misses of cache_response() views, and invalidate_responses() calls, in this process
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def get_response_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _get_months(start_date, end_date):
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append(f'{year}-{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _get_generation_keys(kind, span):
+    # a response covering a range of dates is cached under its months' generations, any other
+    # response under one that every change of its kind moves on
+    if span is None:
+        return [f'generation:{kind}:*']
+    return [f'generation:{kind}:{month}' for month in _get_months(*span)]
+
+
+def _get_generations(cache, keys):
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # start from the time rather than 0, so a generation that was evicted and starts
+            # again never matches the responses cached under its old value
+            cache.add(key, time.time_ns())
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def cache_response(kind, get_span=None):
+    """
+    Caches a view's 200 responses in the RESPONSE_CACHE cache, per path,
+    query string and Accept header. get_span(request) returns the first
+    and last date a response covers, or None when it isn't limited to a
+    range of dates. A response is dropped once invalidate_responses() is
+    called for its kind ('activity' or 'monitor') and any of those dates.
+    Wraps a Django view, e.g. above @api_view or a ViewSet's dispatch().
+    """
+    def decorator(view):
+        @wraps(view)
+        def cached_view(request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE or request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            cache = caches[settings.RESPONSE_CACHE]
+            span = get_span(request) if get_span else None
+            # read before the view runs, so a response of data older than an invalidation
+            # is stored under the generations that invalidation moved on from
+            generations = _get_generations(cache, _get_generation_keys(kind, span))
+            query = sorted((name, value) for name in request.GET for value in request.GET.getlist(name))
+            key = repr((request.path, query, request.META.get('HTTP_ACCEPT', ''), settings.TIME_ZONE, span,
+                        generations))
+            key = f'response:{hashlib.sha256(key.encode()).hexdigest()}'
+
+            cached = cache.get(key)
+            if cached is not None:
+                _count('hits')
+                content, status, headers = cached
+                response = HttpResponse(content, status=status)
+                for header, value in headers:
+                    response[header] = value
+                return response
+
+            _count('misses')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                if hasattr(response, 'render'):
+                    # e.g. a REST framework Response, rendered once here instead of by the handler
+                    response.render()
+                cache.set(key, (response.content, response.status_code, list(response.items())))
+            return response
+        return cached_view
+    return decorator
+
+
+def invalidate_responses(kind, start_date, end_date):
+    """
+    Drops the cached responses of kind ('activity' or 'monitor') that
+    cover any date from start_date to end_date, and those that aren't
+    limited to a range of dates, once the current transaction commits.
+    """
+    def invalidate():
+        cache = caches[settings.RESPONSE_CACHE]
+        for key in _get_generation_keys(kind, (start_date, end_date)) + _get_generation_keys(kind, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # never read, so no response is cached under it
+                pass
+        _count('invalidations')
+
+    if settings.RESPONSE_CACHE:
+        transaction.on_commit(invalidate)
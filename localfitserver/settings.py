@@ -42,11 +42,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'corsheaders',
     'rest_framework',
+    'localfitserver.apps.LocalfitserverConfig',
     'monitor',
     'activity',
     'totals',
     'records',
     'manual',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
@@ -65,6 +67,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 2000,  # More than the number of minutes in a day (1440)
     'COERCE_DECIMAL_TO_STRING': False,  # GoogleMaps API likes decimals
+    # writes the same JSON as rest_framework.renderers.JSONRenderer, with less CPU
+    # for the datetimes and Decimals of the chart and map samples
+    'DEFAULT_RENDERER_CLASSES': [
+        'localfitserver.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 ROOT_URLCONF = 'localfitserver.urls'
@@ -95,10 +103,89 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Uploads open their own transactions, starting with a write. A request-wide
+        # transaction would start with a read, and SQLite refuses to upgrade a read
+        # transaction to a write once a background geocode or ingest job has committed.
+        'ATOMIC_REQUESTS': False,
+        'OPTIONS': {
+            # seconds a write waits for another writer to commit before "database is locked"
+            'timeout': 20,
+        },
     }
 }
 
-ATOMIC_REQUESTS = True
+# Run on every new SQLite connection, see localfitserver.db. In WAL mode
+# the chart endpoints keep reading while an upload holds the write lock,
+# and synchronous = normal is still safe against corruption in WAL mode.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative values are KiB
+    'temp_store': 'memory',
+}
+
+# Uploads are SHA-256 hashed while they stream in, so duplicates can be
+# rejected before any FIT decoding. See localfitserver.file_hash.
+FILE_UPLOAD_HANDLERS = [
+    'localfitserver.file_hash.HashingMemoryFileUploadHandler',
+    'localfitserver.file_hash.HashingTemporaryFileUploadHandler',
+]
+
+# Number of sample rows (ActivityData, HeartRateData, ...) buffered
+# before each bulk INSERT while a FIT file is being uploaded
+UPLOAD_BATCH_SIZE = 1000
+
+# Reverse geocoding of activity start points runs in a background thread
+# after the upload commits. GEOCODER is the dotted path to a geopy-style
+# class with a reverse() method; results are cached per coordinate rounded
+# to GEOCODE_CACHE_PRECISION decimal places (3 is roughly 100m).
+GEOCODER = 'geopy.geocoders.Nominatim'
+GEOCODE_CACHE_PRECISION = 3
+GEOCODE_ASYNC = True
+
+# Activity and monitor uploads are spooled to INGEST_SPOOL_DIR and imported
+# by INGEST_WORKERS background threads; the upload answers 202 with a job
+# to poll at /jobs/<id>/. Set INGEST_ASYNC = False to import inline (201).
+INGEST_ASYNC = True
+INGEST_WORKERS = 1
+INGEST_SPOOL_DIR = os.path.join(BASE_DIR, 'ingest_spool')
+# Seconds after which a running job counts as interrupted, e.g. by a restart.
+# A new upload of its file replaces it, and the server's first request or
+# process_ingest_jobs requeues it.
+INGEST_JOB_TIMEOUT = 60 * 60
+
+# Activity samples are stored as one packed ActivityStream per activity,
+# as ActivityData rows, or both. The chart and map endpoints read the
+# stream when there is one, so the rows only take up disk space, several
+# times the stream's, unless ACTIVITY_STREAMS is off. With both off the
+# rows are still written.
+ACTIVITY_STREAMS = True
+ACTIVITY_DATA_ROWS = False
+
+# Map zoom levels each activity's GPS track is simplified for at upload,
+# so /activity/map/?zoom=N can send a few hundred points instead of every
+# GPS fix. Other zoom levels are simplified when they are requested.
+ACTIVITY_TRACK_ZOOMS = [10, 13, 16]
+
+# The dashboard endpoints' responses are kept in the RESPONSE_CACHE cache
+# until an upload changes a day they cover, see localfitserver.response_cache.
+# Set RESPONSE_CACHE = None to turn it off. The cache must be shared by every
+# process that uploads or serves, e.g. server workers and `manage.py ingest`,
+# or their invalidations don't reach each other: files on disk by default,
+# or memcached. A per-process LocMemCache is only safe with a single process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'response_cache'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+RESPONSE_CACHE = 'responses'
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -0,0 +1,122 @@
+"""
+Builds small FIT files for the tests, so that no recordings from a
+device have to be checked in. Only the messages and fields the upload
+serializers read are written.
+"""
+
+# stdlib
+import calendar
+import struct
+
+# 3rd Party
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+
+# seconds between the UNIX epoch and the ANT epoch, 1989-12-31 00:00:00 UTC
+ANT_EPOCH = 631065600
+
+# struct formats of the FIT base types used below
+BASE_TYPE_FORMATS = {0x00: 'B', 0x02: 'B', 0x83: 'h', 0x84: 'H', 0x85: 'i', 0x86: 'I'}
+
+# the FIT SDK's CRC-16 nibble table
+CRC_TABLE = [0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+             0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400]
+
+
+def _get_crc(data, crc=0):
+    for byte in data:
+        for nibble in (byte & 0xF, byte >> 4):
+            tmp = CRC_TABLE[crc & 0xF]
+            crc = (crc >> 4) & 0x0FFF
+            crc = crc ^ tmp ^ CRC_TABLE[nibble]
+    return crc
+
+
+def _get_ant_timestamp(datetime_utc):
+    return calendar.timegm(datetime_utc.utctimetuple()) - ANT_EPOCH
+
+
+class FitFileWriter(object):
+    """
+    Writes data messages, each preceded by a definition message the first
+    time its combination of fields is used. fields are (field number, base
+    type, value) tuples.
+    """
+
+    def __init__(self):
+        self._body = []
+        self._local_types = {}
+
+    def write(self, global_number, fields):
+        definition = (global_number, tuple((number, base_type) for number, base_type, _ in fields))
+        local_type = self._local_types.get(definition)
+        if local_type is None:
+            local_type = self._local_types[definition] = len(self._local_types) % 16
+            self._body.append(struct.pack('<BBBHB', 0x40 | local_type, 0, 0, global_number, len(fields)))
+            for number, base_type, _ in fields:
+                self._body.append(struct.pack('<BBB', number, struct.calcsize(BASE_TYPE_FORMATS[base_type]), base_type))
+        self._body.append(struct.pack('<B', local_type))
+        for _, base_type, value in fields:
+            self._body.append(struct.pack(f'<{BASE_TYPE_FORMATS[base_type]}', value))
+
+    def getvalue(self):
+        body = b''.join(self._body)
+        header = struct.pack('<BBHI4s', 14, 0x10, 2093, len(body), b'.FIT')
+        data = header + struct.pack('<H', _get_crc(header)) + body
+        return data + struct.pack('<H', _get_crc(data))
+
+
+def build_activity_file(start_time_utc, samples=120, sport=(11, 0), start_position=(493499921, -1479679416)):
+    """
+    An activity of one record per second, a walk by default. sport is the
+    (sport, sub_sport) pair of the sport message, start_position the
+    (lat, long) in semicircles the track starts at, or None for an
+    activity without GPS.
+    """
+    start = _get_ant_timestamp(start_time_utc)
+    writer = FitFileWriter()
+    writer.write(0, [(0, 0x00, 4), (1, 0x84, 1), (4, 0x86, start)])
+    writer.write(12, [(0, 0x00, sport[0]), (1, 0x00, sport[1])])
+    for i in range(samples):
+        fields = [(253, 0x86, start + i), (3, 0x02, 60 + i % 40), (5, 0x86, i * 150),
+                  (2, 0x84, (600 + i % 7) * 5), (6, 0x84, 1500), (4, 0x02, 50)]
+        if start_position:
+            fields += [(0, 0x85, start_position[0] + i * 1000), (1, 0x85, start_position[1] + (i % 13) * 900)]
+        writer.write(20, fields)
+
+    lat, long = start_position or (0x7FFFFFFF, 0x7FFFFFFF)
+    writer.write(18, [(253, 0x86, start + samples), (2, 0x86, start), (7, 0x86, samples * 1000),
+                      (8, 0x86, samples * 1000), (9, 0x86, samples * 150), (11, 0x84, 321), (14, 0x84, 1500),
+                      (15, 0x84, 2000), (20, 0x84, 0xFFFF), (21, 0x84, 0xFFFF), (22, 0x84, 12), (23, 0x84, 10),
+                      (5, 0x00, sport[0]), (6, 0x00, sport[1]), (10, 0x86, 1000), (3, 0x85, lat), (4, 0x85, long)])
+    return writer.getvalue()
+
+
+def build_monitor_file(start_time_utc, minutes=300):
+    """
+    A day's monitoring file: a heart rate every minute, a step count every
+    15 minutes, a stress level every 3 minutes and a resting metabolic rate
+    at the start and end.
+    """
+    start = _get_ant_timestamp(start_time_utc)
+    writer = FitFileWriter()
+    writer.write(0, [(0, 0x00, 15), (1, 0x84, 1), (4, 0x86, start)])
+    writer.write(103, [(253, 0x86, start), (5, 0x84, 1400)])
+    steps = 0
+    for minute in range(minutes):
+        timestamp = start + minute * 60
+        if minute % 15 == 0:
+            steps += 100
+            writer.write(55, [(253, 0x86, timestamp), (5, 0x00, 6), (3, 0x86, steps)])
+        writer.write(55, [(26, 0x84, timestamp & 0xFFFF), (27, 0x02, 55 + minute % 30)])
+        if minute % 3 == 0:
+            writer.write(227, [(0, 0x83, minute * 7 % 101), (1, 0x86, timestamp)])
+    writer.write(103, [(253, 0x86, start + minutes * 60), (5, 0x84, 1410)])
+    return writer.getvalue()
+
+
+def get_upload(name, content):
+    """
+    The file of a multipart upload, for django.test.Client.post()
+    """
+    return SimpleUploadedFile(name, content, content_type='application/octet-stream')
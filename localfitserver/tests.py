@@ -0,0 +1,707 @@
+# stdlib
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone, tzinfo
+from decimal import Decimal
+import io
+import json
+import math
+import os
+import random
+import shutil
+import struct
+import tempfile
+from unittest import mock
+import zipfile
+
+# 3rd Party
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import BigIntegerField, ExpressionWrapper, F
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import numpy as np
+import pytz
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+
+# Internal
+from activity.models import ActivityData, ActivityFile
+from localfitserver import settings
+from localfitserver.bulk import BulkInserter
+from localfitserver.downsampling import get_chart_lttb_indexes, get_lttb_indexes
+from localfitserver.fields import get_local_day_numbers
+from localfitserver.file_hash import get_file_hash
+from localfitserver.management.commands.check_query_plans import get_endpoints, get_full_scans
+from localfitserver.renderers import Column, FastJSONRenderer, TypedArrayRenderer, get_typed_array
+from localfitserver.testing import build_activity_file, build_monitor_file, get_upload
+from localfitserver.utils import convert_unix_timestamps_to_local_times
+from monitor.models import HeartRateData, MonitorFile, RestingMetRateData, StepData, StressData
+
+
+class EpochDateTimeFieldTests(TestCase):
+    """
+    EpochDateTimeField saves whole seconds, and compares with fractions
+    """
+
+    def setUp(self):
+        self.file = MonitorFile.objects.create(filename='MONITOR1')
+        self.timestamp = datetime(2020, 6, 1, 8, 0, 10, 750000, tzinfo=timezone.utc)
+
+    def _get_raw_timestamps(self):
+        unix_timestamp = ExpressionWrapper(F('timestamp_utc'), output_field=BigIntegerField())
+        rows = HeartRateData.objects.order_by('heart_rate').annotate(raw=unix_timestamp)
+        return list(rows.values_list('raw', flat=True))
+
+    def test_save_truncates(self):
+        HeartRateData.objects.create(file=self.file, timestamp_utc=self.timestamp, heart_rate=60)
+        HeartRateData.objects.bulk_create([HeartRateData(file=self.file, timestamp_utc=self.timestamp, heart_rate=61)])
+        before_epoch = datetime(1969, 12, 31, 23, 59, 59, 500000, tzinfo=timezone.utc)
+        HeartRateData.objects.create(file=self.file, timestamp_utc=before_epoch, heart_rate=62)
+
+        self.assertEqual(self._get_raw_timestamps(), [1590998410, 1590998410, -1])
+        self.assertEqual(HeartRateData.objects.order_by('heart_rate').values_list('timestamp_utc', flat=True)[0],
+                         self.timestamp.replace(microsecond=0))
+
+    def test_update_truncates(self):
+        HeartRateData.objects.create(file=self.file, timestamp_utc=self.timestamp.replace(microsecond=0), heart_rate=60)
+        HeartRateData.objects.update(timestamp_utc=self.timestamp + timedelta(seconds=1))
+
+        self.assertEqual(self._get_raw_timestamps(), [1590998411])
+
+    def test_lookups_keep_fractions(self):
+        HeartRateData.objects.create(file=self.file, timestamp_utc=self.timestamp, heart_rate=60)
+        whole_second = self.timestamp.replace(microsecond=0)
+        just_after = whole_second + timedelta(microseconds=1)
+
+        self.assertTrue(HeartRateData.objects.filter(timestamp_utc=whole_second).exists())
+        self.assertFalse(HeartRateData.objects.filter(timestamp_utc__gte=just_after).exists())
+        self.assertTrue(HeartRateData.objects.filter(timestamp_utc__lt=just_after).exists())
+
+
+class BulkInserterTests(TestCase):
+    """
+    Rows are written in chunks of batch_size, split further when a chunk
+    has more query parameters than the database allows
+    """
+
+    def setUp(self):
+        self.file = ActivityFile.objects.create(filename='WALK1', activity_type='walk', activity_category='walk',
+                                                start_time_utc=timezone.now())
+        self.fields = len(ActivityData._meta.concrete_fields) - 1
+        self.inserts = []
+
+    def _count_parameters(self, execute, sql, params, many, context):
+        if sql.startswith('INSERT'):
+            self.inserts.append(len(params))
+        return execute(sql, params, many, context)
+
+    def _insert(self, rows, batch_size):
+        inserter = BulkInserter(ActivityData, batch_size=batch_size)
+        start = self.file.start_time_utc
+        with connection.execute_wrapper(self._count_parameters):
+            for second in range(rows):
+                inserter.add(ActivityData(file=self.file, timestamp_utc=start + timedelta(seconds=second),
+                                          heart_rate=60, distance=Decimal(second)))
+            self.assertEqual(inserter.flush(), rows)
+        self.assertEqual(ActivityData.objects.count(), rows)
+
+    def test_parameter_limit(self):
+        # a chunk of 1000 rows has 14,000 parameters
+        self._insert(1001, batch_size=1000)
+        self.assertEqual(sum(self.inserts), 1001 * self.fields)
+        if connection.vendor == 'sqlite':
+            self.assertLessEqual(max(self.inserts), 999)
+            self.assertEqual(len(self.inserts), math.ceil(1000 / (999 // self.fields)) + 1)
+
+    def test_batch_size(self):
+        self._insert(25, batch_size=10)
+        self.assertEqual(self.inserts, [10 * self.fields, 10 * self.fields, 5 * self.fields])
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class QueryPlanTests(TestCase):
+    """
+    The check_query_plans command against the test database: no
+    time-series endpoint's query may scan a whole sample table
+    """
+
+    def _upload(self, url, name, content):
+        response = self.client.post(url, {'file': get_upload(name, content)})
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def _assert_no_full_scans(self):
+        yesterday = datetime.combine(timezone.localdate() - timedelta(days=1), time())
+        self._upload('/monitor/upload/', 'MONITOR1.FIT', build_monitor_file(yesterday))
+        self._upload('/activity/upload/', 'WALK1.FIT', build_activity_file(yesterday))
+
+        for url in get_endpoints('WALK1'):
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+
+                self.assertTrue(queries.captured_queries)
+                for query in queries.captured_queries:
+                    plan, full_scans = get_full_scans(query['sql'])
+                    self.assertEqual(full_scans, [], f"{query['sql']}\n" + "\n".join(plan))
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME='localhost')
+
+    def test_activity_streams(self):
+        self._assert_no_full_scans()
+
+    @mock.patch.object(settings, 'ACTIVITY_STREAMS', False)
+    def test_activity_data_rows(self):
+        self._assert_no_full_scans()
+
+
+class MonthlyOffset(tzinfo):
+    """
+    A tzinfo whose offset changes with the datetime, like a dateutil zone
+    """
+
+    def utcoffset(self, dt):
+        return timedelta(hours=dt.month % 3, minutes=30)
+
+    def dst(self, dt):
+        return None
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class FastJSONRendererTests(TestCase):
+    """
+    FastJSONRenderer writes the same bytes as REST framework's JSONRenderer
+    """
+    media_types = ['application/json', 'application/json; indent=4']
+
+    def assertRendersIdentically(self, data, renderer_context=None):
+        for media_type in self.media_types:
+            with self.subTest(media_type=media_type):
+                expected = JSONRenderer().render(data, media_type, renderer_context)
+                self.assertEqual(FastJSONRenderer().render(data, media_type, renderer_context), expected)
+
+    def test_values(self):
+        rng = random.Random(0)
+        zones = [pytz.utc, pytz.timezone('America/Los_Angeles'), pytz.timezone('Asia/Kolkata'),
+                 dt_timezone.utc, dt_timezone(timedelta(hours=-3, seconds=30)), MonthlyOffset(), None]
+        samples = []
+        for _ in range(5000):
+            naive = datetime(1950, 1, 1) + timedelta(seconds=rng.randrange(3 * 10 ** 9),
+                                                     microseconds=rng.choice([0, rng.randrange(10 ** 6)]))
+            zone = rng.choice(zones)
+            if zone is None:
+                value = naive
+            elif hasattr(zone, 'localize'):
+                value = zone.localize(naive)
+            else:
+                value = naive.replace(tzinfo=zone)
+            samples.append({'t': value, 'y': Decimal(rng.randrange(-10 ** 9, 10 ** 9)).scaleb(-rng.randrange(8)),
+                            'date': value.date(), 'missing': None})
+        samples.append({'t': pytz.timezone('America/Los_Angeles').localize(datetime(2020, 11, 1, 1, 30), is_dst=True),
+                        'y': Decimal('1E+2'), 'date': None, 'missing': None})
+        samples.append({'t': timezone.now(), 'y': Decimal('-0.0000001'), 'date': None, 'missing': None})
+        self.assertRendersIdentically({'samples': samples, 'count': len(samples), 'next': None})
+
+    def test_chart_and_map_payloads(self):
+        client = Client(SERVER_NAME='localhost')
+        for url, content in [('/monitor/upload/', build_monitor_file(datetime(2020, 6, 1, 12))),
+                             ('/activity/upload/', build_activity_file(datetime(2020, 6, 1, 8)))]:
+            response = client.post(url, {'file': get_upload(f'{url.split("/")[1].upper()}1.FIT', content)})
+            self.assertEqual(response.status_code, 201, response.content)
+
+        time_range = 'start_date=2020-06-01 00:00:00&end_date=2020-06-02 00:00:00'
+        for url in ['/activity/heart_rate/ACTIVITY1/', '/activity/altitude/ACTIVITY1/', '/activity/map/ACTIVITY1/',
+                    '/activity/heart_rate/ACTIVITY1/?layout=columnar', '/activity/map/ACTIVITY1/?layout=columnar',
+                    '/activity/meta/ACTIVITY1/', f'/monitor/heart_rate/?{time_range}',
+                    f'/monitor/stress_data/?{time_range}', f'/monitor/resting_meta/?{time_range}',
+                    '/monitor/daily/?start_date=2020-06-01&end_date=2020-06-02']:
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_ACCEPT='application/json')
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertRendersIdentically(response.data, response.renderer_context)
+
+
+class LTTBTests(SimpleTestCase):
+    """
+    get_lttb_indexes keeps the first and last samples and the peaks and
+    troughs between them
+    """
+
+    def test_keeps_endpoints_and_extremes(self):
+        x = np.arange(10000)
+        y = np.sin(x / 300) * 10
+        y[4321], y[7654] = 100, -100
+
+        for points in (3, 10, 500, 9999):
+            with self.subTest(points=points):
+                indexes = get_lttb_indexes(x, y, points)
+                self.assertEqual(len(indexes), points)
+                self.assertEqual((indexes[0], indexes[-1]), (0, len(x) - 1))
+                self.assertTrue((np.diff(indexes) > 0).all())
+                if points > 3:
+                    self.assertIn(4321, indexes)
+                    self.assertIn(7654, indexes)
+
+    def test_no_more_samples_than_points(self):
+        for samples in (0, 1, 2, 10):
+            with self.subTest(samples=samples):
+                self.assertEqual(get_lttb_indexes(range(samples), range(samples), 10).tolist(), list(range(samples)))
+        self.assertEqual(get_lttb_indexes(range(11), range(11), 11).tolist(), list(range(11)))
+
+    def test_missing_values(self):
+        # buckets [1, 3), [3, 6) and [6, 9): only those without a value keep a missing sample
+        y = [1, None, None, 5, None, 2, None, None, None, 3]
+        indexes = get_chart_lttb_indexes(range(len(y)), y, 5)
+        self.assertEqual(indexes.tolist(), [0, 1, 3, 6, 9])
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class RequestedPointsTests(TestCase):
+    """
+    ?points=N charts are the LTTB samples of every sample of the range,
+    in time order
+    """
+    time_range = 'start_date=2020-06-01 00:00:00&end_date=2020-06-05 00:00:00'
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME='localhost')
+        # saved out of order, as overlapping uploads would
+        rng = random.Random(0)
+        minutes = list(range(3 * 24 * 60))
+        rng.shuffle(minutes)
+        start = datetime(2020, 6, 1, 12, tzinfo=timezone.utc)
+        file = MonitorFile.objects.create(filename='MONITOR1')
+        HeartRateData.objects.bulk_create(
+            HeartRateData(file=file, timestamp_utc=start + timedelta(minutes=minute), heart_rate=50 + minute % 77)
+            for minute in minutes)
+        StressData.objects.bulk_create(
+            StressData(file=file, stress_level_time_utc=start + timedelta(minutes=minute),
+                       stress_level_value=minute * 7 % 101 - 1)
+            for minute in minutes)
+        RestingMetRateData.objects.bulk_create(
+            RestingMetRateData(file=file, timestamp_utc=start + timedelta(minutes=minute),
+                               resting_metabolic_rate=1400 + minute % 50)
+            for minute in minutes)
+        days = list(range(40))
+        rng.shuffle(days)
+        StepData.objects.bulk_create(StepData(file=file, date=date(2020, 6, 1) + timedelta(days=day),
+                                              steps=day * 317 % 9000)
+                                     for day in days)
+
+    def _get_columns(self, url, chart_field):
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return data.get('results', data)[chart_field]
+
+    def _assert_downsampled(self, url, chart_field, points=100):
+        with mock.patch.object(PageNumberPagination, 'page_size', 10 ** 6):
+            every = self._get_columns(f'{url}&layout=columnar', chart_field)
+        times = [date.fromisoformat(t).toordinal() if isinstance(t, str) else t for t in every['t']]
+        self.assertEqual(times, sorted(times))
+        self.assertGreater(len(times), points)
+
+        indexes = get_chart_lttb_indexes(times, every['y'], points)
+        downsampled = self._get_columns(f'{url}&layout=columnar&points={points}', chart_field)
+        self.assertEqual(downsampled, {column: [values[i] for i in indexes] for column, values in every.items()})
+
+        response = self.client.get(f'{url}&points={points}', HTTP_ACCEPT='application/json')
+        self.assertEqual(len(response.json()[chart_field]), points)
+        self.assertEqual(self.client.get(f'{url}&points=2').status_code, 400)
+
+    def test_monitor_endpoints(self):
+        for url, chart_field in [(f'/monitor/heart_rate/?{self.time_range}', 'heart_rate'),
+                                 (f'/monitor/stress_data/?{self.time_range}', 'stress_level_value'),
+                                 (f'/monitor/resting_meta/?{self.time_range}', 'resting_metabolic_rate'),
+                                 ('/monitor/steps/?start_date=2020-06-01&end_date=2020-07-15', 'steps')]:
+            with self.subTest(url=url):
+                self._assert_downsampled(url, chart_field, points=100 if chart_field != 'steps' else 10)
+
+    def test_resting_meta_not_paginated(self):
+        response = self.client.get(f'/monitor/resting_meta/?{self.time_range}&points=100')
+        self.assertEqual(len(response.json()['resting_metabolic_rate']), 100)
+        self.assertEqual(response.json()['end_time'],
+                         timezone.localtime(RestingMetRateData.objects.latest('timestamp_utc').timestamp_utc).isoformat())
+
+    def test_activity_endpoints(self):
+        # WALK1 stored as a stream, WALK2 as rows
+        for day, name, streams in [(1, 'WALK1', True), (2, 'WALK2', False)]:
+            with mock.patch.object(settings, 'ACTIVITY_STREAMS', streams):
+                content = build_activity_file(datetime(2020, 6, day, 8), 3000)
+                response = self.client.post('/activity/upload/', {'file': get_upload(f'{name}.FIT', content)})
+            self.assertEqual(response.status_code, 201, response.content)
+
+            for url, chart_field in [(f'/activity/heart_rate/{name}/?', 'heart_rate'),
+                                     (f'/activity/altitude/{name}/?', 'altitude')]:
+                with self.subTest(url=url):
+                    self._assert_downsampled(url, chart_field)
+
+
+class USPacificTime(tzinfo):
+    """
+    A zone that isn't pytz's, like a dateutil zone, with the US daylight
+    saving rules since 2007
+    """
+
+    def _get_dst_range(self, year):
+        # 2am local time on the second Sunday of March and the first Sunday of November
+        march, november = datetime(year, 3, 8, 2), datetime(year, 11, 1, 2)
+        return march + timedelta(days=6 - march.weekday()), november + timedelta(days=(6 - november.weekday()) % 7)
+
+    def utcoffset(self, dt):
+        return timedelta(hours=-8) + self.dst(dt)
+
+    def dst(self, dt):
+        start, end = self._get_dst_range(dt.year)
+        local_time = dt.replace(tzinfo=None)
+        if start <= local_time < end - timedelta(hours=1) or (local_time < end and not dt.fold):
+            return timedelta(hours=1) if local_time >= start else timedelta(0)
+        return timedelta(0)
+
+    def fromutc(self, dt):
+        start, end = self._get_dst_range(dt.year)
+        utc_time = dt.replace(tzinfo=None)
+        if start + timedelta(hours=8) <= utc_time < end + timedelta(hours=7):
+            return (utc_time - timedelta(hours=7)).replace(tzinfo=self)
+        local_time = utc_time - timedelta(hours=8)
+        # the hour repeated when daylight saving ends
+        return local_time.replace(tzinfo=self, fold=int(end - timedelta(hours=1) <= local_time < end))
+
+    def tzname(self, dt):
+        return 'PDT' if self.dst(dt) else 'PST'
+
+
+class LocalTimeTests(TestCase):
+    """
+    Times converted a column at a time fall on the same local times,
+    offsets and dates as timezone.localtime() gives them
+    """
+    zones = [pytz.timezone('America/Los_Angeles'), pytz.timezone('Australia/Lord_Howe'),
+             pytz.timezone('Asia/Kolkata'), pytz.timezone('Africa/Casablanca'), pytz.timezone('Etc/GMT+3'), pytz.utc,
+             dt_timezone.utc, dt_timezone(timedelta(hours=5, minutes=45)), USPacificTime()]
+
+    def _get_unix_timestamps(self, zone):
+        rng = random.Random(0)
+
+        def get_offset(unix_timestamp):
+            return timezone.localtime(datetime.fromtimestamp(unix_timestamp, pytz.utc), zone).utcoffset()
+
+        # every DST change of 2019 to 2021, and the seconds around it
+        days = [day for day in range(1546300800, 1640995200, 24 * 60 * 60)
+                if get_offset(day) != get_offset(day + 24 * 60 * 60)]
+        changes = [hour for day in days for hour in range(day, day + 24 * 60 * 60, 60 * 60)
+                   if get_offset(hour) != get_offset(hour + 60 * 60)]
+        around_changes = [change + delta for change in changes for delta in range(0, 60 * 60 + 1, 15)]
+        random_times = sorted(rng.randrange(1420070400, 1735689600) for _ in range(2000))
+        if not isinstance(zone, pytz.BaseTzInfo):
+            return random_times + around_changes
+        # before the zones' first transitions too, e.g. Los Angeles' in 1883
+        return [-3 * 10 ** 9, -2717640000 - 1] + random_times + around_changes
+
+    def test_local_times(self):
+        for zone in self.zones:
+            unix_timestamps = self._get_unix_timestamps(zone)
+            with self.subTest(zone=zone), timezone.override(zone):
+                expected = [timezone.localtime(datetime.fromtimestamp(unix_timestamp, pytz.utc))
+                            for unix_timestamp in unix_timestamps]
+                local_times = convert_unix_timestamps_to_local_times(unix_timestamps)
+                self.assertEqual([(local_time.replace(tzinfo=None), local_time.utcoffset(), local_time.tzname())
+                                  for local_time in local_times],
+                                 [(local_time.replace(tzinfo=None), local_time.utcoffset(), local_time.tzname())
+                                  for local_time in expected])
+                self.assertEqual(convert_unix_timestamps_to_local_times([]), [])
+
+    def test_local_day_numbers(self):
+        file = MonitorFile.objects.create(filename='MONITOR1')
+        # 2020-11-01, when daylight saving ends in the US, and the days around it
+        unix_timestamps = list(range(1604102400, 1604448000, 15 * 60))
+        HeartRateData.objects.bulk_create(HeartRateData(file=file, heart_rate=60,
+                                                        timestamp_utc=datetime.fromtimestamp(t, pytz.utc))
+                                          for t in unix_timestamps)
+        for zone in self.zones:
+            with self.subTest(zone=zone), timezone.override(zone):
+                rows = HeartRateData.objects.order_by('timestamp_utc')
+                days = rows.annotate(day=get_local_day_numbers(rows, 'timestamp_utc')).values_list('day', flat=True)
+                self.assertEqual([date.fromordinal(date(1970, 1, 1).toordinal() + day) for day in days],
+                                 [timezone.localtime(datetime.fromtimestamp(t, pytz.utc)).date()
+                                  for t in unix_timestamps])
+
+
+# the numpy dtype of each typed array TypedArrayRenderer writes
+TYPED_ARRAY_DTYPES = {'Int8Array': '<i1', 'Uint8Array': '<u1', 'Int16Array': '<i2', 'Uint16Array': '<u2',
+                      'Int32Array': '<i4', 'Uint32Array': '<u4', 'Float64Array': '<f8'}
+
+
+def decode_typed_arrays(test_case, body):
+    """
+    A typed arrays body read back as the columnar JSON it was written
+    from, checking that every array starts on an 8-byte boundary
+    """
+    header_length, = struct.unpack_from('<I', body)
+    test_case.assertEqual((4 + header_length) % 8, 0)
+    header = json.loads(body[4:4 + header_length])
+
+    def read_columns(value):
+        if isinstance(value, dict) and set(value) == {'typed_array', 'offset', 'length'}:
+            test_case.assertEqual(value['offset'] % 8, 0)
+            array = np.frombuffer(body, dtype=TYPED_ARRAY_DTYPES[value['typed_array']], count=value['length'],
+                                  offset=4 + header_length + value['offset'])
+            return [None if isinstance(item, float) and math.isnan(item) else item for item in array.tolist()]
+        if isinstance(value, dict):
+            return {key: read_columns(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [read_columns(item) for item in value]
+        return value
+    return header, read_columns(header)
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class LayoutTests(TestCase):
+    """
+    ?layout=columnar and typed arrays send the values of the row layout
+    """
+    time_range = 'start_date=2020-06-01 00:00:00&end_date=2020-06-02 00:00:00'
+    typed_arrays = 'application/vnd.localfit.typed-arrays'
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME='localhost')
+
+    def _upload(self):
+        for url, content in [('/monitor/upload/', build_monitor_file(datetime(2020, 6, 1, 12))),
+                             ('/activity/upload/', build_activity_file(datetime(2020, 6, 1, 8)))]:
+            response = self.client.post(url, {'file': get_upload(f'{url.split("/")[1].upper()}1.FIT', content)})
+            self.assertEqual(response.status_code, 201, response.content)
+
+    def _get(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_columns_match_rows(self):
+        self._upload()
+        for url, series in [('/activity/heart_rate/ACTIVITY1/', 'heart_rate'),
+                            ('/activity/altitude/ACTIVITY1/', 'altitude'),
+                            (f'/monitor/heart_rate/?{self.time_range}', 'heart_rate'),
+                            (f'/monitor/stress_data/?{self.time_range}', 'stress_level_value'),
+                            (f'/monitor/resting_meta/?{self.time_range}', 'resting_metabolic_rate'),
+                            ('/monitor/steps/?start_date=2020-05-31&end_date=2020-06-02', 'steps')]:
+            with self.subTest(url=url):
+                separator = '&' if '?' in url else '?'
+                rows = self._get(url).json()
+                columns = self._get(f'{url}{separator}layout=columnar').json()
+                _, decoded = decode_typed_arrays(self, self._get(url, HTTP_ACCEPT=self.typed_arrays).content)
+                self.assertEqual(decoded, columns)
+                if 'results' in rows:
+                    rows, columns = rows['results'], columns['results']
+
+                def get_time(value):
+                    # row times are local ISO 8601 times, column times UNIX timestamps, days dates in both
+                    return value if len(value) == 10 else int(datetime.fromisoformat(value).timestamp())
+                self.assertTrue(rows[series])
+                self.assertEqual(columns[series], {'t': [get_time(row['t']) for row in rows[series]],
+                                                   'y': [row['y'] for row in rows[series]]})
+                self.assertEqual((columns['start_time'], columns['end_time']),
+                                 (get_time(rows['start_time']), get_time(rows['end_time'])))
+
+        for query in ['', '?zoom=13']:
+            with self.subTest(query=query):
+                rows = self._get(f'/activity/map/ACTIVITY1/{query}').json()
+                columns = self._get(f'/activity/map/ACTIVITY1/{query}{"&" if query else "?"}layout=columnar').json()
+                self.assertEqual(columns.pop('activitydata'), {'lat': [point['lat'] for point in rows['activitydata']],
+                                                               'lng': [point['lng'] for point in rows['activitydata']]})
+                rows.pop('activitydata')
+                self.assertEqual(columns, rows)
+
+    def test_typed_array_types(self):
+        for column, typed_array in [([-1, 100], 'Int8Array'), ([0, 255], 'Uint8Array'), ([-1, 200], 'Int16Array'),
+                                    ([0, 65535], 'Uint16Array'), ([-1, 40000], 'Int32Array'),
+                                    ([0, 2 ** 32 - 1], 'Uint32Array'), ([0, 2 ** 32], 'Float64Array'),
+                                    ([1, 1.5], 'Float64Array'), ([None, 1], 'Float64Array'), ([], 'Float64Array')]:
+            with self.subTest(column=column):
+                name, array = get_typed_array(column)
+                self.assertEqual((name, array.dtype), (typed_array, np.dtype(TYPED_ARRAY_DTYPES[typed_array])))
+                self.assertEqual([None if math.isnan(value) else value for value in array.tolist()], column)
+
+    def test_body_layout(self):
+        body = TypedArrayRenderer().render({'name': 'é', 'a': Column([1, 2, 3]), 'nested': [{'b': Column([0.5])}],
+                                            'c': Column([None, 70000])})
+        header, decoded = decode_typed_arrays(self, body)
+        self.assertEqual(header, {'name': 'é', 'a': {'typed_array': 'Int8Array', 'offset': 0, 'length': 3},
+                                  'nested': [{'b': {'typed_array': 'Float64Array', 'offset': 8, 'length': 1}}],
+                                  'c': {'typed_array': 'Float64Array', 'offset': 16, 'length': 2}})
+        self.assertEqual(decoded, {'name': 'é', 'a': [1, 2, 3], 'nested': [{'b': [0.5]}], 'c': [None, 70000]})
+        self.assertEqual(len(body), 4 + struct.unpack_from('<I', body)[0] + 32)
+
+    def test_accept_negotiation(self):
+        self._upload()
+        url = '/activity/heart_rate/ACTIVITY1/'
+        for extra, content_type, columnar in [({}, 'application/json', False),
+                                              ({'HTTP_ACCEPT': 'application/json'}, 'application/json', False),
+                                              ({'HTTP_ACCEPT': self.typed_arrays}, self.typed_arrays, True),
+                                              ({'HTTP_ACCEPT': '*/*'}, 'application/json', False)]:
+            with self.subTest(**extra):
+                response = self._get(url, **extra)
+                self.assertEqual(response['Content-Type'].split(';')[0], content_type)
+                if not columnar:
+                    self.assertIsInstance(response.json()['heart_rate'], list)
+        self.assertEqual(self._get(f'{url}?format=typed-arrays')['Content-Type'], self.typed_arrays)
+        self.assertEqual(self.client.get('/activity/meta/ACTIVITY1/', HTTP_ACCEPT=self.typed_arrays).status_code, 406)
+        self.assertEqual(self.client.get(f'{url}?layout=rows').status_code, 400)
+
+
+@mock.patch.multiple(settings, RESPONSE_CACHE=None)
+class IngestCommandTests(TestCase):
+    """
+    manage.py ingest imports a Garmin directory tree, skipping what has
+    already been imported, including copies within the tree
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def _write(self, path, content):
+        path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fileobj:
+            fileobj.write(content)
+
+    def _ingest(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('ingest', self.directory, workers=2, stdout=stdout, stderr=stderr)
+        return stdout.getvalue().splitlines()[:2], stderr.getvalue()
+
+    def test_ingest(self):
+        monitor = build_monitor_file(datetime(2020, 6, 1, 12))
+        self._write('Activity/WALK1.FIT', build_activity_file(datetime(2020, 6, 1, 8)))
+        self._write('Monitor/MONITOR1.FIT', monitor)
+        self._write('Monitor/MONITOR2.FIT', build_monitor_file(datetime(2020, 6, 2, 12)))
+        # the same bytes twice in one run
+        self._write('Monitor/Backup/MONITOR1.FIT', monitor)
+        self._write('Monitor/BROKEN.FIT', monitor[:40])
+        self._write('GarminDevice.xml', b'<Device/>')
+
+        summary, errors = self._ingest()
+        self.assertEqual(summary[0][:summary[0].index(' in ')],
+                         "Imported 3 files (1 activity, 2 monitor, 0 totals)")
+        self.assertEqual(summary[1], "Skipped 1 already imported, 0 unsupported, 1 failed")
+        self.assertIn('BROKEN.FIT', errors)
+        self.assertEqual(ActivityFile.objects.count(), 1)
+        self.assertEqual(sorted(MonitorFile.objects.values_list('filename', flat=True)), ['MONITOR1', 'MONITOR2'])
+        self.assertEqual(StressData.objects.count(), 2 * 100)
+
+        # nothing new the second time
+        summary, _ = self._ingest()
+        self.assertEqual(summary[0][:summary[0].index(' in ')], "Imported 0 files (0 activity, 0 monitor, 0 totals)")
+        self.assertEqual(summary[1], "Skipped 4 already imported, 0 unsupported, 1 failed")
+
+    def test_not_a_directory(self):
+        with self.assertRaises(CommandError):
+            call_command('ingest', os.path.join(self.directory, 'missing'))
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class BatchUploadTests(TestCase):
+    """
+    Many files, and zips of a Garmin folder, are uploaded at once and
+    reported file by file
+    """
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME='localhost')
+        self.walk = build_activity_file(datetime(2020, 6, 1, 8))
+        self.monitor = build_monitor_file(datetime(2020, 6, 1, 12))
+
+    def _batch_upload(self, files):
+        response = self.client.post('/upload/batch/', {'file': [get_upload(name, content) for name, content in files]})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def _build_zip(self, members):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            for name, content in members:
+                zip_file.writestr(name, content)
+        return archive.getvalue()
+
+    def test_batch(self):
+        data = self._batch_upload([('WALK1.FIT', self.walk), ('MONITOR1.FIT', self.monitor),
+                                   ('MONITOR2.FIT', self.monitor), ('BROKEN.FIT', self.monitor[:40])])
+        self.assertEqual({status: data[status] for status in ('created', 'duplicate', 'failed')},
+                         {'created': 2, 'duplicate': 1, 'failed': 1})
+        self.assertEqual([(result['file'], result['type'], result['status']) for result in data['results']],
+                         [('WALK1.FIT', 'activity', 'created'), ('MONITOR1.FIT', 'monitor', 'created'),
+                          ('MONITOR2.FIT', None, 'duplicate'), ('BROKEN.FIT', 'monitor', 'failed')])
+        self.assertIn('error', data['results'][3])
+        self.assertTrue(ActivityFile.objects.filter(filename='WALK1').exists())
+        self.assertTrue(MonitorFile.objects.filter(filename='MONITOR1').exists())
+
+        self.assertEqual(self.client.post('/upload/batch/').status_code, 400)
+
+    def test_zip(self):
+        archive = self._build_zip([('garmindata/Activity/WALK1.FIT', self.walk),
+                                   ('garmindata/Monitor/MONITOR1.FIT', self.monitor),
+                                   ('garmindata/Monitor/COPY/MONITOR1.FIT', self.monitor),
+                                   ('garmindata/GarminDevice.xml', b'<Device/>')])
+        data = self._batch_upload([('garmindata.zip', archive),
+                                   ('MONITOR2.FIT', build_monitor_file(datetime(2020, 6, 2, 12)))])
+        self.assertEqual([(result['file'], result['status']) for result in data['results']],
+                         [('WALK1.FIT', 'created'), ('MONITOR1.FIT', 'created'), ('MONITOR1.FIT', 'duplicate'),
+                          ('MONITOR2.FIT', 'created')])
+        self.assertEqual(sorted(MonitorFile.objects.values_list('filename', flat=True)), ['MONITOR1', 'MONITOR2'])
+
+        # the same zip again
+        data = self._batch_upload([('garmindata.zip', archive)])
+        self.assertEqual((data['created'], data['duplicate'], data['failed']), (0, 3, 0))
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class ContentHashTests(TestCase):
+    """
+    Uploads are turned away when their bytes were uploaded before, and
+    renamed when only their Garmin filename was
+    """
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME='localhost')
+        self.walk = build_activity_file(datetime(2020, 6, 1, 8))
+        self.monitor = build_monitor_file(datetime(2020, 6, 1, 12))
+
+    def _upload(self, url, name, content, status_code=201):
+        response = self.client.post(url, {'file': get_upload(name, content)})
+        self.assertEqual(response.status_code, status_code, response.content)
+        return response.json()
+
+    def test_duplicate_content(self):
+        self._upload('/activity/upload/', 'WALK1.FIT', self.walk)
+        # identical bytes under another name are turned away before they are decoded
+        with mock.patch('activity.views.FitFile') as fit_file:
+            self.assertEqual(self._upload('/activity/upload/', 'WALK2.FIT', self.walk, 400),
+                             {'file': ['This file has already been uploaded.']})
+        fit_file.assert_not_called()
+        self._upload('/monitor/upload/', 'MONITOR1.FIT', self.monitor)
+        self._upload('/monitor/upload/', 'MONITOR1.FIT', self.monitor, 400)
+        self.assertEqual(ActivityFile.objects.get().sha256, get_file_hash(io.BytesIO(self.walk)))
+        self.assertEqual(MonitorFile.objects.get().sha256, get_file_hash(io.BytesIO(self.monitor)))
+
+    def test_same_filename(self):
+        # Garmin reuses 8 character names, different bytes under the same name are kept apart
+        self._upload('/activity/upload/', 'WALK1.FIT', self.walk)
+        other_walk = build_activity_file(datetime(2020, 6, 2, 8))
+        self._upload('/activity/upload/', 'WALK1.FIT', other_walk)
+        self._upload('/monitor/upload/', 'MONITOR1.FIT', self.monitor)
+        other_monitor = build_monitor_file(datetime(2020, 6, 2, 12))
+        self._upload('/monitor/upload/', 'MONITOR1.FIT', other_monitor)
+
+        self.assertEqual(sorted(ActivityFile.objects.values_list('filename', flat=True)),
+                         ['WALK1', f'WALK1-{get_file_hash(io.BytesIO(other_walk))[:6]}'])
+        self.assertEqual(sorted(MonitorFile.objects.values_list('filename', flat=True)),
+                         ['MONITOR1', f'MONITOR1-{get_file_hash(io.BytesIO(other_monitor))[:6]}'])
+
+    def test_filename_without_hash(self):
+        # files uploaded before content hashing can only be matched by name
+        self._upload('/activity/upload/', 'WALK1.FIT', self.walk)
+        ActivityFile.objects.update(sha256=None)
+        other_walk = build_activity_file(datetime(2020, 6, 2, 8))
+        self.assertEqual(self._upload('/activity/upload/', 'WALK1.FIT', other_walk, 400),
+                         {'file': ['This file has already been uploaded.']})
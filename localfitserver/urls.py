@@ -1,15 +1,20 @@
 from django.urls import include, path
 from rest_framework import routers
 
+from localfitserver import views
+
 
 router = routers.DefaultRouter()
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('upload/batch/', views.batch_upload),
+    path('cache/', views.response_cache),
     path('manual/', include(('manual.urls', 'manual'), namespace='manual')),
     path('monitor/', include(('monitor.urls', 'monitor'), namespace='monitor')),
     path('activity/', include(('activity.urls', 'activity'), namespace='activity')),
     path('totals/', include(('totals.urls', 'totals'), namespace='totals')),
     path('records/', include(('records.urls', 'records'), namespace='records')),
+    path('jobs/', include(('jobs.urls', 'jobs'), namespace='jobs')),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework'))
 ]
@@ -1,8 +1,11 @@
 # 3rd Party
-from datetime import timedelta, datetime
+import calendar
+from datetime import timedelta, datetime, timezone as dt_timezone
+from django.utils import timezone
 from django.utils.timezone import make_aware
 from decimal import Decimal
 from geopy.geocoders import Nominatim
+import numpy as np
 import pytz
 from localfitserver import settings
 
@@ -71,6 +74,119 @@ def convert_semicircles_to_degrees(semicircles):
     return round(semicircles * (180/(2**31)), 6)
 
 
+def _ant_seconds_to_unix_timestamps(ant_timestamps):
+    """
+    Converts an array of seconds since the ANT epoch into aware UTC datetimes.
+    """
+    DIFF_ANT_EPOCH_UNIX_EPOC_SECONDS = 631065600
+    unix_timestamps = (ant_timestamps + DIFF_ANT_EPOCH_UNIX_EPOC_SECONDS).astype('datetime64[s]')
+    return [timestamp.replace(tzinfo=pytz.UTC) for timestamp in unix_timestamps.tolist()]
+
+
+def bitswap_ant_timestamps_to_unix_timestamps(timestamps_32, timestamps_16):
+    """
+    Column version of bitswap_ant_timestamp_to_unix_timestamp().
+    Takes two equal length sequences, the most recent 32-bit timestamp
+    for each sample and the sample's timestamp_16, and returns a list of
+    aware UTC datetimes.
+    """
+    timestamps_32 = np.asarray(timestamps_32, dtype=np.int64)
+    timestamps_16 = np.asarray(timestamps_16, dtype=np.int64)
+    timestamps_32 = timestamps_32 + ((timestamps_16 - (timestamps_32 & 0xFFFF)) & 0xFFFF)
+    return _ant_seconds_to_unix_timestamps(timestamps_32)
+
+
+def convert_ant_timestamps_to_unix_timestamps(ant_timestamps):
+    """
+    Column version of make_aware() for FIT date_time fields.
+    Takes the raw values (seconds since the ANT epoch) rather than the
+    naive datetimes fitparse builds from them.
+    """
+    return _ant_seconds_to_unix_timestamps(np.asarray(ant_timestamps, dtype=np.int64))
+
+
+def convert_semicircles_array_to_degrees(semicircles):
+    """
+    Column version of convert_semicircles_to_degrees().
+
+    round() rounds the exact decimal value of the float, while rint() rounds
+    the float scaled by 10^6, which carries its own rounding error. The two
+    can only disagree right next to a tie, so those few values are rounded
+    the scalar way.
+    """
+    degrees = np.asarray(semicircles, dtype=np.float64) * (180/(2**31))
+    scaled = degrees * 1e6
+    rounded = np.rint(scaled) / 1e6
+    for i in np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6):
+        rounded[i] = round(float(degrees[i]), 6)
+    return rounded.tolist()
+
+
+def _get_probed_offset_table(tz, first, last):
+    # a zone that doesn't list its transitions, e.g. a dateutil zone: its offset is checked every hour from
+    # first to last, and each change bisected down to the second it happens
+    def get_offset(unix_timestamp):
+        return int(datetime.fromtimestamp(unix_timestamp, tz).utcoffset().total_seconds())
+
+    transitions, offsets = [np.iinfo(np.int64).min], [get_offset(first)]
+    for hour in range(first, last, 60 * 60):
+        start, end = hour, min(hour + 60 * 60, last)
+        if get_offset(end) == offsets[-1]:
+            continue
+        while end - start > 1:
+            middle = (start + end) // 2
+            start, end = (middle, end) if get_offset(middle) == offsets[-1] else (start, middle)
+        transitions.append(end)
+        offsets.append(get_offset(end))
+    # the zone itself, which works out the offset from the local time and its fold
+    return np.array(transitions), np.array(offsets), None
+
+
+def get_utc_offset_table(tz, first=0, last=0):
+    """
+    A zone's UTC transition times as UNIX timestamps, with the UTC offset
+    in seconds and the tzinfo its datetimes carry after each one. pytz and
+    fixed offset zones list every transition, other zones only those
+    between the UNIX timestamps first and last, with None for tzinfos
+    since their datetimes carry the zone itself.
+    """
+    transition_times = getattr(tz, '_utc_transition_times', None)
+    if transition_times is None:
+        if not isinstance(tz, (pytz.BaseTzInfo, dt_timezone)):
+            return _get_probed_offset_table(tz, int(first), int(last))
+        # a fixed offset zone, e.g. UTC
+        return np.array([np.iinfo(np.int64).min]), np.array([int(tz.utcoffset(None).total_seconds())]), [tz]
+
+    transitions = np.array([calendar.timegm(transition.timetuple()) for transition in transition_times])
+    offsets = np.array([int(info[0].total_seconds()) for info in tz._transition_info])
+    tzinfos = [tz._tzinfos[info] for info in tz._transition_info]
+    return transitions, offsets, tzinfos
+
+
+def convert_unix_timestamps_to_local_times(unix_timestamps):
+    """
+    Column version of timezone.localtime() for seconds since the UNIX epoch.
+    Looks up every timestamp's UTC offset with one search of the current
+    time zone's transitions, rather than pytz bisecting them once per
+    datetime, and returns the same aware datetimes.
+    """
+    unix_timestamps = np.asarray(unix_timestamps, dtype=np.int64)
+    if not len(unix_timestamps):
+        return []
+    transitions, offsets, tzinfos = get_utc_offset_table(timezone.get_current_timezone(),
+                                                         unix_timestamps.min(), unix_timestamps.max())
+    indexes = np.maximum(np.searchsorted(transitions, unix_timestamps, side='right') - 1, 0)
+    local_times = (unix_timestamps + offsets[indexes]).astype('datetime64[s]').tolist()
+    if tzinfos is not None:
+        return [local_time.replace(tzinfo=tzinfos[index]) for local_time, index in zip(local_times, indexes.tolist())]
+
+    # the local times repeated after the clocks went back are the second of the two, fold=1
+    tz = timezone.get_current_timezone()
+    previous_offsets = offsets[np.maximum(indexes - 1, 0)]
+    folds = (unix_timestamps - transitions[indexes] < previous_offsets - offsets[indexes]).tolist()
+    return [local_time.replace(tzinfo=tz, fold=int(fold)) for local_time, fold in zip(local_times, folds)]
+
+
 def calculate_geographic_midpoint(list_of_coordinates):
         """
         Calculating a real geographic midpoint is complicated, but for
@@ -92,10 +208,14 @@ def calculate_geographic_midpoint(list_of_coordinates):
         return round(midpoint_lat_deg, 6), round(midpoint_long_deg, 6)
 
 
-def convert_lat_long_to_location_name(lat, long):
+def convert_lat_long_to_location_name(lat, long, geolocator=None):
+    """
+    Reverse geocodes a coordinate into a short, human readable address.
+    This makes a network call and can fail, so it should never run while
+    an upload is in progress. See activity.geocoding.
+    """
     if lat and long:
-        # TODO call to geolocator can fail and should be made async
-        geolocator = Nominatim(user_agent="localfit")
+        geolocator = geolocator or Nominatim(user_agent="localfit")
         address = geolocator.reverse(f"{round(lat, 6)}, {round(long, 6)}").raw['address']
         small_location = address.get('path') or address.get('footway') or address.get('road') or address.get('street')
         med_location = address.get('hamlet') or address.get('village') or address.get('city')
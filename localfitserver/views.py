@@ -0,0 +1,46 @@
+# stdlib
+import zipfile
+
+# 3rd Party
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+# Internal
+from localfitserver.ingest import import_uploaded_file, import_zip_archive
+from localfitserver.response_cache import get_response_cache_stats
+
+
+@api_view(['POST'])
+def batch_upload(request):
+    """
+    Upload many FIT files of any supported type at once, either as
+    repeated multipart 'file' fields or as a single zip of a Garmin
+    folder. Each file is reported as created, duplicate or failed.
+    """
+    files = request.FILES.getlist('file')
+    if not files:
+        raise ValidationError({"file": "Please provide a file"})
+
+    results = []
+    for upload in files:
+        if zipfile.is_zipfile(upload):
+            upload.seek(0)
+            results.extend(import_zip_archive(upload))
+        else:
+            upload.seek(0)
+            results.append(import_uploaded_file(upload.name, upload))
+
+    response = {status: len([r for r in results if r['status'] == status])
+                for status in ('created', 'duplicate', 'failed')}
+    response['results'] = results
+    return Response(response)
+
+
+@api_view(['GET'])
+def response_cache(request):
+    """
+    This process's response cache hits and misses, see
+    localfitserver.response_cache
+    """
+    return Response(get_response_cache_stats())
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManualStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vo2_max', models.DecimalField(decimal_places=1, max_digits=3, null=True)),
+                ('weight_lbs', models.DecimalField(decimal_places=1, max_digits=4, null=True)),
+                ('height_inches', models.IntegerField(null=True)),
+                ('age', models.IntegerField(null=True)),
+            ],
+        ),
+    ]
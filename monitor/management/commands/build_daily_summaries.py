@@ -0,0 +1,42 @@
+# stdlib
+from datetime import timedelta
+
+# 3rd Party
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+# Internal
+from monitor.models import DailySummary, StepData
+from monitor.summaries import build_daily_summaries, get_monitor_dates
+
+
+class Command(BaseCommand):
+    """
+    Monitor files uploaded before DailySummary existed have no daily
+    summaries. This rebuilds every day's from the samples, a month at a
+    time. Run it again after changing TIME_ZONE, which moves the days'
+    boundaries.
+    """
+    help = "Rebuild the daily summary of every day with monitor data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=31, help="Days to read the samples of at a time")
+
+    def handle(self, *args, **options):
+        step_dates = StepData.objects.aggregate(first=Min('date'), last=Max('date'))
+        dates = get_monitor_dates() + [date for date in step_dates.values() if date]
+
+        built = 0
+        with transaction.atomic():
+            DailySummary.objects.all().delete()
+            start_date = min(dates) if dates else None
+            while dates and start_date <= max(dates):
+                end_date = start_date + timedelta(days=options['days'] - 1)
+                summaries = build_daily_summaries(start_date, end_date)
+                DailySummary.objects.bulk_create(summaries)
+                built += len(summaries)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{start_date} to {end_date}: {len(summaries)} days")
+                start_date = end_date + timedelta(days=1)
+        self.stdout.write(f"Built daily summaries for {built} days")
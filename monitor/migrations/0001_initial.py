@@ -0,0 +1,58 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonitorFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=15, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StressData',
+            fields=[
+                ('monitor_stress_data_id', models.AutoField(primary_key=True, serialize=False)),
+                ('stress_level_time_utc', models.DateTimeField()),
+                ('stress_level_value', models.IntegerField()),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitor.MonitorFile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StepData',
+            fields=[
+                ('step_data_id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('steps', models.IntegerField(null=True)),
+                ('file', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='monitor.MonitorFile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RestingMetRateData',
+            fields=[
+                ('resting_metabolic_rate_data_id', models.AutoField(primary_key=True, serialize=False)),
+                ('timestamp_utc', models.DateTimeField()),
+                ('resting_metabolic_rate', models.IntegerField()),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitor.MonitorFile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HeartRateData',
+            fields=[
+                ('heart_rate_data_id', models.AutoField(primary_key=True, serialize=False)),
+                ('timestamp_utc', models.DateTimeField()),
+                ('heart_rate', models.IntegerField()),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitor.MonitorFile')),
+            ],
+        ),
+    ]
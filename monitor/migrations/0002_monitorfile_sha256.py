@@ -0,0 +1,18 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monitorfile',
+            name='sha256',
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0002_monitorfile_sha256'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='heartratedata',
+            index=models.Index(fields=['timestamp_utc'], name='monitor_hea_timesta_a3d4a2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restingmetratedata',
+            index=models.Index(fields=['timestamp_utc'], name='monitor_res_timesta_f71d1d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stepdata',
+            index=models.Index(fields=['date'], name='monitor_ste_date_efd8c0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stressdata',
+            index=models.Index(fields=['stress_level_time_utc'], name='monitor_str_stress__2d31f4_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.8 on 2026-10-18 11:07
+
+from django.db import migrations
+import localfitserver.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0003_time_series_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='heartratedata',
+            name='timestamp_utc',
+            field=localfitserver.fields.EpochDateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='stressdata',
+            name='stress_level_time_utc',
+            field=localfitserver.fields.EpochDateTimeField(),
+        ),
+        # the table copies above keep each value as it was, convert them in place
+        migrations.RunSQL(
+            sql=[
+                "UPDATE monitor_heartratedata SET timestamp_utc = CAST(strftime('%s', timestamp_utc) AS INTEGER)",
+                "UPDATE monitor_stressdata SET stress_level_time_utc = "
+                "CAST(strftime('%s', stress_level_time_utc) AS INTEGER)",
+            ],
+            reverse_sql=[
+                "UPDATE monitor_heartratedata SET timestamp_utc = datetime(timestamp_utc, 'unixepoch')",
+                "UPDATE monitor_stressdata SET stress_level_time_utc = datetime(stress_level_time_utc, 'unixepoch')",
+            ],
+        ),
+    ]
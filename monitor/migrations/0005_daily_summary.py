@@ -0,0 +1,30 @@
+# Generated by Django 2.2.8 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_compact_sample_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('min_heart_rate', models.IntegerField(null=True)),
+                ('max_heart_rate', models.IntegerField(null=True)),
+                ('avg_heart_rate', models.IntegerField(null=True)),
+                ('resting_heart_rate', models.IntegerField(null=True)),
+                ('rest_stress_minutes', models.IntegerField(default=0)),
+                ('low_stress_minutes', models.IntegerField(default=0)),
+                ('med_stress_minutes', models.IntegerField(default=0)),
+                ('high_stress_minutes', models.IntegerField(default=0)),
+                ('resting_metabolic_rate', models.IntegerField(null=True)),
+                ('steps', models.IntegerField(null=True)),
+            ],
+        ),
+    ]
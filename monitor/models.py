@@ -1,12 +1,15 @@
 # coding=utf-8
 from django.db import models
 
+from localfitserver.fields import EpochDateTimeField
+
 
 class MonitorFile(models.Model):
     """
     MONITOR files
     """
     filename = models.CharField(max_length=15, unique=True)
+    sha256 = models.CharField(null=True, max_length=64, unique=True)  # content hash of the uploaded FIT file
 
 
 class StressData(models.Model):
@@ -15,9 +18,12 @@ class StressData(models.Model):
     """
     monitor_stress_data_id = models.AutoField(primary_key=True)
     file = models.ForeignKey(MonitorFile, on_delete=models.CASCADE)
-    stress_level_time_utc = models.DateTimeField()
+    stress_level_time_utc = EpochDateTimeField()
     stress_level_value = models.IntegerField()
 
+    class Meta:
+        indexes = [models.Index(fields=['stress_level_time_utc'])]
+
 
 class HeartRateData(models.Model):
     """
@@ -26,9 +32,12 @@ class HeartRateData(models.Model):
 
     heart_rate_data_id = models.AutoField(primary_key=True)
     file = models.ForeignKey(MonitorFile, on_delete=models.CASCADE)
-    timestamp_utc = models.DateTimeField()
+    timestamp_utc = EpochDateTimeField()
     heart_rate = models.IntegerField()
 
+    class Meta:
+        indexes = [models.Index(fields=['timestamp_utc'])]
+
 
 class RestingMetRateData(models.Model):
     """
@@ -40,6 +49,9 @@ class RestingMetRateData(models.Model):
     timestamp_utc = models.DateTimeField()
     resting_metabolic_rate = models.IntegerField()  # KCAL
 
+    class Meta:
+        indexes = [models.Index(fields=['timestamp_utc'])]
+
 
 class StepData(models.Model):
     """
@@ -50,3 +62,25 @@ class StepData(models.Model):
     file = models.ForeignKey(MonitorFile, on_delete=models.CASCADE, null=True)
     date = models.DateField()
     steps = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['date'])]
+
+
+class DailySummary(models.Model):
+    """
+    One local day of monitor data, refreshed by every monitor upload that
+    has samples on it, so views covering many days read a row per day
+    rather than every sample. See monitor.summaries.
+    """
+    date = models.DateField(unique=True)
+    min_heart_rate = models.IntegerField(null=True)          # BPM
+    max_heart_rate = models.IntegerField(null=True)          # BPM
+    avg_heart_rate = models.IntegerField(null=True)          # BPM
+    resting_heart_rate = models.IntegerField(null=True)      # BPM, the lowest 30 minute average
+    rest_stress_minutes = models.IntegerField(default=0)
+    low_stress_minutes = models.IntegerField(default=0)
+    med_stress_minutes = models.IntegerField(default=0)
+    high_stress_minutes = models.IntegerField(default=0)
+    resting_metabolic_rate = models.IntegerField(null=True)  # KCAL, the day's last reading
+    steps = models.IntegerField(null=True)
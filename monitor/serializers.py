@@ -1,16 +1,17 @@
 # stdlib
-from datetime import datetime, time
+from datetime import date, timedelta
 from decimal import Decimal
 
 # 3rd Party
-from django.db.models.functions.datetime import TruncDate
-from django.utils import timezone
+from django.db.models import Count, Q, Sum
 from rest_framework import serializers
 from rest_framework.utils.serializer_helpers import ReturnDict
 
 # Internal
-from .models import HeartRateData, RestingMetRateData, StepData
+from .models import DailySummary, HeartRateData, RestingMetRateData, StepData
 from localfitserver.base_serializers import BaseChartJSListSerializer
+from localfitserver.fields import EPOCH, get_local_day_numbers
+from localfitserver.renderers import Column
 
 
 class StepDataListSerializer(BaseChartJSListSerializer):
@@ -18,13 +19,23 @@ class StepDataListSerializer(BaseChartJSListSerializer):
     time_field = 'date'
 
     def _format_for_chart_js(self, data):
+        rows = list(data.order_by('date').values_list(self.time_field, self.chart_field))
         return [
             {
-                "t": getattr(value, self.time_field).strftime("%Y-%m-%d"),
-                "y": getattr(value, self.chart_field) if getattr(value, self.chart_field) != -1 else 0
-            } for value in data.order_by('date')
+                "t": day.strftime("%Y-%m-%d"),
+                "y": steps if steps != -1 else 0
+            } for day, steps in self._downsample(rows, date.toordinal)
         ]
 
+    def _format_columns(self, data):
+        # steps are counted per day, so their days stay dates
+        rows = self._downsample(list(data.order_by('date').values_list(self.time_field, self.chart_field)),
+                                date.toordinal)
+        return {
+            't': [day.strftime("%Y-%m-%d") for day, _ in rows],
+            'y': Column([steps if steps != -1 else 0 for _, steps in rows]),
+        }
+
 
 class StepDataSerializer(serializers.ModelSerializer):
 
@@ -38,7 +49,7 @@ class StepGoalListSerializer(serializers.ListSerializer):
 
     @property
     def data(self):
-        actual_total_steps = sum(self.instance.values_list('steps', flat=True))
+        actual_total_steps = self.instance.aggregate(steps=Sum('steps'))['steps'] or 0
         goal_total_steps = 5000 * self.context["days_in_month"]
         response = {
             'monthly_step_goal_percent_completed': round((actual_total_steps / goal_total_steps), 2)
@@ -91,60 +102,48 @@ class StressDataSerializer(serializers.Serializer):
 
 class PieChartListSerializer(serializers.ListSerializer):
 
-    def _get_range_by_value(self, value):
-        range = "NONE"
-        if 0 <= value <= 25:
-            range = "REST"
-        if 25 < value <= 50:
-            range = "LOW"
-        if 50 < value <= 75:
-            range = "MED"
-        if 75 < value <= 100:
-            range = "HIGH"
-
-        return range
-
-    def _build_stress_payload(self, data, date_range):
-        stress_ranges = [
-            self._get_range_by_value(d.stress_level_value) for d in
-            data.filter(**date_range)
-        ]
-        rest = stress_ranges.count("REST")
-        low = stress_ranges.count("LOW")
-        med = stress_ranges.count("MED")
-        high = stress_ranges.count("HIGH")
-        actual_stress_data_range = rest + low + med + high
+    # stress levels outside these ranges (e.g. -1 when the watch was off wrist) are left out
+    stress_ranges = {
+        'REST': Q(stress_level_value__gte=0, stress_level_value__lte=25),
+        'LOW': Q(stress_level_value__gt=25, stress_level_value__lte=50),
+        'MED': Q(stress_level_value__gt=50, stress_level_value__lte=75),
+        'HIGH': Q(stress_level_value__gt=75, stress_level_value__lte=100),
+    }
+
+    def _build_stress_payload(self, stress_date, counts):
+        actual_stress_data_range = sum(counts.values())
         return {
-            "date": date_range['stress_level_time_utc__range'][0].date(),
+            "date": stress_date,
             "stress_data": {
-                "REST": round(Decimal((rest / actual_stress_data_range) * 100), 0),
-                "LOW": round(Decimal((low / actual_stress_data_range) * 100), 0),
-                "MED": round(Decimal((med / actual_stress_data_range) * 100), 0),
-                "HIGH": round(Decimal((high / actual_stress_data_range) * 100), 0)
+                stress_range: round(Decimal((count / actual_stress_data_range) * 100), 0)
+                for stress_range, count in counts.items()
             }
         }
 
     def _format_for_pie_chart(self, data):
+        # every day's samples counted per stress range by one grouped query, without days that only have samples
+        # outside the ranges
+        data = data.filter(stress_level_value__gte=0, stress_level_value__lte=100)
+        days = data.order_by().annotate(day=get_local_day_numbers(data, 'stress_level_time_utc')).values('day')
+        counts_by_day = days.annotate(**{
+            stress_range: Count('pk', filter=condition) for stress_range, condition in self.stress_ranges.items()
+        }).order_by('day')
+
+        stress_dates = []
         stress_response = []
-        stress_dates = [
-            d['date'] for d in
-            data.annotate(date=TruncDate('stress_level_time_utc')).values('date').distinct()
-        ]
-        for stress_date in stress_dates:
-            date_range = {
-                'stress_level_time_utc__range': (
-                datetime.combine(stress_date, time.min), datetime.combine(stress_date, time.max))
-            }
-            stress_payload = self._build_stress_payload(data, date_range)
-            stress_response.append(stress_payload)
+        for counts in counts_by_day:
+            stress_date = EPOCH.date() + timedelta(days=counts.pop('day'))
+            stress_dates.append(stress_date)
+            stress_response.append(self._build_stress_payload(stress_date, counts))
         return stress_dates, stress_response
 
     @property
     def data(self):
         stress_dates, stress_response = self._format_for_pie_chart(self.instance)
+        # no dates for a range without stress levels
         response = {
-            'start_date': stress_dates[0],
-            'end_date': stress_dates[-1],
+            'start_date': stress_dates[0] if stress_dates else None,
+            'end_date': stress_dates[-1] if stress_dates else None,
             'stress': stress_response
         }
         return ReturnDict(response, serializer=self)
@@ -154,3 +153,10 @@ class PieChartSerializer(serializers.Serializer):
 
     class Meta:
         list_serializer_class = PieChartListSerializer
+
+
+class DailySummarySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = DailySummary
+        exclude = ['id']
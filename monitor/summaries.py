@@ -0,0 +1,120 @@
+# stdlib
+from datetime import datetime, time, timedelta
+
+# 3rd Party
+from django.db.models import BigIntegerField, Count, ExpressionWrapper, F, Max, Min
+from django.utils import timezone
+import numpy as np
+
+# Internal
+from .models import DailySummary, HeartRateData, RestingMetRateData, StepData, StressData
+from .serializers import PieChartListSerializer
+from localfitserver.fields import EPOCH, get_local_day_numbers
+from localfitserver.utils import get_utc_offset_table
+
+
+# the watch records a stress level every 3 minutes
+STRESS_LEVEL_MINUTES = 3
+# resting heart rate is the day's lowest average heart rate over this many seconds
+RESTING_HEART_RATE_WINDOW = 30 * 60
+
+
+def get_monitor_dates(**filters):
+    """
+    The local dates the first and last heart rate, stress and resting
+    metabolic rate samples matching filters fall on, e.g. file=file
+    """
+    dates = []
+    for model, field_name in ((HeartRateData, 'timestamp_utc'), (StressData, 'stress_level_time_utc'),
+                              (RestingMetRateData, 'timestamp_utc')):
+        bounds = model.objects.filter(**filters).aggregate(first=Min(field_name), last=Max(field_name))
+        dates += [timezone.localtime(bound).date() for bound in bounds.values() if bound]
+    return dates
+
+
+def _get_local_days(unix_timestamps):
+    # get_local_day_numbers() for timestamps already read
+    transitions, offsets, _ = get_utc_offset_table(timezone.get_current_timezone(), unix_timestamps.min(),
+                                                   unix_timestamps.max())
+    indexes = np.maximum(np.searchsorted(transitions, unix_timestamps, side='right') - 1, 0)
+    return (unix_timestamps + offsets[indexes]) // (24 * 60 * 60)
+
+
+def _get_resting_heart_rate(timestamps, heart_rates):
+    # the lowest average of the samples in any window starting at a sample, ignoring windows cut short by
+    # the end of the day
+    complete = timestamps <= timestamps[-1] - RESTING_HEART_RATE_WINDOW
+    if not complete.any():
+        return None
+    # samples at the same time, e.g. from overlapping files, start the same window
+    starts = np.unique(np.searchsorted(timestamps, timestamps[complete], side='left'))
+    ends = np.searchsorted(timestamps, timestamps[starts] + RESTING_HEART_RATE_WINDOW, side='left')
+    totals = np.concatenate([[0], np.cumsum(heart_rates)])
+    return int(round(((totals[ends] - totals[starts]) / (ends - starts)).min()))
+
+
+def _add_heart_rates(get_summary, rows):
+    unix_timestamps = np.array([row[0] for row in rows], dtype=np.int64)
+    heart_rates = np.array([row[1] for row in rows], dtype=np.int64)
+    days = _get_local_days(unix_timestamps)
+    for samples in np.split(np.arange(len(days)), np.flatnonzero(np.diff(days)) + 1):
+        summary = get_summary(int(days[samples[0]]))
+        day_heart_rates = heart_rates[samples]
+        summary.min_heart_rate = int(day_heart_rates.min())
+        summary.max_heart_rate = int(day_heart_rates.max())
+        summary.avg_heart_rate = int(round(day_heart_rates.mean()))
+        summary.resting_heart_rate = _get_resting_heart_rate(unix_timestamps[samples], day_heart_rates)
+
+
+def build_daily_summaries(start_date, end_date):
+    """
+    Unsaved DailySummaries of every local date from start_date to
+    end_date that has monitor data, read from the samples with a query
+    per table
+    """
+    tz = timezone.get_current_timezone()
+    start = tz.localize(datetime.combine(start_date, time.min))
+    end = tz.localize(datetime.combine(end_date + timedelta(days=1), time.min))
+    summaries = {}
+
+    def get_summary(day):
+        if day not in summaries:
+            summaries[day] = DailySummary(date=EPOCH.date() + timedelta(days=day))
+        return summaries[day]
+
+    heart_rates = HeartRateData.objects.filter(timestamp_utc__gte=start, timestamp_utc__lt=end)
+    unix_timestamp = ExpressionWrapper(F('timestamp_utc'), output_field=BigIntegerField())
+    rows = list(heart_rates.order_by('timestamp_utc').values_list(unix_timestamp, 'heart_rate'))
+    if rows:
+        _add_heart_rates(get_summary, rows)
+
+    # every day's stress samples counted per stress range, as the stress pie counts them
+    stress = StressData.objects.filter(stress_level_time_utc__gte=start, stress_level_time_utc__lt=end)
+    days = stress.order_by().annotate(day=get_local_day_numbers(stress, 'stress_level_time_utc')).values('day')
+    for counts in days.annotate(**{stress_range: Count('pk', filter=condition) for stress_range, condition
+                                   in PieChartListSerializer.stress_ranges.items()}):
+        summary = get_summary(counts.pop('day'))
+        for stress_range, count in counts.items():
+            setattr(summary, f'{stress_range.lower()}_stress_minutes', count * STRESS_LEVEL_MINUTES)
+
+    resting_metabolic_rates = RestingMetRateData.objects.filter(timestamp_utc__gte=start, timestamp_utc__lt=end)
+    for timestamp, resting_metabolic_rate in resting_metabolic_rates.order_by('timestamp_utc').values_list(
+            'timestamp_utc', 'resting_metabolic_rate'):
+        day = (timezone.localtime(timestamp).date() - EPOCH.date()).days
+        get_summary(day).resting_metabolic_rate = resting_metabolic_rate
+
+    for date, steps in StepData.objects.filter(date__gte=start_date, date__lte=end_date).values_list('date', 'steps'):
+        get_summary((date - EPOCH.date()).days).steps = steps
+
+    return [summaries[day] for day in sorted(summaries)]
+
+
+def save_daily_summaries(start_date, end_date):
+    """
+    Replaces the DailySummaries from start_date to end_date with ones
+    built from the samples. Call it inside a transaction.
+    """
+    summaries = build_daily_summaries(start_date, end_date)
+    DailySummary.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+    DailySummary.objects.bulk_create(summaries)
+    return summaries
@@ -1,3 +1,301 @@
-from django.test import TestCase
+# stdlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+import os
+import random
+from unittest import mock
 
-# Create your tests here.
+# 3rd Party
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.timezone import make_aware
+import numpy as np
+import pytz
+
+# Internal
+from localfitserver import settings
+from localfitserver.testing import build_monitor_file, get_upload
+from localfitserver.utils import (bitswap_ant_timestamp_to_unix_timestamp, bitswap_ant_timestamps_to_unix_timestamps,
+                                  convert_ant_timestamps_to_unix_timestamps)
+from monitor.models import DailySummary, HeartRateData, RestingMetRateData, StepData, StressData
+from monitor.summaries import RESTING_HEART_RATE_WINDOW, _get_resting_heart_rate, save_daily_summaries
+
+
+class BitswapTimestampsArrayTests(SimpleTestCase):
+    """
+    bitswap_ant_timestamps_to_unix_timestamps() must give the datetimes of
+    bitswap_ant_timestamp_to_unix_timestamp() for every sample.
+    """
+
+    def assertMatchesScalar(self, timestamps_32, timestamps_16):
+        timestamps = bitswap_ant_timestamps_to_unix_timestamps(timestamps_32, timestamps_16)
+        self.assertEqual(timestamps, [bitswap_ant_timestamp_to_unix_timestamp(timestamp_32, timestamp_16)
+                                      for timestamp_32, timestamp_16 in zip(timestamps_32, timestamps_16)])
+        self.assertTrue(all(timestamp.tzinfo is pytz.UTC for timestamp in timestamps))
+
+    def test_edges(self):
+        timestamps_32 = []
+        timestamps_16 = []
+        for timestamp_32 in [0x10000000, 0x1000FFFF, 946684800, 946749439, 2**31 - 1, 2**32 - 0x10001]:
+            low = timestamp_32 & 0xFFFF
+            # the same suffix, the next second, the last one before and after the rollover of the low 16 bits
+            for timestamp_16 in [low, (low + 1) & 0xFFFF, (low - 1) & 0xFFFF, 0, 0xFFFF]:
+                timestamps_32.append(timestamp_32)
+                timestamps_16.append(timestamp_16)
+        self.assertMatchesScalar(timestamps_32, timestamps_16)
+
+    def test_random(self):
+        rng = random.Random(0)
+        timestamps_32 = [rng.randint(0x10000000, 2**32 - 0x10001) for _ in range(10000)]
+        timestamps_16 = [rng.randint(0, 0xFFFF) for _ in range(10000)]
+        self.assertMatchesScalar(timestamps_32, timestamps_16)
+
+    def test_full_timestamp(self):
+        # the upload bitswaps a monitoring message's full timestamp onto itself
+        timestamp_32 = 946684800
+        timestamps = bitswap_ant_timestamps_to_unix_timestamps([timestamp_32], [timestamp_32 & 0xFFFF])
+        self.assertEqual(timestamps, [make_aware(datetime.utcfromtimestamp(631065600 + timestamp_32), timezone=pytz.UTC)])
+
+    def test_empty(self):
+        self.assertEqual(bitswap_ant_timestamps_to_unix_timestamps([], []), [])
+
+
+class StressTimestampsArrayTests(SimpleTestCase):
+    """
+    convert_ant_timestamps_to_unix_timestamps() must give the datetimes the
+    stress upload made with make_aware() on fitparse's date_time values.
+    """
+
+    def test_matches_fitparse(self):
+        rng = random.Random(0)
+        ant_timestamps = [0x10000000, 2**32 - 2] + [rng.randint(0x10000000, 2**32 - 2) for _ in range(1000)]
+        self.assertEqual(convert_ant_timestamps_to_unix_timestamps(ant_timestamps),
+                         [make_aware(datetime.utcfromtimestamp(631065600 + value), timezone=pytz.UTC)
+                          for value in ant_timestamps])
+
+
+def get_resting_heart_rate(samples):
+    """
+    The lowest average heart rate of the (unix timestamp, heart rate)
+    samples in any window starting at a sample, ignoring windows cut
+    short by the last sample
+    """
+    averages = []
+    for start, _ in samples:
+        if start <= samples[-1][0] - RESTING_HEART_RATE_WINDOW:
+            window = [heart_rate for timestamp, heart_rate in samples
+                      if start <= timestamp < start + RESTING_HEART_RATE_WINDOW]
+            averages.append(sum(window) / len(window))
+    return int(round(min(averages))) if averages else None
+
+
+def get_expected_summaries():
+    """
+    Every day's summary worked out a sample at a time with localtime()
+    """
+    summaries = defaultdict(lambda: {'min_heart_rate': None, 'max_heart_rate': None, 'avg_heart_rate': None,
+                                     'resting_heart_rate': None, 'rest_stress_minutes': 0, 'low_stress_minutes': 0,
+                                     'med_stress_minutes': 0, 'high_stress_minutes': 0,
+                                     'resting_metabolic_rate': None, 'steps': None})
+
+    heart_rates = defaultdict(list)
+    for sample in HeartRateData.objects.order_by('timestamp_utc'):
+        heart_rates[timezone.localtime(sample.timestamp_utc).date()].append(
+            (int(sample.timestamp_utc.timestamp()), sample.heart_rate))
+    for day, samples in heart_rates.items():
+        values = [heart_rate for _, heart_rate in samples]
+        summaries[day].update(min_heart_rate=min(values), max_heart_rate=max(values),
+                              avg_heart_rate=int(round(sum(values) / len(values))),
+                              resting_heart_rate=get_resting_heart_rate(samples))
+
+    for sample in StressData.objects.all():
+        for stress_range, low, high in [('rest', 0, 25), ('low', 26, 50), ('med', 51, 75), ('high', 76, 100)]:
+            if low <= sample.stress_level_value <= high:
+                summaries[timezone.localtime(sample.stress_level_time_utc).date()][f'{stress_range}_stress_minutes'] += 3
+
+    for sample in RestingMetRateData.objects.order_by('timestamp_utc'):
+        summaries[timezone.localtime(sample.timestamp_utc).date()]['resting_metabolic_rate'] = \
+            sample.resting_metabolic_rate
+
+    for sample in StepData.objects.all():
+        summaries[sample.date]['steps'] = sample.steps
+    return {day: dict(summary) for day, summary in summaries.items()}
+
+
+class RestingHeartRateTests(SimpleTestCase):
+    """
+    The resting heart rate is the lowest average over a 30 minute window
+    """
+
+    def test_matches_every_window(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            # uneven gaps, samples at the same time and days shorter than a window
+            timestamps = np.cumsum([rng.choice([0, 1, 60, 60, 60, 300, 1000]) for _ in range(rng.randrange(1, 120))])
+            heart_rates = np.array([rng.randrange(40, 180) for _ in timestamps])
+            samples = list(zip(timestamps.tolist(), heart_rates.tolist()))
+            with self.subTest(samples=samples):
+                self.assertEqual(_get_resting_heart_rate(timestamps, heart_rates), get_resting_heart_rate(samples))
+
+    def test_short_day(self):
+        timestamps = np.arange(0, RESTING_HEART_RATE_WINDOW, 60)
+        self.assertIsNone(_get_resting_heart_rate(timestamps, np.full(len(timestamps), 60)))
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class DailySummaryTests(TestCase):
+    """
+    The summaries an upload saves for its days match summaries worked out
+    from every sample, and a rebuild of every day
+    """
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME='localhost')
+
+    def _upload(self, name, start_time_utc, minutes):
+        response = self.client.post('/monitor/upload/',
+                                    {'file': get_upload(name, build_monitor_file(start_time_utc, minutes))})
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def _get_summaries(self):
+        fields = [field.name for field in DailySummary._meta.fields if field.name not in ('id', 'date')]
+        return {summary.pop('date'): summary for summary in DailySummary.objects.values('date', *fields)}
+
+    def assertSummariesMatch(self):
+        summaries = self._get_summaries()
+        self.assertEqual(summaries, get_expected_summaries())
+        call_command('build_daily_summaries', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self._get_summaries(), summaries)
+
+    def test_out_of_order_and_overlapping(self):
+        for name, start_time_utc, minutes in [('MONITOR3.FIT', datetime(2020, 6, 3, 12), 300),
+                                              ('MONITOR1.FIT', datetime(2020, 6, 1, 12), 300),
+                                              # across local midnight, over the samples of MONITOR1 and MONITOR3
+                                              ('MONITOR2.FIT', datetime(2020, 6, 1, 15), 3000)]:
+            self._upload(name, start_time_utc, minutes)
+            with self.subTest(name=name):
+                self.assertSummariesMatch()
+        self.assertEqual(len(self._get_summaries()), 3)
+
+    def test_dst_change(self):
+        # Saturday 23:00 to Monday 00:40 in Los Angeles, across the end of daylight saving
+        self._upload('MONITOR1.FIT', datetime(2020, 11, 1, 6), 1600)
+        self.assertSummariesMatch()
+        summaries = self._get_summaries()
+        self.assertEqual(sorted(summaries), [datetime(2020, 10, 31).date(), datetime(2020, 11, 1).date(),
+                                             datetime(2020, 11, 2).date()])
+        # the 25 hour day
+        self.assertEqual(sum(summaries[datetime(2020, 11, 1).date()][f'{stress_range}_stress_minutes']
+                             for stress_range in ('rest', 'low', 'med', 'high')), 25 * 60)
+
+    def test_save_daily_summaries(self):
+        self._upload('MONITOR1.FIT', datetime(2020, 6, 1, 12), 3000)
+        expected = self._get_summaries()
+        DailySummary.objects.update(steps=0, resting_heart_rate=0)
+
+        # only the days asked for are replaced
+        june_2 = datetime(2020, 6, 2).date()
+        save_daily_summaries(june_2, june_2)
+        summaries = self._get_summaries()
+        self.assertEqual(summaries[june_2], expected[june_2])
+        self.assertEqual({summary['steps'] for day, summary in summaries.items() if day != june_2}, {0})
+
+    def test_daily_endpoint(self):
+        self._upload('MONITOR1.FIT', datetime(2020, 6, 1, 12), 3000)
+
+        response = self.client.get('/monitor/daily/?start_date=2020-06-02&end_date=2020-06-03')
+        self.assertEqual(response.status_code, 200, response.content)
+        expected = get_expected_summaries()
+        self.assertEqual(response.json(), [dict(expected[day], date=str(day))
+                                           for day in sorted(expected) if str(day) in ('2020-06-02', '2020-06-03')])
+        self.assertEqual(self.client.get('/monitor/daily/?end_date=2020-06-03').status_code, 400)
+
+
+def get_expected_pie_chart(start_date, end_date):
+    """
+    The stress pie chart of the UTC dates from start_date up to end_date,
+    worked out a local day at a time like it was before the grouped query
+    """
+    counts = defaultdict(lambda: {'REST': 0, 'LOW': 0, 'MED': 0, 'HIGH': 0})
+    # the view reads the dates in the current time zone
+    for sample in StressData.objects.filter(stress_level_time_utc__gte=make_aware(start_date),
+                                            stress_level_time_utc__lt=make_aware(end_date)):
+        for stress_range, low, high in [('REST', 0, 25), ('LOW', 26, 50), ('MED', 51, 75), ('HIGH', 76, 100)]:
+            if low <= sample.stress_level_value <= high:
+                counts[timezone.localtime(sample.stress_level_time_utc).date()][stress_range] += 1
+
+    days = sorted(counts)
+    return {
+        'start_date': days[0] if days else None,
+        'end_date': days[-1] if days else None,
+        'stress': [{'date': day, 'stress_data': {
+            stress_range: round(Decimal((count / sum(counts[day].values())) * 100), 0)
+            for stress_range, count in counts[day].items()
+        }} for day in days],
+    }
+
+
+@mock.patch.multiple(settings, INGEST_ASYNC=False, RESPONSE_CACHE=None)
+class StressPieChartTests(TestCase):
+    """
+    The stress pie chart counts every local day's stress levels per range
+    in a constant number of queries
+    """
+
+    def setUp(self):
+        self.client = Client(SERVER_NAME='localhost')
+
+    def _upload(self, name, start_time_utc, minutes):
+        response = self.client.post('/monitor/upload/',
+                                    {'file': get_upload(name, build_monitor_file(start_time_utc, minutes))})
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def _get(self, start_date, end_date):
+        response = self.client.get(f'/monitor/stress_range/?start_date={start_date:%Y-%m-%d} 00:00:00'
+                                   f'&end_date={end_date:%Y-%m-%d} 00:00:00')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def assertPieChartMatches(self, start_date, end_date):
+        self.assertEqual(self._get(start_date, end_date), get_expected_pie_chart(start_date, end_date))
+
+    def test_days(self):
+        self._upload('MONITOR1.FIT', datetime(2020, 6, 1, 12), 5 * 24 * 60)
+        # off wrist for a while, and for a whole day
+        StressData.objects.filter(stress_level_value__gt=90).update(stress_level_value=-1)
+        StressData.objects.filter(stress_level_time_utc__gte=datetime(2020, 6, 4, 7, tzinfo=pytz.UTC),
+                                  stress_level_time_utc__lt=datetime(2020, 6, 5, 7, tzinfo=pytz.UTC)).update(
+            stress_level_value=-1)
+
+        data = self._get(datetime(2020, 6, 1), datetime(2020, 6, 7))
+        self.assertEqual([day['date'] for day in data['stress']],
+                         [datetime(2020, 6, day).date() for day in (1, 2, 3, 5, 6)])
+        for start_day, end_day in [(1, 7), (2, 3), (3, 6), (1, 2)]:
+            with self.subTest(start_day=start_day, end_day=end_day):
+                self.assertPieChartMatches(datetime(2020, 6, start_day), datetime(2020, 6, end_day))
+
+    def test_dst_change(self):
+        # Saturday 23:00 to Monday 00:40 in Los Angeles, across the end of daylight saving
+        self._upload('MONITOR1.FIT', datetime(2020, 11, 1, 6), 1600)
+        self.assertPieChartMatches(datetime(2020, 10, 31), datetime(2020, 11, 3))
+        self.assertPieChartMatches(datetime(2020, 11, 1), datetime(2020, 11, 2))
+
+    def test_empty_range(self):
+        self._upload('MONITOR1.FIT', datetime(2020, 6, 1, 12), 300)
+        self.assertEqual(self._get(datetime(2021, 6, 1), datetime(2021, 6, 7)),
+                         {'start_date': None, 'end_date': None, 'stress': []})
+        StressData.objects.update(stress_level_value=-1)
+        self.assertEqual(self._get(datetime(2020, 6, 1), datetime(2020, 6, 7))['stress'], [])
+
+    def test_constant_queries(self):
+        self._upload('MONITOR1.FIT', datetime(2020, 6, 1, 12), 10 * 24 * 60)
+        queries = []
+        for end_day in (3, 12):
+            with CaptureQueriesContext(connection) as context:
+                self._get(datetime(2020, 6, 2), datetime(2020, 6, end_day))
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
@@ -12,7 +12,12 @@ import pytz
 
 # Internal
 from .models import MonitorFile, StressData, HeartRateData, RestingMetRateData, StepData
-from localfitserver.utils import bitswap_ant_timestamp_to_unix_timestamp
+from .summaries import get_monitor_dates, save_daily_summaries
+from localfitserver.bulk import BulkInserter
+from localfitserver.file_hash import get_unique_filename
+from localfitserver.fit_dispatcher import FitMessageDispatcher
+from localfitserver.response_cache import invalidate_responses
+from localfitserver.utils import bitswap_ant_timestamps_to_unix_timestamps, convert_ant_timestamps_to_unix_timestamps
 from localfitserver import settings
 
 
@@ -35,71 +40,90 @@ class MonitorFileUploadSerializer(serializers.Serializer):
         'timestamp_16'
     ]
 
-    def _get_stress_data(self, fit_file, monitor_file):
-        stress_obj = None
-        for row in fit_file.get_messages('stress_level'):
-            stress_data = {'file': monitor_file}
-            for col in row:
-                if col.name in self.stress_fields:
-                    stress_data[col.name] = col.value
-                if col.name in self.stress_time_fields:
-                    stress_data[f'{col.name}_utc'] = timezone.make_aware(col.value, timezone=pytz.UTC)
-
-            stress_obj = StressData(**stress_data)
-            stress_obj.save()
-
-        return stress_obj
-
-    def _get_heart_rate_data(self, fit_file, monitor_file):
-        heart_rate_obj = None
-        most_recent_timestamp_ant_epoch = None
-
-        for row in fit_file.get_messages('monitoring'):
-            heart_rate_data = {'file': monitor_file}
-            for col in row:
-                if col.name == 'heart_rate':
-                    heart_rate_data[col.name] = col.value
-                if col.name in self.time_fields:
-                    heart_rate_data[f'{col.name}_utc'] = timezone.make_aware(col.value, timezone=pytz.UTC)
-                    most_recent_timestamp_ant_epoch = col.raw_value
-                if col.name in self.time_16_fields:
-                    timestamp = bitswap_ant_timestamp_to_unix_timestamp(most_recent_timestamp_ant_epoch, col.raw_value)
-                    heart_rate_data['timestamp_utc'] = timestamp
-
-            # throw out the rows without heart rate data
-            if heart_rate_data.get('heart_rate'):
-                heart_rate_obj = HeartRateData(**heart_rate_data)
-                heart_rate_obj.save()
-
-        return heart_rate_obj
-
-    def _get_resting_metabolic_rate_data(self, fit_file, monitor_file):
-        resting_metabolic_rate_obj = None
-        for row in fit_file.get_messages('monitoring_info'):
-            resting_metabolic_rate_data = {'file': monitor_file}
-            for col in row:
-                if col.name == 'resting_metabolic_rate':
-                    resting_metabolic_rate_data[col.name] = col.value
-                if col.name in self.time_fields:
-                    resting_metabolic_rate_data[f'{col.name}_utc'] = timezone.make_aware(col.value, timezone=pytz.UTC)
-
-            resting_metabolic_rate_obj = RestingMetRateData(**resting_metabolic_rate_data)
-            resting_metabolic_rate_obj.save()
-
-        return resting_metabolic_rate_obj
-
-    def _get_step_data(self, fit_file, monitor_file):
-        step_data = {'file': monitor_file}
-        for row in fit_file.get_messages('monitoring'):
-            for col in row:
-                if col.name in self.time_fields:
-                    if not step_data.get('date'):
-                        step_data['date'] = timezone.make_aware(col.value, timezone=pytz.UTC)
-                if col.name in ['steps']:
-                    # step data is a mess to parse. the largest value is the final value.
-                    if col.value > step_data.get(col.name, 0):
-                        step_data[col.name] = col.value
-
+    fit_message_names = ['monitoring', 'stress_level', 'monitoring_info']
+    batch_size = settings.UPLOAD_BATCH_SIZE
+    rows_written = 0
+
+    def _handle_stress_data(self, row):
+        stress_data = {'file': self._monitor_file}
+        ant_timestamp = None
+        for col in row:
+            if col.name in self.stress_fields:
+                stress_data[col.name] = col.value
+            if col.name in self.stress_time_fields:
+                ant_timestamp = col.raw_value
+
+        self._pending_stress_data.append((stress_data, ant_timestamp))
+        if self.batch_size and len(self._pending_stress_data) >= self.batch_size:
+            self._add_stress_data()
+
+    def _add_stress_data(self):
+        # timestamps are converted a chunk at a time, see localfitserver.utils
+        timed = [(stress_data, ant_timestamp) for stress_data, ant_timestamp in self._pending_stress_data
+                 if ant_timestamp is not None]
+        timestamps = convert_ant_timestamps_to_unix_timestamps([ant_timestamp for _, ant_timestamp in timed])
+        for (stress_data, _), timestamp in zip(timed, timestamps):
+            stress_data['stress_level_time_utc'] = timestamp
+
+        for stress_data, _ in self._pending_stress_data:
+            self._stress_data.add(StressData(**stress_data))
+        self._pending_stress_data = []
+
+    def _handle_heart_rate_data(self, row):
+        heart_rate_data = {'file': self._monitor_file}
+        timestamp = None
+        for col in row:
+            if col.name == 'heart_rate':
+                heart_rate_data[col.name] = col.value
+            if col.name in self.time_fields:
+                self._most_recent_timestamp_ant_epoch = col.raw_value
+                # a full timestamp bitswaps onto itself
+                timestamp = (col.raw_value, col.raw_value & 0xFFFF)
+            if col.name in self.time_16_fields:
+                timestamp = (self._most_recent_timestamp_ant_epoch, col.raw_value)
+
+        # throw out the rows without heart rate data
+        if heart_rate_data.get('heart_rate'):
+            self._pending_heart_rate_data.append((heart_rate_data, timestamp))
+            if self.batch_size and len(self._pending_heart_rate_data) >= self.batch_size:
+                self._add_heart_rate_data()
+
+    def _add_heart_rate_data(self):
+        # timestamps are converted a chunk at a time, see localfitserver.utils
+        timed = [(heart_rate_data, timestamp) for heart_rate_data, timestamp in self._pending_heart_rate_data
+                 if timestamp is not None]
+        timestamps = bitswap_ant_timestamps_to_unix_timestamps([timestamp[0] for _, timestamp in timed],
+                                                               [timestamp[1] for _, timestamp in timed])
+        for (heart_rate_data, _), timestamp in zip(timed, timestamps):
+            heart_rate_data['timestamp_utc'] = timestamp
+
+        for heart_rate_data, _ in self._pending_heart_rate_data:
+            self._heart_rate_data.add(HeartRateData(**heart_rate_data))
+        self._pending_heart_rate_data = []
+
+    def _handle_resting_metabolic_rate_data(self, row):
+        resting_metabolic_rate_data = {'file': self._monitor_file}
+        for col in row:
+            if col.name == 'resting_metabolic_rate':
+                resting_metabolic_rate_data[col.name] = col.value
+            if col.name in self.time_fields:
+                resting_metabolic_rate_data[f'{col.name}_utc'] = timezone.make_aware(col.value, timezone=pytz.UTC)
+
+        self._resting_metabolic_rate_obj = self._resting_metabolic_rate_data.add(
+            RestingMetRateData(**resting_metabolic_rate_data))
+
+    def _handle_step_data(self, row):
+        for col in row:
+            if col.name in self.time_fields:
+                if not self._step_data.get('date'):
+                    self._step_data['date'] = timezone.make_aware(col.value, timezone=pytz.UTC)
+            if col.name in ['steps']:
+                # step data is a mess to parse. the largest value is the final value.
+                if col.value > self._step_data.get(col.name, 0):
+                    self._step_data[col.name] = col.value
+
+    def _save_step_data(self):
+        step_data = self._step_data
         local_date = step_data['date'].astimezone(pytz.timezone(settings.TIME_ZONE)).date()
         step_data_obj, _ = StepData.objects.get_or_create(date=local_date)
 
@@ -108,26 +132,66 @@ class MonitorFileUploadSerializer(serializers.Serializer):
         step_data_obj.save()
         return step_data_obj
 
+    def _validate_file_hash(self, sha256):
+        # also called by the view before decoding, outside of is_valid(), so wrap the message
+        # in a list the way serializer validation errors are returned
+        if MonitorFile.objects.filter(sha256=sha256).exists():
+            raise ValidationError(detail={"file": ["This file has already been uploaded."]}, code=HTTP_400_BAD_REQUEST)
+
     def _validate_filename(self, filename):
-        if MonitorFile.objects.filter(filename=filename).exists():
+        # files uploaded before content hashing can only be matched by name
+        if MonitorFile.objects.filter(filename=filename, sha256__isnull=True).exists():
             raise ValidationError(detail={"file": "This file has already been uploaded."}, code=HTTP_400_BAD_REQUEST)
 
     def validate(self, attrs):
         attrs['fit_file'] = self.initial_data['fit_file']
-        attrs['filename'] = self.initial_data['file'].name.split(".")[0]
-        self._validate_filename(attrs['filename'])
+        attrs['sha256'] = self.initial_data['sha256']
+        self._validate_file_hash(attrs['sha256'])
+
+        filename = self.initial_data['file'].name.split(".")[0]
+        self._validate_filename(filename)
+        attrs['filename'] = get_unique_filename(MonitorFile, filename, attrs['sha256'])
         return attrs
 
+    def _get_dispatcher(self):
+        dispatcher = FitMessageDispatcher()
+        # keep in sync with fit_message_names
+        dispatcher.register('monitoring', self._handle_step_data)
+        dispatcher.register('monitoring', self._handle_heart_rate_data)
+        dispatcher.register('stress_level', self._handle_stress_data)
+        dispatcher.register('monitoring_info', self._handle_resting_metabolic_rate_data)
+        return dispatcher
+
     def create(self, validated_data):
         with transaction.atomic():
-            file = MonitorFile(filename=validated_data['filename'])
+            file = MonitorFile(filename=validated_data['filename'], sha256=validated_data['sha256'])
             file.save()
 
-            step = self._get_step_data(validated_data['fit_file'], file)
-            stress = self._get_stress_data(validated_data['fit_file'], file)
-            heart_rate = self._get_heart_rate_data(validated_data['fit_file'], file)
-            resting_metabolic_rate = self._get_resting_metabolic_rate_data(validated_data['fit_file'], file)
-        return resting_metabolic_rate
+            self._monitor_file = file
+            self._step_data = {'file': file}
+            self._most_recent_timestamp_ant_epoch = None
+            self._resting_metabolic_rate_obj = None
+
+            # samples are buffered, converted and written in chunks of batch_size
+            self._pending_stress_data = []
+            self._pending_heart_rate_data = []
+            self._stress_data = BulkInserter(StressData, batch_size=self.batch_size)
+            self._heart_rate_data = BulkInserter(HeartRateData, batch_size=self.batch_size)
+            self._resting_metabolic_rate_data = BulkInserter(RestingMetRateData, batch_size=self.batch_size)
+
+            # one pass over the file feeds every handler
+            self._get_dispatcher().dispatch(validated_data['fit_file'])
+            self._add_stress_data()
+            self._add_heart_rate_data()
+            self.rows_written = sum(inserter.flush() for inserter in (
+                self._stress_data, self._heart_rate_data, self._resting_metabolic_rate_data))
+            step_data_obj = self._save_step_data()
+
+            # only the days this file has samples on are summarized again
+            dates = get_monitor_dates(file=file) + [step_data_obj.date]
+            save_daily_summaries(min(dates), max(dates))
+            invalidate_responses('monitor', min(dates), max(dates))
+        return self._resting_metabolic_rate_obj
 
     class Meta:
         model = RestingMetRateData
@@ -3,7 +3,8 @@ from django.urls import include, path
 from rest_framework import routers
 
 # Internal
-from .views import MonitorFileUpload, StressList, HeartRateList, RestingMetaList, StressRange, StepsList, stepgoal
+from .views import (MonitorFileUpload, StressList, HeartRateList, RestingMetaList, StressRange, StepsList,
+                    DailySummaryList, stepgoal)
 
 
 router = routers.DefaultRouter()
@@ -13,6 +14,7 @@ router.register(r'stress_data', StressList)
 router.register(r'stress_range', StressRange)
 router.register(r'heart_rate', HeartRateList)
 router.register(r'resting_meta', RestingMetaList)
+router.register(r'daily', DailySummaryList)
 
 
 urlpatterns = [
@@ -1,28 +1,35 @@
 # stdlib
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from calendar import monthrange
 
 # 3rd Party
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from fitparse import FitFile
 from rest_framework import viewsets, mixins
 from rest_framework.decorators import api_view
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.status import HTTP_201_CREATED
+from rest_framework.status import HTTP_201_CREATED, HTTP_202_ACCEPTED
 import pytz
 
 # Internal
 from .upload_serializers import MonitorFileUploadSerializer
 from .serializers import (StressDataSerializer, HeartRateDataSerializer, RestingMetaRateSerializer, PieChartSerializer,
-                          StepDataSerializer, StepGoalSerializer)
-from .models import StressData, HeartRateData, RestingMetRateData, StepData
+                          StepDataSerializer, StepGoalSerializer, DailySummarySerializer)
+from .models import StressData, HeartRateData, RestingMetRateData, StepData, DailySummary
+from jobs.queue import enqueue_upload
 from localfitserver import settings
+from localfitserver.downsampling import get_requested_points
+from localfitserver.file_hash import get_file_hash
+from localfitserver.layouts import CHART_RENDERER_CLASSES
+from localfitserver.response_cache import cache_response
 
 
 class StepsList(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = StepData.objects.all()
     serializer_class = StepDataSerializer
+    renderer_classes = CHART_RENDERER_CLASSES
 
     def get_queryset(self):
         start_date = self.request.query_params['start_date']
@@ -43,6 +50,16 @@ class StepsList(viewsets.GenericViewSet, mixins.ListModelMixin):
         return Response(serializer.data)
 
 
+def get_step_goal_span(request):
+    """
+    The dates of the current month, which the step goal covers
+    """
+    now = datetime.now()
+    _, days_in_month = monthrange(now.year, now.month)
+    return date(now.year, now.month, 1), date(now.year, now.month, days_in_month)
+
+
+@cache_response('monitor', get_step_goal_span)
 @api_view(['GET'])
 def stepgoal(request):
     now = datetime.now()
@@ -54,9 +71,30 @@ def stepgoal(request):
     return Response(serializer.data)
 
 
+class DailySummaryList(viewsets.GenericViewSet, mixins.ListModelMixin):
+    queryset = DailySummary.objects.all()
+    serializer_class = DailySummarySerializer
+
+    def get_queryset(self):
+        start_date = datetime.strptime(self.request.query_params['start_date'], "%Y-%m-%d").date()
+        end_date = datetime.strptime(self.request.query_params['end_date'], "%Y-%m-%d").date()
+        return DailySummary.objects.filter(date__gte=start_date, date__lte=end_date).order_by('date')
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('start_date'):
+            raise ValidationError({'error': 'Please provide a start_date'})
+
+        if not request.query_params.get('end_date'):
+            raise ValidationError({'error': 'Please provide an end_date'})
+
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return Response(serializer.data)
+
+
 class RestingMetaList(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = RestingMetRateData.objects.all()
     serializer_class = RestingMetaRateSerializer
+    renderer_classes = CHART_RENDERER_CLASSES
 
     def get_queryset(self):
         queryset = RestingMetRateData.objects.all()
@@ -68,10 +106,13 @@ class RestingMetaList(viewsets.GenericViewSet, mixins.ListModelMixin):
         if end_date_str:
             end_date_dt = timezone.make_aware(datetime.strptime(end_date_str, "%Y-%m-%d %H:%M:%S"), timezone=pytz.timezone(settings.TIME_ZONE))
             queryset = queryset.filter(timestamp_utc__lt=end_date_dt.date())
-        return queryset
+        return queryset.order_by('timestamp_utc')
 
     def list(self, request, *args, **kwargs):
-        page = self.paginate_queryset(self.get_queryset())
+        # ?points downsamples the whole range rather than a page of it
+        page = None
+        if get_requested_points({'request': request}) is None:
+            page = self.paginate_queryset(self.get_queryset())
         if page:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
@@ -83,6 +124,7 @@ class RestingMetaList(viewsets.GenericViewSet, mixins.ListModelMixin):
 class HeartRateList(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = HeartRateData.objects.all()
     serializer_class = HeartRateDataSerializer
+    renderer_classes = CHART_RENDERER_CLASSES
 
     def get_queryset(self):
         queryset = HeartRateData.objects.all()
@@ -94,13 +136,28 @@ class HeartRateList(viewsets.GenericViewSet, mixins.ListModelMixin):
         if end_date_str:
             end_date_dt = timezone.make_aware(datetime.strptime(end_date_str, "%Y-%m-%d %H:%M:%S"), timezone=pytz.timezone(settings.TIME_ZONE))
             queryset = queryset.filter(timestamp_utc__lt=end_date_dt.date())
-        return queryset
+        return queryset.order_by('timestamp_utc')
 
     def list(self, request, *args, **kwargs):
         serializer = self.get_serializer(self.get_queryset(), many=True)
         return Response(serializer.data)
 
 
+def get_stress_range_span(request):
+    """
+    The dates a stress range covers, None unless it has a start_date and
+    an end_date
+    """
+    try:
+        start_date = datetime.strptime(request.GET['start_date'], "%Y-%m-%d %H:%M:%S").date()
+        end_date = datetime.strptime(request.GET['end_date'], "%Y-%m-%d %H:%M:%S").date()
+    except (KeyError, ValueError):
+        return None
+    # the range is of UTC dates, each of which can fall on the local day before or after
+    return start_date - timedelta(days=1), end_date + timedelta(days=1)
+
+
+@method_decorator(cache_response('monitor', get_stress_range_span), name='dispatch')
 class StressRange(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = StressData.objects.all()
     serializer_class = PieChartSerializer
@@ -125,6 +182,7 @@ class StressRange(viewsets.GenericViewSet, mixins.ListModelMixin):
 class StressList(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = StressData.objects.all()
     serializer_class = StressDataSerializer
+    renderer_classes = CHART_RENDERER_CLASSES
 
     def get_queryset(self):
         queryset = StressData.objects.all()
@@ -136,7 +194,7 @@ class StressList(viewsets.GenericViewSet, mixins.ListModelMixin):
         if end_date_str:
             end_date_dt = datetime.strptime(end_date_str, "%Y-%m-%d %H:%M:%S")
             queryset = queryset.filter(stress_level_time_utc__lt=end_date_dt.date())
-        return queryset
+        return queryset.order_by('stress_level_time_utc')
 
     def list(self, request, *args, **kwargs):
         serializer = self.get_serializer(self.get_queryset(), many=True)
@@ -152,6 +210,15 @@ class MonitorFileUpload(viewsets.ModelViewSet, mixins.CreateModelMixin):
         if not request.FILES.get('file'):
             raise ValidationError({"file": "Please provide a file"})
 
+        # identical bytes were already uploaded, don't bother decoding them
+        request.data['sha256'] = get_file_hash(request.FILES['file'])
+        MonitorFileUploadSerializer()._validate_file_hash(request.data['sha256'])
+
+        if settings.INGEST_ASYNC:
+            job = enqueue_upload('monitor', request.FILES['file'], request.data['sha256'])
+            return Response({'job_id': job.pk, 'state': job.state, 'status_url': f'/jobs/{job.pk}/'},
+                            status=HTTP_202_ACCEPTED)
+
         try:
             fit_file = FitFile(request.FILES['file'])
         except FileNotFoundError:
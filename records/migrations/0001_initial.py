@@ -0,0 +1,24 @@
+# Generated by Django 2.2.8 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordsFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sport', models.CharField(max_length=20, unique=True)),
+                ('calories', models.IntegerField(null=True)),
+                ('distance', models.IntegerField(null=True)),
+                ('timer_time', models.IntegerField(null=True)),
+            ],
+        ),
+    ]
@@ -6,6 +6,7 @@ from fitparse import FitFile
 
 # Internal
 from .models import RecordsFile
+from localfitserver.fit_dispatcher import collect_messages
 
 
 class RecordsFileUploadSerializer(serializers.Serializer):
@@ -21,7 +22,7 @@ class RecordsFileUploadSerializer(serializers.Serializer):
     def create(self, validated_data):
         total_file = None
         with transaction.atomic():
-            for total in validated_data['file'].get_messages('records'):
+            for total in collect_messages(validated_data['file'], ['records'])['records']:
                 try:
                     rowdict = {
                         t.name: t.value for t in total.fields
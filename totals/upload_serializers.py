@@ -6,9 +6,12 @@ from fitparse import FitFile
 
 # Internal
 from .models import TotalsFile
+from localfitserver.fit_dispatcher import collect_messages
 
 
 class ActivityTotalsFileUploadSerializer(serializers.Serializer):
+    fit_message_names = ['totals']
+    rows_written = 0
 
     def validate(self, attrs):
         try:
@@ -21,7 +24,7 @@ class ActivityTotalsFileUploadSerializer(serializers.Serializer):
     def create(self, validated_data):
         total_file = None
         with transaction.atomic():
-            for total in validated_data['file'].get_messages('totals'):
+            for total in collect_messages(validated_data['file'], self.fit_message_names)['totals']:
                 try:
                     rowdict = {
                         t.name: t.value for t in total.fields
@@ -32,6 +35,7 @@ class ActivityTotalsFileUploadSerializer(serializers.Serializer):
                     for (key, value) in rowdict.items():
                         setattr(total_file, key, value)
                     total_file.save()
+                    self.rows_written += 1
 
                 except Exception as e:
                     raise ValidationError("Failed to save file")